@@ -0,0 +1,108 @@
+# Copyright (c) 2014, Stanford University
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+'''
+Created on Oct 18, 2026
+
+Aho-Corasick automaton for finding which of many patterns
+occur in a string, in a single pass over the string.
+'''
+
+class AhoCorasickMatcher(object):
+    '''
+    Finds, among a fixed list of patterns, the highest
+    priority pattern that occurs anywhere in a given string.
+    Patterns are prioritized by their position in the list
+    passed to the constructor: earlier is higher priority.
+    The automaton is built once; each search then costs time
+    proportional to the length of the searched string, rather
+    than to the number of patterns.
+    '''
+
+    def __init__(self, patterns):
+        '''
+        Build the automaton.
+
+        :param patterns: strings to look for, highest priority first
+        :type patterns: [String]
+        '''
+        self.patterns = list(patterns)
+        # Node 0 is the root. For each node: outgoing edges
+        # (char --> node), failure link, and the rank of the
+        # highest priority pattern that ends at this node, or
+        # at any node reachable via failure links:
+        self.edges = [{}]
+        self.failLinks = [0]
+        self.bestRanks = [None]
+
+        for (rank, pattern) in enumerate(self.patterns):
+            node = 0
+            for char in pattern:
+                try:
+                    node = self.edges[node][char]
+                except KeyError:
+                    self.edges.append({})
+                    self.failLinks.append(0)
+                    self.bestRanks.append(None)
+                    self.edges[node][char] = len(self.edges) - 1
+                    node = len(self.edges) - 1
+            if self.bestRanks[node] is None:
+                self.bestRanks[node] = rank
+
+        # Breadth-first, set failure links, and propagate
+        # best ranks along them. A node's failure link points
+        # to the node of its longest proper suffix in the trie:
+        queue = list(self.edges[0].values())
+        queueHead = 0
+        while queueHead < len(queue):
+            node = queue[queueHead]
+            queueHead += 1
+            failRank = self.bestRanks[self.failLinks[node]]
+            if failRank is not None and (self.bestRanks[node] is None or failRank < self.bestRanks[node]):
+                self.bestRanks[node] = failRank
+            for (char, child) in self.edges[node].items():
+                fallback = self.failLinks[node]
+                while fallback > 0 and char not in self.edges[fallback]:
+                    fallback = self.failLinks[fallback]
+                self.failLinks[child] = self.edges[fallback].get(char, 0)
+                queue.append(child)
+
+    def findBestMatch(self, text):
+        '''
+        Return the highest priority pattern that occurs in text.
+
+        :param text: string to search
+        :type text: String
+        :return: the pattern, or None if no pattern occurs in text
+        :rtype: {String | None}
+        '''
+        edges = self.edges
+        failLinks = self.failLinks
+        bestRanks = self.bestRanks
+        bestRank = bestRanks[0]
+        node = 0
+        for char in text:
+            while True:
+                nextNode = edges[node].get(char, None)
+                if nextNode is not None:
+                    node = nextNode
+                    break
+                if node == 0:
+                    break
+                node = failLinks[node]
+            rank = bestRanks[node]
+            if rank is not None and (bestRank is None or rank < bestRank):
+                bestRank = rank
+                if bestRank == 0:
+                    break
+        if bestRank is None:
+            return None
+        return self.patterns[bestRank]
@@ -0,0 +1,142 @@
+# Copyright (c) 2014, Stanford University
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+'''
+Created on Oct 18, 2026
+
+Memo for the ripemd160 hashes that anonymize screen names
+and emails. A log file's events come from comparatively
+few users, and the grade table scripts hash the same
+population of names on every run. The memo is an in-memory
+LRUCache, optionally backed by a dbm file that persists
+name-to-hash pairs across runs.
+'''
+
+import anydbm
+import hashlib
+
+from lruCache import LRUCache
+
+class AnonHashCache(object):
+    '''
+    Computes and remembers anonymization hashes. Usage:
+
+        hasher = AnonHashCache(storePath='/tmp/anonHashes.dbm')
+        hasher.hash('myScreenName')
+        hasher.close()
+
+    Without a storePath only the in-memory cache is used.
+    '''
+
+    # Number of name/hash pairs held in memory:
+    DEFAULT_CACHE_SIZE = 100000
+
+    def __init__(self, cacheSize=DEFAULT_CACHE_SIZE, storePath=None):
+        '''
+        :param cacheSize: maximum number of name/hash pairs kept in memory
+        :type cacheSize: int
+        :param storePath: dbm file in which name/hash pairs persist across
+               runs. Created if it does not exist. None: no persistence.
+        :type storePath: {String | None}
+        '''
+        self.lookupCache = LRUCache(cacheSize)
+        self.storePath = storePath
+        if storePath is None:
+            self.store = None
+        else:
+            # The store maps real names to their hashes, so
+            # other users must not be able to read it:
+            self.store = anydbm.open(storePath, 'c', 0600)
+
+    @staticmethod
+    def computeHash(name):
+        '''
+        Returns a ripemd160 40 char hash of the given name.
+
+        :param name: name to be hashed
+        :type name: String
+        :return: hex digest
+        :rtype: String
+        '''
+        oneHash = hashlib.new('ripemd160')
+        oneHash.update(name)
+        return oneHash.hexdigest()
+
+    def hash(self, name):
+        '''
+        Return the anonymization hash of name, computing
+        it only if neither the memory cache nor the
+        persistent store have it.
+
+        :param name: screen name or email to be hashed
+        :type name: String
+        :return: 40 char hash; same as computeHash(name)
+        :rtype: String
+        '''
+        anonName = self.lookupCache.get(name)
+        if anonName is not None:
+            return anonName
+        if self.store is None:
+            anonName = AnonHashCache.computeHash(name)
+        else:
+            storeKey = name.encode('utf-8') if isinstance(name, unicode) else name
+            try:
+                anonName = self.store[storeKey]
+            except KeyError:
+                anonName = AnonHashCache.computeHash(name)
+                self.store[storeKey] = anonName
+        self.lookupCache.put(name, anonName)
+        return anonName
+
+    def prewarm(self, nameHashPairs):
+        '''
+        Fill the persistent store (or, without a store, the memory
+        cache) with already known name/hash pairs. The hashes are
+        trusted to have been computed by computeHash().
+
+        :param nameHashPairs: (name, hash) tuples
+        :type nameHashPairs: <iterable>
+        :return: number of pairs added
+        :rtype: int
+        '''
+        numPairs = 0
+        for (name, anonName) in nameHashPairs:
+            if name is None or anonName is None:
+                continue
+            if self.store is None:
+                self.lookupCache.put(name, anonName)
+            else:
+                self.store[name.encode('utf-8') if isinstance(name, unicode) else name] = anonName
+            numPairs += 1
+        return numPairs
+
+    def prewarmFromUserGrade(self, mysqldb, tableName='EdxPrivate.UserGrade'):
+        '''
+        Pre-warm from the screen_name and anon_screen_name
+        columns of the UserGrade table.
+
+        :param mysqldb: connection to the database that holds the table
+        :type mysqldb: MySQLDB
+        :param tableName: fully qualified name of the table
+        :type tableName: String
+        :return: number of pairs added
+        :rtype: int
+        '''
+        return self.prewarm(mysqldb.query('SELECT screen_name, anon_screen_name FROM %s' % tableName))
+
+    def close(self):
+        '''
+        Flush and close the persistent store, if there is one.
+        The memory cache remains usable.
+        '''
+        if self.store is not None:
+            self.store.close()
+            self.store = None
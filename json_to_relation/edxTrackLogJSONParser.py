@@ -36,20 +36,24 @@ Modifications:
 
 from collections import OrderedDict
 import datetime
-import hashlib
-import json
 import os
 import re
 import string
-from unidecode import unidecode
-import uuid
+import time
 
+from ahoCorasick import AhoCorasickMatcher
+from anonHashCache import AnonHashCache
 from col_data_type import ColDataType
 from generic_json_parser import GenericJSONParser
 from locationManager import LocationManager
+from lruCache import LRUCache
 from modulestoreImporter import ModulestoreImporter
 from output_disposition import ColumnSpec
 from ipToCountry import IpCountryDict
+from jsonDecoder import JSONDecoder
+from transformStats import TransformStats
+from uniqueIdGenerator import UniqueIDGenerator
+from utils import Utils
 
 class AssessmentOptionSource():
     LEARNER = 0,
@@ -58,6 +62,21 @@ class AssessmentOptionSource():
 
 EDX_HEARTBEAT_PERIOD = 360 # seconds
 
+class ShardFirstSignOfLife(object):
+    '''
+    Placeholder for the downtime_for value of the first event
+    from an IP within a shard of JSONToRelation.convertSharded().
+    Whether the IP was down before that event depends on the lines
+    of preceding shards, so the worker leaves the decision to
+    EdXTrackLogJSONParser.mergeShardState() in the parent process.
+    '''
+    def __init__(self, ip, eventDateTime, isHeartbeat, rowLen):
+        self.ip = ip
+        self.eventDateTime = eventDateTime
+        self.isHeartbeat = isHeartbeat
+        # Length of the row before downtime_for was set:
+        self.rowLen = rowLen
+
 class EdXTrackLogJSONParser(GenericJSONParser):
     '''
     Parser specialized for EdX track logs.
@@ -147,6 +166,23 @@ class EdXTrackLogJSONParser(GenericJSONParser):
     #   input_i4x-Medicine-HRP258-problem-98ca37dbf24849debcc29eb36811cb68_3_1_choice_3'
     findHashPattern = re.compile(r'([a-f0-9]{32})')
 
+    # The shapes of event time strings we see in the logs,
+    # after any '+00:00' offset is removed:
+    # '2013-07-18T08:43:32.573390', and '2013-07-18T08:43:32':
+    logTimePattern = re.compile(r'^(\d{4})-(\d{2})-(\d{2})T(\d{2}):(\d{2}):(\d{2})(?:\.(\d{1,6}))?$')
+
+    # Number of distinct pages/event types whose
+    # course IDs get_course_id() remembers:
+    COURSE_ID_CACHE_SIZE = 10000
+
+    # Seconds after which a background decompressor whose
+    # named pipe no LOAD opened is made to give up:
+    FIFO_OPEN_TIMEOUT = 600
+
+    # Memo of anonymized screen names and emails used
+    # by makeHash(); shared by all instances:
+    anonHashCache = AnonHashCache()
+
     def __init__(self,
                  jsonToRelationConverter,
                  mainTableName,
@@ -154,7 +190,13 @@ class EdXTrackLogJSONParser(GenericJSONParser):
                  progressEvery=1000,
                  replaceTables=False,
                  dbName='test',
-                 useDisplayNameCache=False):
+                 useDisplayNameCache=False,
+                 collectStats=False,
+                 statsFile=None,
+                 ipCountryBackend=IpCountryDict.CSV_BACKEND,
+                 hashLookupStore=ModulestoreImporter.PICKLE_STORE,
+                 idStrategy=UniqueIDGenerator.COUNTER_IDS,
+                 jsonBackend=JSONDecoder.STDLIB):
         '''
         Constructor
 
@@ -178,12 +220,42 @@ class EdXTrackLogJSONParser(GenericJSONParser):
                     that contains the needed information from modulestore. See
                     modulestoreImporter.py for details.
         :type useDisplayNameCache: Bool
+        :param collectStats: if True, keep per-event_type counts and timings, rows per table,
+                    and number of bad JSON rescues. A summary is logged by finish().
+        :type collectStats: Bool
+        :param statsFile: if provided, finish() also writes the statistics to this file
+                    as JSON. Implies collectStats.
+        :type statsFile: {String | None}
+        :param ipCountryBackend: source of IP to country information: IpCountryDict.CSV_BACKEND
+                    for the software77 table, or IpCountryDict.MMDB_BACKEND for the
+                    GeoLite2 database, which also covers IPv6 addresses.
+        :type ipCountryBackend: String
+        :param hashLookupStore: how the ModulestoreImporter keeps its OpenEdx hash to
+                    display name lookup: ModulestoreImporter.PICKLE_STORE for an in-memory
+                    dict, or ModulestoreImporter.SQLITE_STORE for an SQLite file that
+                    is shared by all parallel transforms.
+        :type hashLookupStore: String
+        :param idStrategy: how the unique keys of all tables are generated. One of
+                    UniqueIDGenerator.COUNTER_IDS (random per-process prefix plus counter),
+                    UniqueIDGenerator.BATCHED_UUID4_IDS, or UniqueIDGenerator.UUID4_IDS.
+        :type idStrategy: String
+        :param jsonBackend: JSON decoder for the log lines and their nested JSON strings:
+                    JSONDecoder.STDLIB, or the faster JSONDecoder.UJSON, which accepts
+                    some malformed JSON that json rejects (see jsonDecoder.py).
+        :type jsonBackend: String
         '''
         super(EdXTrackLogJSONParser, self).__init__(jsonToRelationConverter,
                                                     logfileID=logfileID,
                                                     progressEvery=progressEvery
                                                     )
 
+        # Optional profiling information:
+        self.statsFile = statsFile
+        if collectStats or statsFile is not None:
+            self.stats = TransformStats()
+        else:
+            self.stats = None
+
         self.mainTableName = mainTableName
         self.dbName = dbName
 
@@ -210,7 +282,31 @@ class EdXTrackLogJSONParser(GenericJSONParser):
         self.countryChecker = LocationManager()
 
         # An ip-country lookup facility:
-        self.ipCountryDict = IpCountryDict()
+        self.ipCountryDict = IpCountryDict(backend=ipCountryBackend)
+
+        # Results of get_course_id() by the record
+        # fields from which they were derived:
+        self.courseIdCache = LRUCache(EdXTrackLogJSONParser.COURSE_ID_CACHE_SIZE)
+
+        # Source of the _id, event_id, and foreign key values:
+        self.idGenerator = UniqueIDGenerator(idStrategy)
+
+        # Decoder for log lines and nested JSON strings:
+        self.jsonDecoder = JSONDecoder(jsonBackend)
+
+        # Event JSON string of the current record that resolveCourseId()
+        # already decoded; string --> decoded structure:
+        self.nestedJSONCache = {}
+
+        # Quarter strings computed by getQuarter(); (year,month) --> 'fall2013':
+        self.quarterCache = {}
+
+        # Lookup caches whose hits and misses are reported
+        # in the statistics; name --> LRUCache:
+        self.statsCaches = {'courseId' : self.courseIdCache,
+                            'anonHash' : EdXTrackLogJSONParser.anonHashCache.lookupCache}
+        if self.ipCountryDict.lookupCache is not None:
+            self.statsCaches['ipCountry'] = self.ipCountryDict.lookupCache
 
         # Lookup table from OpenEdx 32-bit hash values to
         # corresponding problem, course, or video display_names.
@@ -219,13 +315,17 @@ class EdXTrackLogJSONParser(GenericJSONParser):
         # are caught and logged by the caller:
         self.hashMapper = ModulestoreImporter(os.path.join(os.path.dirname(__file__),'data/modulestore_latest.json'),
                                               useCache=useDisplayNameCache,
-                                              parent=self)
+                                              parent=self,
+                                              lookupStore=hashLookupStore)
         # Make a list of all short course names
         # sorted by length in decreasing order.
         # This list is used by extractCanonicalCourseName()
         # to pull the most likely course name from a nasty
         # string that has a course name embedded:
         self.courseNamesSorted = sorted(self.hashMapper.keys(), key=len, reverse=True)
+        # Automaton that finds the first of those names
+        # that occurs in a string in one pass:
+        self.courseNameMatcher = AhoCorasickMatcher(self.courseNamesSorted)
 
         self.schemaHintsMainTable = OrderedDict()
 
@@ -499,6 +599,16 @@ class EdXTrackLogJSONParser(GenericJSONParser):
         # activity timestamp (heartbeat or any other event).
         # Used to detect server downtimes:
         self.downtimes = {}
+        # True while parsing a shard in a worker
+        # process of JSONToRelation.convertSharded():
+        self.inShard = False
+
+        # Map from event_type to handler, and list of
+        # event_type prefixes with their handlers. See
+        # registerEventHandler():
+        self.eventHandlers = {}
+        self.eventPrefixHandlers = []
+        self.registerBuiltinEventHandlers()
 
         # Place to keep history for some rows, for which we want
         # to computer some on-the-fly aggregations:
@@ -587,8 +697,9 @@ class EdXTrackLogJSONParser(GenericJSONParser):
         It's a long method, and should be partitioned. First, bookkeeping
         fields are filled in that are common to all events, such as the
         user agent, and the reference into the LoadInfo table that shows
-        on which date this row was loaded. Then a long 'case' statement
-        calls handler methods depending on the incoming track log's event_type.
+        on which date this row was loaded. Then the handler method that was
+        registered for the incoming track log's event_type is called (see
+        registerEventHandler()).
 
         Given one line from the EdX Track log, produce one row
         of relational output. Return is an array of values, the
@@ -656,18 +767,23 @@ class EdXTrackLogJSONParser(GenericJSONParser):
         '''
         # No error has occurred yet in processing this JSON str:
         self.errorOccurred = False
+        # Nested JSON strings decoded for the previous record:
+        self.nestedJSONCache.clear()
         # self.jsonToRelationConverter.bumpLineCounter() #NOTE: counter bump happens already in j2r
+        eventType = None
+        if self.stats is not None:
+            startTime = time.time()
         try:
             # Turn top level JSON object to dict:
             try:
-                record = json.loads(str(jsonStr))
+                record = self.jsonDecoder.loads(str(jsonStr))
             except ValueError as e:
                 # Try it again after cleaning up the JSON
                 # We don't do the cleanup routinely to save
                 # time.
                 try:
                     cleanJsonStr = self.makeJSONSafe(jsonStr)
-                    record = json.loads(cleanJsonStr)
+                    record = self.jsonDecoder.loads(cleanJsonStr)
                 except ValueError as e:
                     # Pull out what we can, and place in 'badly_formatted' column
                     self.rescueBadJSON(jsonStr, row=row)
@@ -681,6 +797,9 @@ class EdXTrackLogJSONParser(GenericJSONParser):
             # If the event was fully handled in
             # handleCommonFields(), then we're done:
             if self.finishedRow:
+                # Count it under the event type given
+                # there, such as 'about':
+                eventType = self.getValInRow(row, 'event_type')
                 return
 
             # Now handle the different types of events:
@@ -709,23 +828,20 @@ class EdXTrackLogJSONParser(GenericJSONParser):
                 raise ValueError("No server IP.")
             eventDateTime = self.getEventTimeFromLogRecord(record)
 
-            try:
-                doRecordHeartbeat = False
-                recentSignOfLife = self.downtimes[ip]
-                # Get a timedelta obj w/ duration of time
-                # during which nothing was heard from server:
-                serverQuietTime = eventDateTime - recentSignOfLife
-                if serverQuietTime.seconds > EDX_HEARTBEAT_PERIOD:
-                    self.setValInRow(row, 'downtime_for', str(serverQuietTime))
-                    doRecordHeartbeat = True
-                # New recently-heard from this IP:
-                self.downtimes[ip] = eventDateTime
-            except KeyError:
-                # First sign of life for this IP:
-                self.downtimes[ip] = eventDateTime
-                # Record a time of 0 in downtime detection column:
-                self.setValInRow(row, 'downtime_for', str(datetime.timedelta()))
+            recentSignOfLife = self.downtimes.get(ip, None)
+            if recentSignOfLife is None and self.inShard:
+                # Only the first sign of life within this shard; the
+                # parent process decides in mergeShardState(). Until
+                # then, keep the row even if it is a heartbeat:
+                self.setValInRow(row, 'downtime_for', ShardFirstSignOfLife(ip, eventDateTime, eventType == '/heartbeat', len(row)))
                 doRecordHeartbeat = True
+            else:
+                downtimeFor = self.downtimeSince(recentSignOfLife, eventDateTime)
+                doRecordHeartbeat = downtimeFor is not None
+                if doRecordHeartbeat:
+                    self.setValInRow(row, 'downtime_for', downtimeFor)
+            # New recently-heard from this IP:
+            self.downtimes[ip] = eventDateTime
 
 
             if eventType == '/heartbeat':
@@ -757,262 +873,41 @@ class EdXTrackLogJSONParser(GenericJSONParser):
                 raise ValueError("Event of type %s has no event field" % eventType)
 
             try:
-                if '{' not in eventJSON or eventJSON[:5] == 'input':
-                    event = eventJSON # pass along simple case of problem_check/reset/save event (not JSON)
-                else:
-                    event = json.loads(eventJSONStrOrDict)
-            except TypeError:
-                # Was already a dict
-                event = eventJSONStrOrDict
-            except Exception as e:
-                # Try it again after cleaning up the JSON
-                # We don't do the cleanup routinely to save
-                # time.
+                # Login events were decoded by resolveCourseId() already:
+                event = self.nestedJSONCache[eventJSONStrOrDict]
+            except (KeyError, TypeError):
+                # makeJSONSafe() leaves escapes other than \/ and \"
+                # in the decoded values, as earlier output had them:
                 try:
-                    cleanJSONStr = self.makeJSONSafe(eventJSONStrOrDict)
-                    event = json.loads(cleanJSONStr)
+                    event = self.jsonDecoder.loads(self.makeJSONSafe(eventJSONStrOrDict))
                 except ValueError:
-                    if '{' not in eventJSONStrOrDict:
-                        event = eventJSONStrOrDict # pass along simple case of problem_check/reset/save event
                     # Last ditch: event types like goto_seq, need backslashes removed:
-                    event = json.loads(re.sub(r'\\','',eventJSONStrOrDict))
+                    event = self.jsonDecoder.loads(re.sub(r'\\','',eventJSONStrOrDict))
                 except Exception as e1:
+                    # Not a string, such as the dict of problem_check_fail:
                     row = self.rescueBadJSON(str(record), row=row)
                     raise ValueError('Bad JSON; saved in col badlyFormatted: event_type %s (%s)' % (eventType, `e1`))
-                    return
-
-            if eventType == 'seq_goto' or\
-               eventType == 'seq_next' or\
-               eventType == 'seq_prev':
-
-                row = self.handleSeqNav(record, row, event, eventType)
-                return
-
-            elif eventType == '/accounts/login':
-                # Already recorded everything needed in common-fields
-                return
-
-            elif eventType == '/login_ajax':
-                row = self.handleAjaxLogin(record, row, event, eventType)
-                return
-
-            elif eventType == 'problem_check':
-                # Note: some problem_check cases are also handled in handleAjaxLogin()
-                row = self.handleProblemCheck(record, row, event)
-                return
-
-            elif eventType == 'problem_reset':
-                row = self.handleProblemReset(record, row, event)
-                return
-
-            elif eventType == 'problem_show':
-                row = self.handleProblemShow(record, row, event)
-                return
-
-            elif eventType == 'problem_save':
-                row = self.handleProblemSave(record, row, event)
-                return
-
-            elif eventType == 'oe_hide_question' or\
-                 eventType == 'oe_hide_problem' or\
-                 eventType == 'peer_grading_hide_question' or\
-                 eventType == 'peer_grading_hide_problem' or\
-                 eventType == 'staff_grading_hide_question' or\
-                 eventType == 'staff_grading_hide_problem' or\
-                 eventType == 'oe_show_question' or\
-                 eventType == 'oe_show_problem' or\
-                 eventType == 'peer_grading_show_question' or\
-                 eventType == 'peer_grading_show_problem' or\
-                 eventType == 'staff_grading_show_question' or\
-                 eventType == 'staff_grading_show_problem':
-
-                row = self.handleQuestionProblemHidingShowing(record, row, event)
-                return
-
-            elif eventType == 'rubric_select':
-                row = self.handleRubricSelect(record, row, event)
-                return
-
-            elif eventType == 'oe_show_full_feedback' or\
-                 eventType == 'oe_show_respond_to_feedback':
-                row = self.handleOEShowFeedback(record, row, event)
-                return
-
-            elif eventType == 'oe_feedback_response_selected':
-                row = self.handleOEFeedbackResponseSelected(record, row, event)
-                return
-
-            elif eventType == 'show_transcript' or eventType == 'hide_transcript':
-                row = self.handleShowHideTranscript(record, row, event)
-                return
-
-            elif eventType == 'play_video' or\
-                 eventType == 'pause_video' or\
-                 eventType == 'stop_video' or\
-                 eventType == 'load_video':
-                row = self.handleVideoPlayPause(record, row, event)
-                return
-
-            elif eventType == 'seek_video':
-                row = self.handleVideoSeek(record, row, event)
-                return
-
-            elif eventType == 'speed_change_video':
-                row = self.handleVideoSpeedChange(record, row, event)
-                return
-
-            elif eventType == 'fullscreen':
-                row = self.handleFullscreen(record, row, event)
-                return
-
-            elif eventType == 'not_fullscreen':
-                row = self.handleNotFullscreen(record, row, event)
-                return
-
-            elif eventType == '/dashboard':
-                # Nothing additional to grab:
-                return
-
-            # The 'startswith textbook.pdf' covers a whole
-            # famility of textbook related actions, such as
-            # textbook.pdf.thumbnails.toggled.
-            elif eventType == 'book' or\
-                 eventType.startswith('textbook.pdf'):
-                row = self.handleBook(record, row, event)
-                return
-
-            elif eventType == 'showanswer' or eventType == 'show_answer':
-                row = self.handleShowAnswer(record, row, event)
-                return
-
-            elif eventType == 'problem_check_fail':
-                self.handleProblemCheckFail(record, row, event)
-                return
-
-            elif eventType == 'problem_rescore_fail':
-                row = self.handleProblemRescoreFail(record, row, event)
-                return
-
-            elif eventType == 'problem_rescore':
-                row = self.handleProblemRescore(record, row, event)
-                return
-
-            elif eventType == 'save_problem_fail' or\
-                 eventType == 'save_problem_success' or\
-                 eventType == 'save_problem_check' or\
-                 eventType == 'reset_problem_fail':
-                row = self.handleSaveProblemFailSuccessCheckOrReset(record, row, event)
-                return
-
-            elif eventType == 'reset_problem':
-                row = self.handleResetProblem(record, row, event)
-                return
-
-            # Instructor events:
-            elif eventType in ['list-students',  'dump-grades',  'dump-grades-raw',  'dump-grades-csv',
-                               'dump-grades-csv-raw', 'dump-answer-dist-csv', 'dump-graded-assignments-config',
-                               'list-staff',  'list-instructors',  'list-beta-testers', 'edx.user.settings.changed'
-                               ]:
-                # These events have no additional info. The event_type says it all,
-                # and that's already been stuck into the table:
-                return
-
-            elif eventType == 'rescore-all-submissions' or eventType == 'reset-all-attempts':
-                self.handleRescoreReset(record, row, event)
-                return
-
-            elif eventType == 'delete-student-module-state' or eventType == 'rescore-student-submission':
-                self.handleDeleteStateRescoreSubmission(record, row, event)
-                return
-
-            elif eventType == 'reset-student-attempts':
-                self.handleResetStudentAttempts(record, row, event)
-                return
-
-            elif eventType == 'get-student-progress-page':
-                self.handleGetStudentProgressPage(record, row, event)
-                return
-
-            elif eventType == 'add-instructor' or eventType == 'remove-instructor':
-                self.handleAddRemoveInstructor(record, row, event)
-                return
-
-            elif eventType in ['list-forum-admins', 'list-forum-mods', 'list-forum-community-TAs']:
-                self.handleListForumMatters(record, row, event)
-                return
-
-            elif eventType in ['remove-forum-admin', 'add-forum-admin', 'remove-forum-mod',
-                               'add-forum-mod', 'remove-forum-community-TA',  'add-forum-community-TA']:
-                self.handleForumManipulations(record, row, event)
-                return
-
-            elif eventType == 'psychometrics-histogram-generation':
-                self.handlePsychometricsHistogramGen(record, row, event)
-                return
-
-            elif eventType == 'add-or-remove-user-group':
-                self.handleAddRemoveUserGroup(record, row, event)
-                return
-
-            elif eventType == '/create_account':
-                self.handleCreateAccount(record, row, event)
-                return
-
-            elif eventType == 'problem_graded':
-                # Need to look at return, b/c this
-                # method handles all its own pushing:
-                row = self.handleProblemGraded(record, row, event)
-                return
-
-            elif eventType == 'change-email-settings':
-                self.handleReceiveEmail(record, row, event)
-                return
-
-            # A/B Test Events:
-            elif eventType in ['assigned_user_to_partition',
-                               'xmodule.partitions.assigned_user_to_partition',
-                               'child_render',
-                               'xblock.split_test.child_render',
-                               'edx.cohort.user_created',
-                               'edx.cohort.user_added',
-                               'edx.cohort.user_removed']:
-                self.handleABExperimentEvent(record, row, event)
-                return
 
-            # Peer/Self grading (open assessment):
-            elif eventType in ['openassessmentblock.get_peer_submission',
-                               'openassessmentblock.peer_assess',
-                               'openassessmentblock.self_assess',
-                               'openassessmentblock.submit_feedback_on_assessments',
-                               'openassessmentblock.create_submission',
-                               'openassessmentblock.save_submission',
-                               'openassessmentblock.upload_file',
-                               'openassessmentblock.student_training_assess_example',
-                               'openassessment.student_training_assess_example',
-                               'openassessment.create_submission',
-                               'openassessment.save_submission',
-                               'openassessment.upload_file',
-                               ]:
-                self.handleOpenAssessmentEvent(record, row, event)
-                return
-
-            elif eventType == 'edx.course.enrollment.activated' or eventType == 'edx.course.enrollment.deactivated':
-                self.handleCourseEnrollActivatedDeactivated(record, row, event)
-                return
-
-            # Forum events:
-            elif eventType == 'edx.forum.searched':
-                self.handleForumEvent(record, row, event)
+            # Find the handler for this event type
+            # (see registerBuiltinEventHandlers()):
+            handlerSpec = self.getEventHandlerSpec(eventType)
+            if handlerSpec is None:
+                self.logWarn("Unknown event type '%s' in tracklog row %s" % (eventType, self.jsonToRelationConverter.makeFileCitation()))
                 return
-
-            # Event type values that start with slash:
-            elif eventType[0] == '/':
-                self.handlePathStyledEventTypes(record, row, event)
+            (handler, returnsRow, wantsEventType) = handlerSpec
+            if handler is None:
+                # These events have no additional info. The event_type
+                # says it all, and that's already been stuck into the table:
                 return
-
+            if wantsEventType:
+                result = handler(record, row, event, eventType)
             else:
-                self.logWarn("Unknown event type '%s' in tracklog row %s" % (eventType, self.jsonToRelationConverter.makeFileCitation()))
-                return
+                result = handler(record, row, event)
+            # Some handlers do all their own pushing, and return
+            # an empty row, or a new row; need to look at their return:
+            if returnsRow:
+                row = result
+            return
         except Exception as e:
             # Note whether any error occurred, so that
             # the finally clause can act accordingly:
@@ -1025,11 +920,208 @@ class EdXTrackLogJSONParser(GenericJSONParser):
             # table, do that now. If row is None, then nothing needs
             # to be inserted (e.g. heartbeats):
             if row is not None and len(row) != 0 and not self.errorOccurred:
-                self.jsonToRelationConverter.pushToTable(self.resultTriplet(row, self.mainTableName))
+                self.pushToTable(self.resultTriplet(row, self.mainTableName))
+            if self.stats is not None:
+                self.stats.recordEvent(eventType, time.time() - startTime)
             # Clean out data structures in preparation for next
             # call to this method:
             self.getReadyForNextRow()
 
+    def registerBuiltinEventHandlers(self):
+        '''
+        Fill the event_type dispatch table that processOneJSONObject()
+        consults for every event. Events '/heartbeat', '/', and 'page_close'
+        are taken care of in processOneJSONObject() itself, because they
+        don't need their event field decoded.
+        '''
+        for eventType in ['seq_goto', 'seq_next', 'seq_prev']:
+            self.registerEventHandler(eventType, self.handleSeqNav, wantsEventType=True)
+
+        # Already recorded everything needed in common-fields:
+        self.registerEventHandler('/accounts/login', None)
+        self.registerEventHandler('/login_ajax', self.handleAjaxLogin, wantsEventType=True)
+
+        # Note: some problem_check cases are also handled in handleAjaxLogin()
+        self.registerEventHandler('problem_check', self.handleProblemCheck)
+        self.registerEventHandler('problem_reset', self.handleProblemReset)
+        self.registerEventHandler('problem_show', self.handleProblemShow)
+        self.registerEventHandler('problem_save', self.handleProblemSave)
+
+        for eventType in ['oe_hide_question', 'oe_hide_problem',
+                          'peer_grading_hide_question', 'peer_grading_hide_problem',
+                          'staff_grading_hide_question', 'staff_grading_hide_problem',
+                          'oe_show_question', 'oe_show_problem',
+                          'peer_grading_show_question', 'peer_grading_show_problem',
+                          'staff_grading_show_question', 'staff_grading_show_problem']:
+            self.registerEventHandler(eventType, self.handleQuestionProblemHidingShowing)
+
+        self.registerEventHandler('rubric_select', self.handleRubricSelect)
+        for eventType in ['oe_show_full_feedback', 'oe_show_respond_to_feedback']:
+            self.registerEventHandler(eventType, self.handleOEShowFeedback)
+        self.registerEventHandler('oe_feedback_response_selected', self.handleOEFeedbackResponseSelected)
+
+        # Video:
+        for eventType in ['show_transcript', 'hide_transcript']:
+            self.registerEventHandler(eventType, self.handleShowHideTranscript)
+        for eventType in ['play_video', 'pause_video', 'stop_video', 'load_video']:
+            self.registerEventHandler(eventType, self.handleVideoPlayPause)
+        self.registerEventHandler('seek_video', self.handleVideoSeek)
+        self.registerEventHandler('speed_change_video', self.handleVideoSpeedChange)
+        self.registerEventHandler('fullscreen', self.handleFullscreen)
+        self.registerEventHandler('not_fullscreen', self.handleNotFullscreen)
+
+        # Nothing additional to grab:
+        self.registerEventHandler('/dashboard', None)
+
+        # The 'startswith textbook.pdf' covers a whole
+        # famility of textbook related actions, such as
+        # textbook.pdf.thumbnails.toggled.
+        self.registerEventHandler('book', self.handleBook)
+        self.registerEventHandler('textbook.pdf', self.handleBook, isPrefix=True)
+
+        for eventType in ['showanswer', 'show_answer']:
+            self.registerEventHandler(eventType, self.handleShowAnswer)
+        self.registerEventHandler('problem_check_fail', self.handleProblemCheckFail, returnsRow=False)
+        self.registerEventHandler('problem_rescore_fail', self.handleProblemRescoreFail)
+        self.registerEventHandler('problem_rescore', self.handleProblemRescore)
+        for eventType in ['save_problem_fail', 'save_problem_success', 'save_problem_check', 'reset_problem_fail']:
+            self.registerEventHandler(eventType, self.handleSaveProblemFailSuccessCheckOrReset)
+        self.registerEventHandler('reset_problem', self.handleResetProblem)
+
+        # Instructor events. Most of these have no additional info.
+        # The event_type says it all, and that's already been stuck into the table:
+        for eventType in ['list-students',  'dump-grades',  'dump-grades-raw',  'dump-grades-csv',
+                          'dump-grades-csv-raw', 'dump-answer-dist-csv', 'dump-graded-assignments-config',
+                          'list-staff',  'list-instructors',  'list-beta-testers', 'edx.user.settings.changed'
+                          ]:
+            self.registerEventHandler(eventType, None)
+        for eventType in ['rescore-all-submissions', 'reset-all-attempts']:
+            self.registerEventHandler(eventType, self.handleRescoreReset, returnsRow=False)
+        for eventType in ['delete-student-module-state', 'rescore-student-submission']:
+            self.registerEventHandler(eventType, self.handleDeleteStateRescoreSubmission, returnsRow=False)
+        self.registerEventHandler('reset-student-attempts', self.handleResetStudentAttempts, returnsRow=False)
+        self.registerEventHandler('get-student-progress-page', self.handleGetStudentProgressPage, returnsRow=False)
+        for eventType in ['add-instructor', 'remove-instructor']:
+            self.registerEventHandler(eventType, self.handleAddRemoveInstructor, returnsRow=False)
+        for eventType in ['list-forum-admins', 'list-forum-mods', 'list-forum-community-TAs']:
+            self.registerEventHandler(eventType, self.handleListForumMatters, returnsRow=False)
+        for eventType in ['remove-forum-admin', 'add-forum-admin', 'remove-forum-mod',
+                          'add-forum-mod', 'remove-forum-community-TA',  'add-forum-community-TA']:
+            self.registerEventHandler(eventType, self.handleForumManipulations, returnsRow=False)
+        self.registerEventHandler('psychometrics-histogram-generation', self.handlePsychometricsHistogramGen, returnsRow=False)
+        self.registerEventHandler('add-or-remove-user-group', self.handleAddRemoveUserGroup, returnsRow=False)
+
+        self.registerEventHandler('/create_account', self.handleCreateAccount, returnsRow=False)
+        # This handler does all its own pushing:
+        self.registerEventHandler('problem_graded', self.handleProblemGraded)
+        self.registerEventHandler('change-email-settings', self.handleReceiveEmail, returnsRow=False)
+
+        # A/B Test Events:
+        for eventType in ['assigned_user_to_partition',
+                          'xmodule.partitions.assigned_user_to_partition',
+                          'child_render',
+                          'xblock.split_test.child_render',
+                          'edx.cohort.user_created',
+                          'edx.cohort.user_added',
+                          'edx.cohort.user_removed']:
+            self.registerEventHandler(eventType, self.handleABExperimentEvent, returnsRow=False)
+
+        # Peer/Self grading (open assessment):
+        for eventType in ['openassessmentblock.get_peer_submission',
+                          'openassessmentblock.peer_assess',
+                          'openassessmentblock.self_assess',
+                          'openassessmentblock.submit_feedback_on_assessments',
+                          'openassessmentblock.create_submission',
+                          'openassessmentblock.save_submission',
+                          'openassessmentblock.upload_file',
+                          'openassessmentblock.student_training_assess_example',
+                          'openassessment.student_training_assess_example',
+                          'openassessment.create_submission',
+                          'openassessment.save_submission',
+                          'openassessment.upload_file',
+                          ]:
+            self.registerEventHandler(eventType, self.handleOpenAssessmentEvent, returnsRow=False)
+
+        for eventType in ['edx.course.enrollment.activated', 'edx.course.enrollment.deactivated']:
+            self.registerEventHandler(eventType, self.handleCourseEnrollActivatedDeactivated, returnsRow=False)
+
+        # Forum events:
+        self.registerEventHandler('edx.forum.searched', self.handleForumEvent, returnsRow=False)
+
+        # Event type values that start with slash, and were
+        # not matched by any of the above:
+        self.registerEventHandler('/', self.handlePathStyledEventTypes, isPrefix=True, returnsRow=False)
+
+    def registerEventHandler(self, eventType, handler, isPrefix=False, returnsRow=True, wantsEventType=False):
+        '''
+        Register a method that processOneJSONObject() is to call for
+        events of the given event_type. Registering a handler for an
+        event_type that already has one replaces the existing handler.
+
+        The handler is called as handler(record, row, event), or as
+        handler(record, row, event, eventType) if wantsEventType is True.
+        Record is the dict of the entire track log line, row is the
+        main table row that was filled in by handleCommonFields(), and
+        event is the decoded event field.
+
+        If isPrefix is True, the handler is used for all event_types that
+        start with the given string, unless an exact match exists. If several
+        prefixes match, the longest one wins.
+
+        :param eventType: event_type, or event_type prefix for which handler is to be called
+        :type eventType: String
+        :param handler: callable to invoke; None if the common fields already cover
+            everything there is to record about events of this type.
+        :type handler: {callable | None}
+        :param isPrefix: whether eventType is to be matched as a prefix of event_types
+        :type isPrefix: Bool
+        :param returnsRow: if True, the row that the handler returns is pushed to the
+            main table, instead of the row that was passed in. Handlers that do their
+            own pushing return an empty row.
+        :type returnsRow: Bool
+        :param wantsEventType: whether the event_type is to be passed to the handler as a fourth argument
+        :type wantsEventType: Bool
+        '''
+        handlerSpec = (handler, returnsRow, wantsEventType)
+        if not isPrefix:
+            self.eventHandlers[eventType] = handlerSpec
+            return
+        self.eventPrefixHandlers = [(prefix, existingSpec) for (prefix, existingSpec) in self.eventPrefixHandlers
+                                    if prefix != eventType]
+        self.eventPrefixHandlers.append((eventType, handlerSpec))
+        # Longest prefixes need to be tried first:
+        self.eventPrefixHandlers.sort(key=lambda prefixAndSpec: len(prefixAndSpec[0]), reverse=True)
+
+    def getEventHandlerSpec(self, eventType):
+        '''
+        Given an event_type, return the (handler, returnsRow, wantsEventType)
+        triplet that was registered for it via registerEventHandler().
+
+        :param eventType: event_type of a track log record
+        :type eventType: String
+        :return: the handler information, or None if no handler is registered for the event_type.
+        :rtype: {(callable, Bool, Bool) | None}
+        '''
+        try:
+            return self.eventHandlers[eventType]
+        except KeyError:
+            pass
+        for (prefix, handlerSpec) in self.eventPrefixHandlers:
+            if eventType.startswith(prefix):
+                return handlerSpec
+        return None
+
+    def pushToTable(self, rowInfoTriplet):
+        '''
+        Hand one finished row to the JSONToRelation converter.
+
+        :param rowInfoTriplet: (tableName, insertSig, valsArray) as returned by resultTriplet()
+        :type rowInfoTriplet: (String, String, [<any>])
+        '''
+        if self.stats is not None:
+            self.stats.recordRow(rowInfoTriplet[0])
+        self.jsonToRelationConverter.pushToTable(rowInfoTriplet)
+
     def resultTriplet(self, row, targetTableName, colNamesToSet=None):
         '''
         Given an array of column names, and an array of column values,
@@ -1382,6 +1474,7 @@ class EdXTrackLogJSONParser(GenericJSONParser):
         self.setValInRow(row, '_id', event_tuple_id)
         self.setValInRow(row, 'event_id', self.getUniqueID())
         self.finishedRow = False
+        courseIdTriple = None
         for fldName in self.commonFldNames:
             # Default non-existing flds to null:
             val = record.get(fldName, None)
@@ -1403,18 +1496,20 @@ class EdXTrackLogJSONParser(GenericJSONParser):
                     val = 'networking'
                     self.finishedRow = True
             elif fldName == 'course_id':
-                (fullCourseName, course_id, displayName) = self.get_course_id(record)  # @UnusedVariable
+                courseIdTriple = self.get_course_id(record)
+                (fullCourseName, course_id, displayName) = courseIdTriple  # @UnusedVariable
                 val = course_id
                 # Make course_id available for places where rows are added to the Answer table.
                 # We stick the course_id there for convenience.
                 self.currCourseID = course_id
                 self.currCourseDisplayName = displayName
             elif fldName == 'course_display_name':
-                if self.currCourseDisplayName is not None:
-                    val = self.currCourseDisplayName
-                else:
-                    (fullCourseName, course_id, displayName) = self.get_course_id(record)  # @UnusedVariable
-                    val = displayName
+                # The course_id field normally came first, and
+                # already resolved the display name:
+                if courseIdTriple is None:
+                    courseIdTriple = self.get_course_id(record)
+                (fullCourseName, course_id, displayName) = courseIdTriple  # @UnusedVariable
+                val = displayName
             elif fldName == 'time':
                 # Computer academic quarter from time and
                 # put into row:
@@ -1729,7 +1824,7 @@ class EdXTrackLogJSONParser(GenericJSONParser):
                 self.setValInRow(row, 'problem_id', problemID)
             self.setValInRow(row, 'state_fk', stateFKey if stateFKey is not None else '')
             rowInfoTriplet = self.resultTriplet(row, self.mainTableName)
-            self.jsonToRelationConverter.pushToTable(rowInfoTriplet)
+            self.pushToTable(rowInfoTriplet)
             # The next row keeps its eventID, but needs its own
             # primary key (in _id):
             self.setValInRow(row, '_id', self.getUniqueID())
@@ -1793,7 +1888,7 @@ class EdXTrackLogJSONParser(GenericJSONParser):
                 self.setResourceDisplayName(row, problemID)
 
             rowInfoTriplet = self.resultTriplet(row, self.mainTableName)
-            self.jsonToRelationConverter.pushToTable(rowInfoTriplet)
+            self.pushToTable(rowInfoTriplet)
             # The next row keeps its eventID, but needs its own
             # primary key (in _id):
             self.setValInRow(row, '_id', self.getUniqueID())
@@ -1881,7 +1976,7 @@ class EdXTrackLogJSONParser(GenericJSONParser):
                                 hint,
                                 mode,
                                 queuestate]
-            self.jsonToRelationConverter.pushToTable(self.resultTriplet(correctMapValues, 'CorrectMap', self.schemaCorrectMapTbl.keys()))
+            self.pushToTable(self.resultTriplet(correctMapValues, 'CorrectMap', self.schemaCorrectMapTbl.keys()))
         # Return the array of RorrectMap row unique ids we just
         # created and pushed:
         return correctMapUniqKeys
@@ -1923,7 +2018,7 @@ class EdXTrackLogJSONParser(GenericJSONParser):
                                 answer,
                                 self.currCourseID
                                 ]
-                self.jsonToRelationConverter.pushToTable(self.resultTriplet(answerValues, 'Answer', self.schemaAnswerTbl.keys()))
+                self.pushToTable(self.resultTriplet(answerValues, 'Answer', self.schemaAnswerTbl.keys()))
         return (answersKeys, answerToProblemMap)
 
     def pushState(self, stateDict):
@@ -2026,7 +2121,7 @@ class EdXTrackLogJSONParser(GenericJSONParser):
             stateFKeys.append(state_id)
             stateValues = [state_id, seed, done, problemID, studentAnswerFKey, correctMapFKey, inputStateFKey]
             rowInfoTriplet = self.resultTriplet(stateValues, 'State', self.schemaStateTbl.keys())
-            self.jsonToRelationConverter.pushToTable(rowInfoTriplet)
+            self.pushToTable(rowInfoTriplet)
             indexToFKeys += 1
 
         return stateFKeys
@@ -2065,7 +2160,7 @@ class EdXTrackLogJSONParser(GenericJSONParser):
                                     problemID,
                                     inputStateProbVal
                                     ]
-                self.jsonToRelationConverter.pushToTable(self.resultTriplet(inputStateValues, 'InputState', self.schemaInputStateTbl.keys()))
+                self.pushToTable(self.resultTriplet(inputStateValues, 'InputState', self.schemaInputStateTbl.keys()))
         return inputStateKeys
 
     def pushEventIpInfo(self, eventIpDict):
@@ -2077,7 +2172,7 @@ class EdXTrackLogJSONParser(GenericJSONParser):
         :param eventCountryDict: dict with main table _id, and 3-char country code
         :type eventCountryDict: {String : String}
         '''
-        self.jsonToRelationConverter.pushToTable(self.resultTriplet(eventIpDict.values(),
+        self.pushToTable(self.resultTriplet(eventIpDict.values(),
                                                                     'EventIp',
                                                                     self.schemaEventIpTbl.keys()))
         return
@@ -2101,7 +2196,7 @@ class EdXTrackLogJSONParser(GenericJSONParser):
         :param abExperimentDict: Ordered dict with all required ABExperiment table column values
         :type abExperimentDict: {STRING : STRING, STRING : INT, STRING : STRING, STRING : INT, STRING : STRING, STRING : STRING}
         '''
-        self.jsonToRelationConverter.pushToTable(self.resultTriplet(abExperimentDict.values(), 'ABExperiment', self.schemaABExperimentTbl.keys()))
+        self.pushToTable(self.resultTriplet(abExperimentDict.values(), 'ABExperiment', self.schemaABExperimentTbl.keys()))
         return
 
     def pushOpenAssessmentInfo(self, openAssessmentDict):
@@ -2129,7 +2224,7 @@ class EdXTrackLogJSONParser(GenericJSONParser):
         :param openAssessmentDict: Ordered dict with all required OpenAssessment table column values
         :type openAssessmentDict: Dict
         '''
-        self.jsonToRelationConverter.pushToTable(self.resultTriplet(openAssessmentDict.values(), 'OpenAssessment', self.schemaOpenAssessmentTbl.keys()))
+        self.pushToTable(self.resultTriplet(openAssessmentDict.values(), 'OpenAssessment', self.schemaOpenAssessmentTbl.keys()))
         return
 
 
@@ -2146,7 +2241,7 @@ class EdXTrackLogJSONParser(GenericJSONParser):
         :type accountDict:
         '''
         accountDict['account_id'] = self.getUniqueID()
-        self.jsonToRelationConverter.pushToTable(self.resultTriplet(accountDict.values(), 'Account', self.schemaAccountTbl.keys()))
+        self.pushToTable(self.resultTriplet(accountDict.values(), 'Account', self.schemaAccountTbl.keys()))
         return
 
     def pushLoadInfo(self, loadDict):
@@ -2154,7 +2249,7 @@ class EdXTrackLogJSONParser(GenericJSONParser):
         # Make the primary-key row ID from the load file
         # basename, so that it is reproducible:
         loadDict['load_info_id'] = self.hashGeneral(loadDict['load_file'])
-        self.jsonToRelationConverter.pushToTable(self.resultTriplet(loadDict.values(), 'LoadInfo', self.schemaLoadInfoTbl.keys()))
+        self.pushToTable(self.resultTriplet(loadDict.values(), 'LoadInfo', self.schemaLoadInfoTbl.keys()))
         return loadDict['load_info_id']
 
     def handleProblemReset(self, record, row, event):
@@ -2323,7 +2418,7 @@ class EdXTrackLogJSONParser(GenericJSONParser):
                 self.setResourceDisplayName(row, problemID)
 
                 rowInfoTriplet = self.resultTriplet(row, self.mainTableName)
-                self.jsonToRelationConverter.pushToTable(rowInfoTriplet)
+                self.pushToTable(rowInfoTriplet)
                 # The next row keeps its eventID, but needs its own
                 # primary key (in _id):
                 self.setValInRow(row, '_id', self.getUniqueID())
@@ -2958,7 +3053,7 @@ class EdXTrackLogJSONParser(GenericJSONParser):
 
             self.setValInRow(row, 'state_fk', stateFKey if stateFKey is not None else '')
             rowInfoTriplet = self.resultTriplet(row, self.mainTableName)
-            self.jsonToRelationConverter.pushToTable(rowInfoTriplet)
+            self.pushToTable(rowInfoTriplet)
             # The next row keeps its eventID, but needs its own
             # primary key (in _id):
             self.setValInRow(row, '_id', self.getUniqueID())
@@ -3001,7 +3096,7 @@ class EdXTrackLogJSONParser(GenericJSONParser):
             # Fill in one main table row.
             self.setValInRow(row, 'state_fk', stateFKey, self.mainTableName)
             rowInfoTriplet = self.resultTriplet(row, self.mainTableName)
-            self.jsonToRelationConverter.pushToTable(rowInfoTriplet)
+            self.pushToTable(rowInfoTriplet)
             # The next row keeps its eventID, but needs its own
             # primary key (in _id):
             self.setValInRow(row, '_id', self.getUniqueID())
@@ -3065,7 +3160,7 @@ class EdXTrackLogJSONParser(GenericJSONParser):
             # Fill in one main table row.
             self.setValInRow(row, 'correctMap_fk', correctMapFKey, self.mainTableName)
             rowInfoTriplet = self.resultTriplet(row, self.mainTableName)
-            self.jsonToRelationConverter.pushToTable(rowInfoTriplet)
+            self.pushToTable(rowInfoTriplet)
             # The next row keeps its eventID, but needs its own
             # primary key (in _id):
             self.setValInRow(row, '_id', self.getUniqueID())
@@ -3158,7 +3253,7 @@ class EdXTrackLogJSONParser(GenericJSONParser):
                 self.setResourceDisplayName(row, problemID)
             self.setValInRow(row, 'state_fk', stateFKey if stateFKey is not None else '')
             rowInfoTriplet = self.resultTriplet(row, self.mainTableName)
-            self.jsonToRelationConverter.pushToTable(rowInfoTriplet)
+            self.pushToTable(rowInfoTriplet)
             # The next row keeps its eventID, but needs its own
             # primary key (in _id):
             self.setValInRow(row, '_id', self.getUniqueID())
@@ -3218,7 +3313,7 @@ class EdXTrackLogJSONParser(GenericJSONParser):
             # Fill in one main table row.
             self.setValInRow(row, 'state_fk', stateFKey if stateFKey is not None else '')
             rowInfoTriplet = self.resultTriplet(row, self.mainTableName)
-            self.jsonToRelationConverter.pushToTable(rowInfoTriplet)
+            self.pushToTable(rowInfoTriplet)
             # The next row keeps its eventID, but needs its own
             # primary key (in _id):
             self.setValInRow(row, '_id', self.getUniqueID())
@@ -3716,7 +3811,7 @@ class EdXTrackLogJSONParser(GenericJSONParser):
                     self.setResourceDisplayName(row, problemID)
 
                     rowInfoTriplet = self.resultTriplet(row, self.mainTableName)
-                    self.jsonToRelationConverter.pushToTable(rowInfoTriplet)
+                    self.pushToTable(rowInfoTriplet)
                     # The next row keeps its eventID, but needs its own
                     # primary key (in _id):
                     self.setValInRow(row, '_id', self.getUniqueID())
@@ -4512,7 +4607,7 @@ class EdXTrackLogJSONParser(GenericJSONParser):
                 self.setResourceDisplayName(row, problemID)
 
                 rowInfoTriplet = self.resultTriplet(row, self.mainTableName)
-                self.jsonToRelationConverter.pushToTable(rowInfoTriplet)
+                self.pushToTable(rowInfoTriplet)
                 # The next row keeps its eventID, but needs its own
                 # primary key (in _id):
                 self.setValInRow(row, '_id', self.getUniqueID())
@@ -4596,6 +4691,140 @@ class EdXTrackLogJSONParser(GenericJSONParser):
         # Restore various defaults:
         self.jsonToRelationConverter.pushString(self.dumpPostscript2)
 
+        if self.stats is not None:
+            self.recordCacheStats()
+            self.logInfo(self.stats.summary())
+            if self.statsFile is not None:
+                self.stats.writeJSON(self.statsFile)
+
+    def startWorker(self):
+        '''
+        Called once in each worker process of JSONToRelation.convertSharded().
+        Keys generated by the worker must not repeat those of the
+        parent process or of sibling workers.
+        '''
+        self.idGenerator.reseed()
+
+    @staticmethod
+    def downtimeSince(recentSignOfLife, eventDateTime):
+        '''
+        Decide whether an IP's server was down before the given event.
+
+        :param recentSignOfLife: time of the IP's previous event; None if this is its first
+        :type recentSignOfLife: {datetime.datetime | None}
+        :param eventDateTime: time of the event
+        :type eventDateTime: datetime.datetime
+        :return: value for the downtime_for column, or None if the server was not down
+        :rtype: {String | None}
+        '''
+        if recentSignOfLife is None:
+            # First sign of life for this IP; record a time of 0:
+            return str(datetime.timedelta())
+        # Get a timedelta obj w/ duration of time
+        # during which nothing was heard from server:
+        serverQuietTime = eventDateTime - recentSignOfLife
+        if serverQuietTime.seconds > EDX_HEARTBEAT_PERIOD:
+            return str(serverQuietTime)
+        return None
+
+    def startShard(self):
+        '''
+        Called in worker processes of JSONToRelation.convertSharded()
+        before each shard. The downtime tracking starts over, since
+        the shard's lines need not follow those of the worker's
+        previous shard.
+        '''
+        self.downtimes = {}
+        self.inShard = True
+
+    def takeShardState(self):
+        '''
+        Called in worker processes of JSONToRelation.convertSharded()
+        after each shard.
+
+        :return: each IP's most recent sign of life within the shard
+        :rtype: {String : datetime.datetime}
+        '''
+        return self.downtimes
+
+    def mergeShardState(self, rows, shardState):
+        '''
+        Called in the parent process of JSONToRelation.convertSharded()
+        for each shard, in input order. Decides the downtime_for values
+        that the worker left open (see ShardFirstSignOfLife), using the
+        signs of life from the preceding shards. Heartbeats that don't
+        follow a downtime are dropped, as in a single-process conversion.
+
+        :param rows: (tableName, insertSig, valsArray) rows pushed by the worker
+        :type rows: [(String, String, [<any>])]
+        :param shardState: return value of takeShardState() in the worker
+        :type shardState: {String : datetime.datetime}
+        :return: the rows to write
+        :rtype: [(String, String, [<any>])]
+        '''
+        downtimeColSpec = self.jsonToRelationConverter.getSchemaHint('downtime_for', self.mainTableName)
+        downtimePos = downtimeColSpec.colPos
+        mergedRows = []
+        for (tableName, insertSig, valsArray) in rows:
+            if tableName == self.mainTableName and \
+               len(valsArray) > downtimePos and \
+               isinstance(valsArray[downtimePos], ShardFirstSignOfLife):
+                firstSignOfLife = valsArray[downtimePos]
+                downtimeFor = self.downtimeSince(self.downtimes.get(firstSignOfLife.ip, None), firstSignOfLife.eventDateTime)
+                if downtimeFor is not None:
+                    valsArray[downtimePos] = downtimeFor
+                elif firstSignOfLife.isHeartbeat:
+                    if self.stats is not None:
+                        self.stats.recordRow(tableName, -1)
+                    continue
+                elif len(valsArray) == downtimePos + 1:
+                    # Nothing was set after downtime_for, so without
+                    # it the row and its insertSig would end earlier:
+                    colNames = insertSig.split(',')
+                    insertSig = ','.join(colNames[:len(colNames) - (len(valsArray) - firstSignOfLife.rowLen)])
+                    del valsArray[firstSignOfLife.rowLen:]
+                else:
+                    valsArray[downtimePos] = downtimeColSpec.getDefaultValue()
+            mergedRows.append((tableName, insertSig, valsArray))
+        self.downtimes.update(shardState)
+        return mergedRows
+
+    def takeWorkerStats(self):
+        '''
+        Called in worker processes of JSONToRelation.convertSharded()
+        after each shard. Returns the statistics gathered since the
+        previous call, and starts counting from zero.
+
+        :return: statistics as per TransformStats.asDict(), or None if no statistics are being collected
+        :rtype: {dict | None}
+        '''
+        if self.stats is None:
+            return None
+        self.recordCacheStats()
+        workerStats = self.stats.asDict()
+        self.stats = TransformStats()
+        return workerStats
+
+    def recordCacheStats(self):
+        '''
+        Move the hit and miss counts accumulated by the
+        caches in self.statsCaches into the statistics.
+        '''
+        for (cacheName, cache) in self.statsCaches.items():
+            (hits, misses) = cache.takeCounts()
+            self.stats.recordCacheUse(cacheName, hits, misses)
+
+    def mergeWorkerStats(self, workerStats):
+        '''
+        Add statistics returned by takeWorkerStats() in a
+        worker process to the statistics of this parser.
+
+        :param workerStats: statistics as per TransformStats.asDict()
+        :type workerStats: {dict | None}
+        '''
+        if self.stats is not None and workerStats is not None:
+            self.stats.merge(workerStats)
+
     def createCSVTableLoadCommands(self, outputDisposition):
         '''
         Create a series of LOAD INFILE commands as a string. One load command
@@ -4606,19 +4835,57 @@ class EdXTrackLogJSONParser(GenericJSONParser):
                   destination for CSV rows destined for a given table.
         :type outputDisposition: OutputDisposition
         '''
+        # Shell command that writes a compressed CSV file's content to stdout:
+        decompressCommand = outputDisposition.getDecompressCommand()
         csvLoadCommands    =  "SET sql_log_bin=0;\n"
         csvLoadCommands    += "SET autocommit=0;\n"
         for tableName in ['LoadInfo', 'InputState', 'State', 'CorrectMap', 'Answer', 'Account', 'EventIp', 'EdxTrackEvent', 'ABExperiment', 'OpenAssessment']:
             filename = outputDisposition.getCSVTableOutFileName(tableName)
+            if decompressCommand is not None:
+                # Stream the decompressed CSV through a named pipe, so
+                # that it never lands on disk. The mysql client's 'system'
+                # command starts the decompression in the background; the
+                # shell opens the pipe even if decompression fails, so
+                # the LOAD cannot hang.
+                # Conversely, if the LOAD fails before opening the pipe,
+                # the decompressor would wait for a reader forever. So a
+                # watchdog briefly opens the pipe after FIFO_OPEN_TIMEOUT
+                # seconds: a waiting decompressor then dies of SIGPIPE,
+                # while one whose LOAD is reading does not notice. Once
+                # the LOAD is done, the pipe is gone and the watchdog
+                # does nothing:
+                fifoName = filename + '.fifo'
+                fifoArg = EdXTrackLogJSONParser.shellQuote(fifoName)
+                csvLoadCommands += "system rm -f %s && mkfifo %s && (%s %s > %s &) && ( (sleep %d; [ -p %s ] && : <> %s) &)\n" %\
+                                   (fifoArg, fifoArg, decompressCommand, EdXTrackLogJSONParser.shellQuote(filename), fifoArg,
+                                    EdXTrackLogJSONParser.FIFO_OPEN_TIMEOUT, fifoArg, fifoArg)
+                loadFileName = fifoName
+            else:
+                loadFileName = filename
             # SQL statements for LOAD INFILE all .csv tables in turn. Only used
             # when no INSERT statement dump is being generated:
             csvLoadCommands += "LOAD DATA LOCAL INFILE '%s' IGNORE INTO TABLE %s FIELDS OPTIONALLY ENCLOSED BY \"'\" TERMINATED BY ','; \n" %\
-                               (filename, tableName)
+                               (loadFileName.replace('\\', '\\\\').replace("'", "\\'"), tableName)
+            if decompressCommand is not None:
+                csvLoadCommands += "system rm -f %s\n" % fifoArg
 
         csvLoadCommands    += "SET autocommit=1;\n"
         csvLoadCommands += "SET sql_log_bin=1;\n"
         return csvLoadCommands
 
+    @staticmethod
+    def shellQuote(fileName):
+        '''
+        Quote a file name for use as one word in a shell command.
+        Single quotes in the name are closed, escaped, and reopened.
+
+        :param fileName: file name to quote
+        :type fileName: String
+        :return: the file name in single quotes
+        :rtype: String
+        '''
+        return "'" + fileName.replace("'", "'\\''") + "'"
+
     def createMergeAccountTbl(self):
         '''
         Called at the very end of a load: copies all the entries
@@ -4668,6 +4935,17 @@ class EdXTrackLogJSONParser(GenericJSONParser):
         return row
 
     def getEventTimeFromLogTimeString(self, eventTimeStr):
+        '''
+        Turn an event time string from the log into a datetime.
+        The common shapes are matched by logTimePattern, and converted
+        without the costly strptime(); anything else goes through strptime().
+
+        :param eventTimeStr: time string like '2013-07-18T08:43:32.573390+00:00'
+        :type eventTimeStr: String
+        :return: date and time as object
+        :rtype: datetime.datetime
+        :raise ValueError: if the string is not a time in one of the expected formats
+        '''
         try:
             # Time strings in the log may or may not have a UTF extension:
             # '2013-07-18T08:43:32.573390:+00:00' vs '2013-07-18T08:43:32.573390'
@@ -4676,8 +4954,15 @@ class EdXTrackLogJSONParser(GenericJSONParser):
             maybeOffsetDir = eventTimeStr[-6]
             if maybeOffsetDir == '+' or maybeOffsetDir == '-':
                 eventTimeStr = eventTimeStr[0:-6]
-            eventDateTime = datetime.datetime.strptime(eventTimeStr, '%Y-%m-%dT%H:%M:%S.%f')
-            return eventDateTime
+            timeMatch = EdXTrackLogJSONParser.logTimePattern.match(eventTimeStr)
+            if timeMatch is not None:
+                (year, month, day, hour, minute, second, fraction) = timeMatch.groups()
+                microsecond = int(fraction.ljust(6, '0')) if fraction is not None else 0
+                return datetime.datetime(int(year), int(month), int(day), int(hour), int(minute), int(second), microsecond)
+            try:
+                return datetime.datetime.strptime(eventTimeStr, '%Y-%m-%dT%H:%M:%S.%f')
+            except ValueError:
+                return datetime.datetime.strptime(eventTimeStr, '%Y-%m-%dT%H:%M:%S')
         except ValueError:
             raise ValueError("Bad event time format: '%s'" % eventTimeStr)
 
@@ -4752,6 +5037,59 @@ class EdXTrackLogJSONParser(GenericJSONParser):
         except:
             pass
 
+        cacheKey = self.makeCourseIdCacheKey(record)
+        if cacheKey is None:
+            return self.resolveCourseId(record)
+        courseIdTriple = self.courseIdCache.get(cacheKey)
+        if courseIdTriple is None:
+            courseIdTriple = self.resolveCourseId(record)
+            self.courseIdCache.put(cacheKey, courseIdTriple)
+        return courseIdTriple
+
+    def makeCourseIdCacheKey(self, record):
+        '''
+        Return a key into self.courseIdCache made of exactly those
+        fields from which resolveCourseId() computes its result for
+        the given record: the event_type for server events (plus the
+        event for logins), or else the page. Returns None for records
+        whose result is not worth caching, such as problem_* events,
+        whose course ID comes from the ever-changing event field.
+
+        :param record: JSON record of an edx tracking event as internalized dict
+        :type record: Dict<String,Dict<<any>>
+        :return: cache key, or None
+        :rtype: {tuple | None}
+        '''
+        eventSource = record.get('event_source', None)
+        if eventSource is None:
+            return None
+        if eventSource == 'server':
+            eventType = record.get('event_type', None)
+            if not isinstance(eventType, basestring):
+                return None
+            if eventType == u'/accounts/login':
+                event = record.get('event', None)
+                if not isinstance(event, basestring):
+                    return None
+                return ('server', eventType, event)
+            if not eventType.startswith('/courses') and eventType.find('problem_') > -1:
+                return None
+            return ('server', eventType)
+        page = record.get('page', '')
+        if not isinstance(page, basestring):
+            return None
+        return ('page', page)
+
+    def resolveCourseId(self, record):
+        '''
+        Does the work of get_course_id() for records without
+        a context course_id.
+
+        :param record: JSON record of an edx tracking event as internalized dict
+        :type record: Dict<String,Dict<<any>>
+        :return: full course name, course ID, and course display name
+        :rtype: (String,String,String)
+        '''
         course_id = ''
         eventSource = record.get('event_source', None)
         if eventSource is None:
@@ -4762,10 +5100,16 @@ class EdXTrackLogJSONParser(GenericJSONParser):
             if eventType is None:
                 return('','','')
             if eventType == u'/accounts/login':
+                event = record.get('event', None)
                 try:
-                    post = json.loads(str(record.get('event', None)))
+                    post = self.jsonDecoder.loads(str(event))
                 except:
                     return('','','')
+                if isinstance(event, basestring) and '\\' not in event:
+                    # Without backslashes, makeJSONSafe() leaves the string
+                    # alone, so processOneJSONObject() would decode it to
+                    # the same structure; let it reuse this one:
+                    self.nestedJSONCache[event] = post
                 if post is not None:
                     getEntry = post.get('GET', None)
                     if getEntry is not None:
@@ -4815,9 +5159,15 @@ class EdXTrackLogJSONParser(GenericJSONParser):
         summerQuarterStartDate = Year   + "-06-01T00:00:00Z";
         summerQuarterEndDate   = Year   + "-08-31T00:00:00Z";
 
+        Results are cached by year and month.
+
         :param eventTime:
         :type eventTime:
         '''
+        try:
+            return self.quarterCache[(eventTime.year, eventTime.month)]
+        except KeyError:
+            pass
         eventYear = eventTime.year
         if eventTime.month >= 1 and eventTime.month < 3 or eventTime.month == 12:
             quarter = 'winter'
@@ -4827,7 +5177,9 @@ class EdXTrackLogJSONParser(GenericJSONParser):
             quarter = 'summer'
         else:
             quarter = 'fall'
-        return str(quarter) + str(eventYear)
+        quarterStr = str(quarter) + str(eventYear)
+        self.quarterCache[(eventTime.year, eventTime.month)] = quarterStr
+        return quarterStr
 
     def getCourseDisplayName(self, fullCourseName):
         '''
@@ -4929,7 +5281,7 @@ class EdXTrackLogJSONParser(GenericJSONParser):
         statement. Looks for embedded CR or LFs, and turns them into
         semicolons. Escapes commas and single quotes. Backslash is
         replaced by double backslash. This is needed for unicode, like
-        \0245 (invented example)
+        \0245 (invented example). Same as Utils.makeInsertSafe().
 
         :param unsafeStr: string that possibly contains unsafe chars
         :type unsafeStr: String
@@ -4937,18 +5289,7 @@ class EdXTrackLogJSONParser(GenericJSONParser):
 
         :rtype: String
         '''
-        #return unsafeStr.replace("'", "\\'").replace('\n', "; ").replace('\r', "; ").replace(',', "\\,").replace('\\', '\\\\')
-        if unsafeStr is None or not isinstance(unsafeStr, basestring) or len(unsafeStr) == 0:
-            return ''
-        # Check for chars > 128 (illegal for standard ASCII):
-        for oneChar in unsafeStr:
-            if ord(oneChar) > 128:
-                # unidecode() replaces unicode with approximations.
-                # I tried all sorts of escapes, and nothing worked
-                # for all cases, except this:
-                unsafeStr = unidecode(unicode(unsafeStr))
-                break
-        return unsafeStr.replace('\n', "; ").replace('\r', "; ").replace('\\', '').replace("'", r"\'")
+        return Utils.makeInsertSafe(unsafeStr)
 
     def makeJSONSafe(self, jsonStr):
         '''
@@ -4987,6 +5328,8 @@ class EdXTrackLogJSONParser(GenericJSONParser):
         :param badJSONStr:
         :type badJSONStr:
         '''
+        if self.stats is not None:
+            self.stats.recordBadJSONRescue()
         screen_name = self.tryJSONExtraction(EdXTrackLogJSONParser.searchPatternDict['username'], badJSONStr)
         #host = self.tryJSONExtraction(EdXTrackLogJSONParser.searchPatternDict['host'], badJSONStr)
         session = self.tryJSONExtraction(EdXTrackLogJSONParser.searchPatternDict['session'], badJSONStr)
@@ -5023,8 +5366,9 @@ class EdXTrackLogJSONParser(GenericJSONParser):
         '''
         Generate a universally unique key with
         all characters being legal in MySQL identifiers.
+        See UniqueIDGenerator for the available strategies.
         '''
-        return str(uuid.uuid4()).replace('-','_')
+        return self.idGenerator.nextID()
 
     def getZipAndCountryFromMailAddr(self, mailAddr, accountDict):
 
@@ -5118,12 +5462,15 @@ class EdXTrackLogJSONParser(GenericJSONParser):
 
         :rtype: String
         '''
-        return EdXTrackLogJSONParser.makeHash(username)
+        return EdXTrackLogJSONParser.anonHashCache.hash(username)
 
     @classmethod
     def makeHash(cls, username):
         '''
         Returns a ripemd160 40 char hash of the given name.
+        Hashes are memoized in cls.anonHashCache. Scripts that
+        hash many names can replace that AnonHashCache with one
+        that persists its entries in a dbm file.
 
         :param username: name to be hashed
         :type username: String
@@ -5132,9 +5479,7 @@ class EdXTrackLogJSONParser(GenericJSONParser):
         :rtype: String
         '''
         #return hashlib.sha224(username).hexdigest()
-        oneHash = hashlib.new('ripemd160')
-        oneHash.update(username)
-        return oneHash.hexdigest()
+        return cls.anonHashCache.hash(username)
 
     def extractOpenEdxHash(self, idStr):
         '''
@@ -5254,17 +5599,16 @@ class EdXTrackLogJSONParser(GenericJSONParser):
         # hashes that could match short course names:
         trackLogStr = self.hexGE32Digits.sub('', trackLogStr)
 
-        # We go through all course short names, starting
-        # with the longest, in decreasing length. We
-        # select the first course short name that is
+        # We select the first course short name in
+        # self.courseNamesSorted, i.e. the longest, that is
         # embedded in the given trackLogStr. Proceeding
         # by decreasing length is needed to avoid prematurely
         # choosing a course short name like 'db', which easily
-        # matches a hash string.
-        for shortCourseName in self.courseNamesSorted:
-            if string.find(trackLogStr, shortCourseName) > -1:
-                return self.hashMapper[shortCourseName]
-        return None
+        # matches a hash string:
+        shortCourseName = self.courseNameMatcher.findBestMatch(trackLogStr)
+        if shortCourseName is None:
+            return None
+        return self.hashMapper[shortCourseName]
 
     def getThreeLetterCountryCode(self, ipAddr):
         '''
@@ -349,6 +349,71 @@ class GenericJSONParser(object):
             self.logInfo("Processed %d JSON objects..." % self.totalLinesDoneSoFar)
             self.linesSinceLastProgReport = 0
             
+    def startWorker(self):
+        '''
+        Called once in each worker process of JSONToRelation.convertSharded(),
+        right after the worker was forked. Parsers that hold per-process
+        state, such as unique key generators, reinitialize it here.
+        '''
+        pass
+
+    def startShard(self):
+        '''
+        Called in worker processes of JSONToRelation.convertSharded()
+        before each shard. Parsers whose state spans lines reset it
+        here: a worker's shards don't follow each other in the input.
+        '''
+        pass
+
+    def takeShardState(self):
+        '''
+        Called in worker processes of JSONToRelation.convertSharded()
+        after each shard. Parsers whose state spans lines return the
+        state at the shard's end. This parser keeps none.
+
+        :return: picklable state to pass to mergeShardState() in the parent process, or None.
+        :rtype: {<any> | None}
+        '''
+        return None
+
+    def mergeShardState(self, rows, shardState):
+        '''
+        Called in the parent process of JSONToRelation.convertSharded()
+        for each shard, in input order, before its rows are written.
+        Parsers whose state spans lines complete the shard's rows with
+        the state left by the preceding shards, and then add shardState.
+
+        :param rows: the rows the worker pushed for the shard
+        :type rows: [{(String,String,List<<any>>) | List<<any>>}]
+        :param shardState: return value of takeShardState() in the worker
+        :type shardState: {<any> | None}
+        :return: the rows to write
+        :rtype: [{(String,String,List<<any>>) | List<<any>>}]
+        '''
+        return rows
+
+    def takeWorkerStats(self):
+        '''
+        Called in worker processes of JSONToRelation.convertSharded()
+        after each shard. Parsers that collect statistics return
+        the statistics gathered since the previous call, and reset
+        their counters. This parser collects none.
+
+        :return: picklable statistics to pass to mergeWorkerStats() in the parent process, or None.
+        :rtype: {<any> | None}
+        '''
+        return None
+
+    def mergeWorkerStats(self, workerStats):
+        '''
+        Called in the parent process of JSONToRelation.convertSharded()
+        with the return value of takeWorkerStats() in a worker.
+
+        :param workerStats: statistics from a worker
+        :type workerStats: {<any> | None}
+        '''
+        pass
+
     def logWarn(self, msg):
         self.jsonToRelationConverter.__class__.logger.warn(msg)
 
@@ -23,26 +23,55 @@ does no harm.
 The out-facing method is lookupIP(ipString)
 
 The underlying IP->Country information comes from http://software77.net/geo-ip/
+by default. Alternatively, the MaxMind GeoLite2 country database in
+data/GeoLite2-Country.mmdb.gz can be used, which also covers IPv6.
 
 @author: paepcke
 '''
+from array import array
+from bisect import bisect_right
 import os
+import struct
+import tempfile
 import unittest
 
+from countryCodes import ISO_COUNTRIES, COUNTRIES_BY_TWO_LETTER_CODE
+from lruCache import LRUCache
+from mmdbReader import MMDBReader
+
 
 class IpCountryDict(unittest.TestCase):
     '''
     Implements lookup mapping IP to country.
     '''
-    START_IP_POS = 0
-    END_IP_POS   = 1
-    TWO_LETTER_POS = 2
-    THREE_LETTER_POS = 3
-    COUNTRY_POS = 4
+    # Header of binary index files written by saveIndex():
+    # magic string, index format version, item sizes of the range
+    # arrays and the country-index array, size and modification time
+    # of the CSV table the index was built from, number of ranges,
+    # number of countries, and length of the country table:
+    INDEX_MAGIC = 'IPCTRYIX'
+    INDEX_FORMAT_VERSION = 1
+    INDEX_HEADER_FORMAT = '<8sHBBQdIII'
+
+    # Typecodes for the range vectors and the country-index
+    # vector. 'I' is four bytes on our platforms, which holds
+    # any IPv4 address; fall back to 'L' where it is not:
+    IP_ARRAY_TYPE = 'I' if array('I').itemsize >= 4 else 'L'
+    COUNTRY_INDEX_ARRAY_TYPE = 'H'
+
+    # Number of most recently looked up IPs whose
+    # countries are remembered:
+    DEFAULT_CACHE_SIZE = 10000
+
+    # Sources of IP->Country information:
+    CSV_BACKEND  = 'csv'
+    MMDB_BACKEND = 'mmdb'
 
-    def __init__(self, ipTablePath=None):
+    UNKNOWN_COUNTRY = ('ZZ','ZZZ','unknown')
+
+    def __init__(self, ipTablePath=None, indexPath=None, cacheSize=DEFAULT_CACHE_SIZE, backend=CSV_BACKEND, mmdbPath=None, useIndex=True):
         '''
-        Create an in-memory dict for quickly looking up IP addresses.
+        Create an in-memory index for quickly looking up IP addresses.
         The underlying IP->Country information comes from http://software77.net/geo-ip/
         If an unzipped table from their Web site is not passed in, then 
         the table is expected to reside in subdirectory 'data' of this script's directory
@@ -50,40 +79,271 @@ class IpCountryDict(unittest.TestCase):
         columns for (decimal)startRange, endRange, assigning agency, assignment
         date, two-letter-country code, three-letter-country code, and country.
         
-        The lookup table we construct uses the first four digits of the 
-        starting ranges as key. Values are an array of tuples:
-            (startIpRange,endIPRange,2-letterCode,3-letterCode,Country)
-        All IPs in one key's values thus start with the key's digits.
-        The arrays are just a few tuples long, so the scan through them
-        is fast. The arrays are ordered by rising start and (therefore)
-        end IP.
+        The index we construct consists of three parallel arrays, ordered
+        by rising start IP: range start IPs, range end IPs, and for each
+        range an index into self.countries, a list of tuples:
+            (2-letterCode,3-letterCode,Country)
+        Lookups bisect the start IP array.
+        
+        Parsing the CSV table is slow compared to loading the index from
+        the binary file that saveIndex() writes. Unless useIndex is False,
+        the index is therefore loaded from indexPath, which defaults to the
+        table's path with extension .idx. If that file does not exist, has
+        an outdated format, or was built from a table whose size or
+        modification time differ from the current table, the index is
+        built from the CSV table, and saved to indexPath for the next
+        instance. If the table is missing, an existing index file is used
+        as is. Index files can also be built ahead of time with:
+        
+            python ipToCountry.py --compile [<csvTablePath> [<indexPath>]]
         
         We also construct a simpler dict that maps a country's three-letter
         code to a tuple: (two-letter code, three-letter code, full country name).
+        
+        Results of lookupIP() for the cacheSize most recently used IP strings
+        are kept in an LRUCache, available as self.lookupCache. Its hit and miss
+        counters show how well the cache works for a given log.
+        
+        With backend MMDB_BACKEND, the ipTablePath and indexPath arguments
+        are ignored. Lookups instead walk the memory mapped MaxMind database
+        given in mmdbPath, by default data/GeoLite2-Country.mmdb.gz. A gzipped
+        database is decompressed once, next to the .gz file. This backend
+        handles IPv6 addresses as well as IPv4.
+        
+        :param ipTablePath: path to software77 CSV table; default: data/ipToCountrySoftware77DotNet.csv
+        :type ipTablePath: String
+        :param indexPath: path to binary index file written by saveIndex(); default: table path with extension .idx
+        :type indexPath: String
+        :param cacheSize: number of IP lookup results to cache; 0 turns caching off
+        :type cacheSize: int
+        :param backend: source of IP->Country information: CSV_BACKEND or MMDB_BACKEND
+        :type backend: String
+        :param mmdbPath: path to a MaxMind country database, optionally gzipped
+        :type mmdbPath: String
+        :param useIndex: if False, always build the index from the CSV table, and do not save it
+        :type useIndex: Bool
+        :raise ValueError: if backend is not one of the above
         '''
-        currKey = 0
-        self.ipToCountryDict = {currKey : []}
-        self.threeLetterKeyedDict = {}
+        self.lookupCache = LRUCache(cacheSize) if cacheSize > 0 else None
+        self.mmdbReader = None
+        if backend == IpCountryDict.MMDB_BACKEND:
+            self.openMMDB(mmdbPath)
+            return
+        elif backend != IpCountryDict.CSV_BACKEND:
+            raise ValueError("Unknown IpCountryDict backend '%s'; use '%s' or '%s'" %\
+                             (backend, IpCountryDict.CSV_BACKEND, IpCountryDict.MMDB_BACKEND))
         if ipTablePath is None:
             tableSubPath = os.path.join('data/', 'ipToCountrySoftware77DotNet.csv')
             ipTablePath = os.path.join(os.path.dirname(__file__), tableSubPath)
+        if not useIndex:
+            self.buildIndex(ipTablePath)
+            return
+        if indexPath is None:
+            indexPath = IpCountryDict.defaultIndexPath(ipTablePath)
+        if IpCountryDict.indexIsCurrent(indexPath, ipTablePath):
+            self.loadIndex(indexPath)
+            return
+        self.buildIndex(ipTablePath)
+        try:
+            self.saveIndex(indexPath, ipTablePath)
+        except (IOError, OSError):
+            # Read-only installation; we'll build
+            # from the CSV table again next time:
+            pass
+
+    @classmethod
+    def defaultIndexPath(cls, ipTablePath):
+        return os.path.splitext(ipTablePath)[0] + '.idx'
+
+    @classmethod
+    def compileIndex(cls, ipTablePath=None, indexPath=None):
+        '''
+        Build the index from the CSV table, and save it,
+        regardless of whether an index file exists.
+        
+        :param ipTablePath: path to software77 CSV table; default: data/ipToCountrySoftware77DotNet.csv
+        :type ipTablePath: String
+        :param indexPath: file to write; default: table path with extension .idx
+        :type indexPath: String
+        :return: path of the index file
+        :rtype: String
+        '''
+        lookup = IpCountryDict(ipTablePath, useIndex=False, cacheSize=0)
+        if ipTablePath is None:
+            ipTablePath = os.path.join(os.path.dirname(__file__), 'data/', 'ipToCountrySoftware77DotNet.csv')
+        if indexPath is None:
+            indexPath = IpCountryDict.defaultIndexPath(ipTablePath)
+        lookup.saveIndex(indexPath, ipTablePath)
+        return indexPath
+
+    @classmethod
+    def readIndexHeader(cls, fd):
+        '''
+        Read the header of an index file.
+        
+        :param fd: index file open for binary reading, positioned at its start
+        :type fd: file
+        :return: the header fields as per INDEX_HEADER_FORMAT, or None if
+            the file is not an index file of the current format version
+            with the array item sizes of this platform.
+        :rtype: {tuple | None}
+        '''
+        headerLen = struct.calcsize(IpCountryDict.INDEX_HEADER_FORMAT)
+        headerBytes = fd.read(headerLen)
+        if len(headerBytes) < headerLen:
+            return None
+        header = struct.unpack(IpCountryDict.INDEX_HEADER_FORMAT, headerBytes)
+        (magic, formatVersion, ipItemSize, countryIndexItemSize) = header[0:4]
+        if magic != IpCountryDict.INDEX_MAGIC or \
+           formatVersion != IpCountryDict.INDEX_FORMAT_VERSION or \
+           ipItemSize != array(IpCountryDict.IP_ARRAY_TYPE).itemsize or \
+           countryIndexItemSize != array(IpCountryDict.COUNTRY_INDEX_ARRAY_TYPE).itemsize:
+            return None
+        return header
+
+    @classmethod
+    def indexIsCurrent(cls, indexPath, ipTablePath):
+        '''
+        Return True if indexPath is an index file of the
+        current format, and was built from the current version
+        of the CSV table, as judged by the table's size and
+        modification time. If the table does not exist, any
+        index file of the current format is accepted.
+        '''
+        try:
+            with open(indexPath, 'rb') as fd:
+                header = IpCountryDict.readIndexHeader(fd)
+        except IOError:
+            return False
+        if header is None:
+            return False
+        (sourceSize, sourceMtime) = header[4:6]
+        try:
+            tableStat = os.stat(ipTablePath)
+        except OSError:
+            return True
+        return tableStat.st_size == sourceSize and tableStat.st_mtime == sourceMtime
+
+    def buildIndex(self, ipTablePath):
+        '''
+        Build the range index from a software77 CSV table.
+        
+        :param ipTablePath: path to the CSV table
+        :type ipTablePath: String
+        '''
+        ranges = []
+        countryIndexes = {}
+        self.countries = []
+        self.threeLetterKeyedDict = {}
         with open(ipTablePath, 'r') as fd:
             for line in fd:
                 if line[0] == '#':
                     continue
                 (startIPStr,endIPStr,auth,assigned,twoLetterCountry,threeLetterCountry,country) = line.strip().split(',')  # @UnusedVariable
-                # Use first four digits of start ip as hash key:
-                hashKey = startIPStr.strip('"').zfill(10)[0:4]
-                if hashKey != currKey:
-                    self.ipToCountryDict[hashKey] = []
-                    currKey = hashKey
-                self.ipToCountryDict[hashKey].append((int(startIPStr.strip('"')), 
-                                                       int(endIPStr.strip('"')), 
-                                                       twoLetterCountry.strip('"'), 
-                                                       threeLetterCountry.strip('"'), 
-                                                       country.strip('"'))
-                                                    )
-                self.threeLetterKeyedDict[threeLetterCountry.strip('"')] = (twoLetterCountry.strip('"'), threeLetterCountry.strip('"'), country.strip('"'))
+                countryInfo = (twoLetterCountry.strip('"'), threeLetterCountry.strip('"'), country.strip('"'))
+                try:
+                    countryIndex = countryIndexes[countryInfo]
+                except KeyError:
+                    countryIndex = len(self.countries)
+                    countryIndexes[countryInfo] = countryIndex
+                    self.countries.append(countryInfo)
+                ranges.append((int(startIPStr.strip('"')), int(endIPStr.strip('"')), countryIndex))
+                self.threeLetterKeyedDict[countryInfo[1]] = countryInfo
+        ranges.sort()
+        self.rangeStarts = array(IpCountryDict.IP_ARRAY_TYPE, [ipRange[0] for ipRange in ranges])
+        self.rangeEnds   = array(IpCountryDict.IP_ARRAY_TYPE, [ipRange[1] for ipRange in ranges])
+        self.countryIndexes = array(IpCountryDict.COUNTRY_INDEX_ARRAY_TYPE, [ipRange[2] for ipRange in ranges])
+
+    def openMMDB(self, mmdbPath):
+        '''
+        Prepare lookups in a MaxMind country database.
+        
+        :param mmdbPath: path to the database, optionally gzipped; default: data/GeoLite2-Country.mmdb.gz
+        :type mmdbPath: String
+        '''
+        if mmdbPath is None:
+            mmdbPath = os.path.join(os.path.dirname(__file__), 'data/GeoLite2-Country.mmdb.gz')
+        if mmdbPath.endswith('.gz'):
+            mmdbPath = MMDBReader.ensureDecompressed(mmdbPath)
+        self.mmdbReader = MMDBReader(mmdbPath)
+        # Many networks share one data record; data record
+        # offset --> (2-letter code, 3-letter code, country):
+        self.mmdbCountryByOffset = {}
+        self.threeLetterKeyedDict = {}
+        for countryInfo in ISO_COUNTRIES:
+            self.threeLetterKeyedDict[countryInfo[1]] = countryInfo
+
+    def saveIndex(self, indexPath, ipTablePath=None):
+        '''
+        Write the range index to a binary file, from which
+        later instances can be created without parsing the
+        CSV table. File layout: a header as per INDEX_HEADER_FORMAT;
+        the tab-separated country table; then the start, end, and
+        country-index arrays in native byte order.
+        
+        The file is written under a temporary name, and then renamed,
+        so that transforms running in parallel never see a partial index.
+        
+        :param indexPath: file to create or overwrite
+        :type indexPath: String
+        :param ipTablePath: CSV table the index was built from; its size and
+            modification time are recorded to detect when the index is outdated.
+        :type ipTablePath: {String | None}
+        '''
+        (sourceSize, sourceMtime) = (0, 0.0)
+        if ipTablePath is not None and os.path.exists(ipTablePath):
+            tableStat = os.stat(ipTablePath)
+            (sourceSize, sourceMtime) = (tableStat.st_size, tableStat.st_mtime)
+        countryTable = '\n'.join(['\t'.join(countryInfo) for countryInfo in self.countries])
+        (fd, tmpPath) = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(indexPath)))
+        try:
+            with os.fdopen(fd, 'wb') as indexFd:
+                indexFd.write(struct.pack(IpCountryDict.INDEX_HEADER_FORMAT,
+                                          IpCountryDict.INDEX_MAGIC,
+                                          IpCountryDict.INDEX_FORMAT_VERSION,
+                                          self.rangeStarts.itemsize,
+                                          self.countryIndexes.itemsize,
+                                          sourceSize,
+                                          sourceMtime,
+                                          len(self.rangeStarts),
+                                          len(self.countries),
+                                          len(countryTable)))
+                indexFd.write(countryTable)
+                self.rangeStarts.tofile(indexFd)
+                self.rangeEnds.tofile(indexFd)
+                self.countryIndexes.tofile(indexFd)
+            # mkstemp() creates files readable only by their owner:
+            os.chmod(tmpPath, 0644)
+            os.rename(tmpPath, indexPath)
+        except:
+            os.remove(tmpPath)
+            raise
+
+    def loadIndex(self, indexPath):
+        '''
+        Load a range index written by saveIndex().
+        
+        :param indexPath: binary index file
+        :type indexPath: String
+        :raise ValueError: if the file is not an index file of the current format
+        '''
+        with open(indexPath, 'rb') as fd:
+            header = IpCountryDict.readIndexHeader(fd)
+            if header is None:
+                raise ValueError("File %s is not an IP-to-country index file of format version %d." %\
+                                 (indexPath, IpCountryDict.INDEX_FORMAT_VERSION))
+            (numRanges, numCountries, countryTableLen) = header[6:9]
+            countryTable = fd.read(countryTableLen)
+            self.countries = [tuple(countryLine.split('\t')) for countryLine in countryTable.split('\n')] if numCountries > 0 else []
+            self.rangeStarts = array(IpCountryDict.IP_ARRAY_TYPE)
+            self.rangeStarts.fromfile(fd, numRanges)
+            self.rangeEnds = array(IpCountryDict.IP_ARRAY_TYPE)
+            self.rangeEnds.fromfile(fd, numRanges)
+            self.countryIndexes = array(IpCountryDict.COUNTRY_INDEX_ARRAY_TYPE)
+            self.countryIndexes.fromfile(fd, numRanges)
+        self.threeLetterKeyedDict = {}
+        for countryInfo in self.countries:
+            self.threeLetterKeyedDict[countryInfo[1]] = countryInfo
 
     def get(self, ipStr, default=None):
         '''
@@ -118,45 +378,65 @@ class IpCountryDict(unittest.TestCase):
         :raise ValueError: when given IP address is None
         :raise KeyError: when the country for the given IP is not found. 
         '''
+        if self.lookupCache is not None:
+            countryInfo = self.lookupCache.get(ipStr)
+            if countryInfo is not None:
+                return countryInfo
+        if self.mmdbReader is not None:
+            countryInfo = self.lookupIPInMMDB(ipStr)
+        else:
+            countryInfo = self.lookupIPInRanges(ipStr)
+        if self.lookupCache is not None:
+            self.lookupCache.put(ipStr, countryInfo)
+        return countryInfo
+
+    def lookupIPInRanges(self, ipStr):
+        '''
+        Look up an IPv4 string in the range index built
+        from the software77 table.
+        '''
         (ipNum, lookupKey) = self.ipStrToIntAndKey(ipStr)
         if ipNum is None or lookupKey is None:
             raise ValueError("IP string is not a valid IP address: '%s'" % str(ipStr))
-        while lookupKey > 0:
-            try:
-                ipRangeChain = self.ipToCountryDict[lookupKey]
-                if ipRangeChain is None:
-                    raise ValueError("IP string is not a valid IP address: '%s'" % str(ipStr))
-                # Sometimes the correct entry is *lower* than
-                # where the initial lookup key points:
-                if ipRangeChain[0][0] > ipNum:
-                    # Backtrack to an earlier key:
-                    raise KeyError()
-                break
-            except KeyError:
-                lookupKey = str(int(lookupKey) - 1).zfill(4)[0:4]
-                continue
-        for ipInfo in ipRangeChain:
-            # Have (rangeStart,rangeEnd,country2Let,country3Let,county)
-            # Sorted by rangeStart:
-            if ipNum > ipInfo[IpCountryDict.END_IP_POS]:
-                continue
-            return(ipInfo[IpCountryDict.TWO_LETTER_POS], 
-                   ipInfo[IpCountryDict.THREE_LETTER_POS],
-                   ipInfo[IpCountryDict.COUNTRY_POS])
-        # If we get here, the IP is in a range in which
-        # the IP-->Country table has a hole:
-        return('ZZ','ZZZ','unknown')
-        
-        
+        # Find the last range that starts at or below ipNum:
+        rangeIndex = bisect_right(self.rangeStarts, ipNum) - 1
+        if rangeIndex < 0 or ipNum > self.rangeEnds[rangeIndex]:
+            # The IP is in a range in which
+            # the IP-->Country table has a hole:
+            return IpCountryDict.UNKNOWN_COUNTRY
+        return self.countries[self.countryIndexes[rangeIndex]]
+
+    def lookupIPInMMDB(self, ipStr):
+        '''
+        Look up an IPv4 or IPv6 string in the MaxMind
+        database. Networks without a country use the
+        country in which they are registered.
+        '''
+        dataOffset = self.mmdbReader.findDataOffset(ipStr)
+        if dataOffset is None:
+            return IpCountryDict.UNKNOWN_COUNTRY
+        try:
+            return self.mmdbCountryByOffset[dataOffset]
+        except KeyError:
+            pass
+        (record, nextOffset) = self.mmdbReader.decode(dataOffset, self.mmdbReader.dataSectionStart) #@UnusedVariable
+        countryInfo = IpCountryDict.UNKNOWN_COUNTRY
+        if isinstance(record, dict):
+            country = record.get('country', None) or record.get('registered_country', None) or {}
+            countryInfo = COUNTRIES_BY_TWO_LETTER_CODE.get(country.get('iso_code', None), IpCountryDict.UNKNOWN_COUNTRY)
+        self.mmdbCountryByOffset[dataOffset] = countryInfo
+        return countryInfo
             
     def ipStrToIntAndKey(self, ipStr):
         '''
         Given an IP string, return two-tuple: the numeric
-        int, and a lookup key into self.ipToCountryDict.
+        int, and the first four digits of the int. The latter is
+        no longer needed for lookups, but is kept for callers
+        that use it.
          
         :param ipStr: ip string like '171.64.65.66'
         :type ipStr: string
-        :return: two-tuple of ip int and the first four digits, i.e. a lookup key. Like (16793600, 1679). Returns (None,None) if IP was not a four-octed str.
+        :return: two-tuple of ip int and the first four digits. Like (16793600, 1679). Returns (None,None) if IP was not a four-octed str.
         :rtype: (int,int)
         '''
         try:
@@ -171,7 +451,12 @@ class IpCountryDict(unittest.TestCase):
 if __name__ == '__main__':
     import sys
     if len(sys.argv) < 2:
-        raise ValueError("Usage: python ipToCountry.py <ipAddress>")
+        raise ValueError("Usage: python ipToCountry.py <ipAddress> | --compile [<csvTablePath> [<indexPath>]]")
+    
+    if sys.argv[1] == '--compile':
+        indexPath = IpCountryDict.compileIndex(*sys.argv[2:4])
+        print('Wrote %s' % indexPath)
+        sys.exit(0)
         
     #lookup = IpCountryDict('ipToCountrySoftware77DotNet.csv')
     lookup = IpCountryDict()
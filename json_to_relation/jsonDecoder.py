@@ -0,0 +1,96 @@
+# Copyright (c) 2014, Stanford University
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+'''
+Created on Oct 18, 2026
+
+Choice of JSON decoder for the tracking log lines. The standard
+library's json module is the default, and the reference for which
+lines count as bad JSON, and are thus rescued into the badly_formatted
+column. The C-based ujson decoder is faster, but is an optional
+install, and more lenient: it accepts raw control characters inside
+strings, trailing commas, and numbers with leading zeros, and it
+drops lone surrogates. With ujson, such lines produce regular rows
+where json would have them rescued.
+'''
+
+import json
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+class JSONDecoder(object):
+    '''
+    Wraps a JSON decoder module behind loads(). Usage:
+
+        decoder = JSONDecoder(JSONDecoder.UJSON)
+        record = decoder.loads('{"event_type": "play_video"}')
+    '''
+
+    UJSON      = 'ujson'
+    STDLIB     = 'json'
+
+    BACKENDS = [STDLIB, UJSON]
+
+    def __init__(self, backend=STDLIB):
+        '''
+        :param backend: STDLIB, or UJSON. See the module comment for how
+               ujson's results differ for malformed JSON.
+        :type backend: String
+        :raise ValueError: if the backend is unknown, or its module is not installed
+        '''
+        if backend not in JSONDecoder.BACKENDS:
+            raise ValueError("Unknown JSON decoder backend: '%s'" % str(backend))
+        elif not JSONDecoder.isAvailable(backend):
+            raise ValueError("JSON decoder backend '%s' is not installed." % backend)
+        self.backend = backend
+        if backend == JSONDecoder.UJSON:
+            self.fastLoads = JSONDecoder.ujsonLoads
+        else:
+            self.fastLoads = None
+            # Nothing to fall back from:
+            self.loads = json.loads
+
+    @staticmethod
+    def isAvailable(backend):
+        '''
+        :param backend: STDLIB, or UJSON
+        :type backend: String
+        :return: True if the module for backend can be used
+        :rtype: Bool
+        '''
+        if backend == JSONDecoder.UJSON:
+            return ujson is not None
+        return backend == JSONDecoder.STDLIB
+
+    @staticmethod
+    def ujsonLoads(jsonStr):
+        # By default ujson rounds floats differently from
+        # json.loads(); precise_float makes the two agree:
+        return ujson.loads(jsonStr, precise_float=True)
+
+    def loads(self, jsonStr):
+        '''
+        Decode jsonStr with the fast decoder; if that fails,
+        with json.loads(), whose verdict is then final.
+
+        :param jsonStr: JSON string
+        :type jsonStr: String
+        :return: decoded structure
+        :rtype: <any>
+        :raise ValueError: if neither decoder can decode jsonStr
+        '''
+        try:
+            return self.fastLoads(jsonStr)
+        except (ValueError, OverflowError):
+            return json.loads(jsonStr)
@@ -37,11 +37,10 @@ Modifications:
                   is ISO compliant.
 '''
 
-from cStringIO import StringIO
-from collections import OrderedDict
-import copy
+from collections import OrderedDict, deque
 import logging
 import math
+import multiprocessing
 import os
 import re
 import shutil
@@ -53,6 +52,21 @@ from generic_json_parser import GenericJSONParser
 from input_source import InputSource, InURI, InString, InMongoDB, InPipe
 from output_disposition import OutputDisposition, OutputFile, OutputPipe
 
+# Converter whose parser the worker processes of
+# convert(workers=N) use. Set once in each (forked)
+# worker by _initShardWorker():
+_shardConverter = None
+
+def _initShardWorker(jsonToRelationConverter):
+    global _shardConverter
+    _shardConverter = jsonToRelationConverter
+    jsonToRelationConverter.jsonParserInstance.startWorker()
+    # Statistics gathered before the fork belong to the parent:
+    jsonToRelationConverter.jsonParserInstance.takeWorkerStats()
+
+def _convertShard(shard):
+    return _shardConverter.convertShard(shard)
+
 class JSONToRelation(object):
     '''
     Given a source with JSON structures, derive a schema, and construct
@@ -80,12 +94,30 @@ class JSONToRelation(object):
     # or putting this into /etc/mysql/my.cnf
     #       [mysqld]
     #       max_allowed_packet=16M
-    # Then change the following constant to the
-    # new limit minus about 1K to allow for
-    # the INSERT, and column name specs. Or round
-    # down like this:
+    # Then pass the new limit as maxAllowedPacketSize
+    # to the constructor (json2sql.py --maxPacketSize),
+    # or have maxPacketSizeFromServer() read it from
+    # the server. INSERT statements are then made as
+    # long as the limit minus PACKET_SIZE_MARGIN. The
+    # following is the default, rounded down from 1M:
     MAX_ALLOWED_PACKET_SIZE = 1000000;
 
+    # Bytes of a server's max_allowed_packet that are
+    # left for the client/server protocol:
+    PACKET_SIZE_MARGIN = 1024
+
+    # Maximum number of rows held back for any one
+    # INSERT statement, independent of their size:
+    MAX_ROWS_PER_INSERT = 10000
+
+    # Number of (non-empty) JSON lines that convert(workers=N)
+    # hands to a worker process at a time:
+    LINES_PER_SHARD = 2000
+
+    # When not None, rows pushed by the parser are collected
+    # here instead of being written out. Only set inside the
+    # worker processes of convert(workers=N):
+    shardRows = None
 
     # Remember whether logging has been initialized (class var!):
     loggingInitialized = False
@@ -99,7 +131,9 @@ class JSONToRelation(object):
                  loggingLevel=logging.INFO,
                  logFile=None,
                  mainTableName='Main',
-                 progressEvery=1000):
+                 progressEvery=1000,
+                 maxAllowedPacketSize=None,
+                 maxRowsPerInsert=None):
         '''
         Create a JSON-to-Relation converter. The JSON source can be
         a file with JSON objects, a StringIO.StringIO string pseudo file,
@@ -149,6 +183,12 @@ class JSONToRelation(object):
         :type logFile: String
         :param progressEvery: number of JSON object to process before reporting the number in a log info msg. If None, no reporting
         :type  progressEvery: {int | None}
+        :param maxAllowedPacketSize: maximum length in bytes of generated INSERT statements. See
+                        maxPacketSizeFromServer(). Default: MAX_ALLOWED_PACKET_SIZE
+        :type maxAllowedPacketSize: {int | None}
+        :param maxRowsPerInsert: maximum number of rows in one generated INSERT statement.
+                        Default: MAX_ROWS_PER_INSERT
+        :type maxRowsPerInsert: {int | None}
         @raise ValueErrer: when value of jsonParserInstance is neither None, nor an instance of GenericJSONParser,
                         nor one of its subclasses.
         @raise ValueError: when jsonSource is not an instance of InPipe, InString, InURI, or InMongoDB
@@ -180,21 +220,20 @@ class JSONToRelation(object):
                     raise ValueError("Schema hints must be of type ColDataType")
         self.userDefinedHints = schemaHints
 
-        # The following three instance vars are used for accumulating INSERT
-        # values when output is a MySQL dump.
-        # Current table for which insert values are being collected:
-        self.currOutTable = None
-
-        # Insert values so far (array of value arrays):
-        self.currValsArray = []
-
-        # Column names for which INSERT values are being collected.
-        # Ex.: 'col1,col2':
-        self.currInsertSig = None
-
-        # Current approximate len of INSERT statement
-        # for cached values:
-        self.valsCacheSize = 0;
+        # Hold-back buffers for INSERT values when output is a MySQL
+        # dump. Maps (tableName, insertSig) to a two-element list:
+        # the rows encoded for the VALUES part so far, and the number
+        # of bytes those rows will occupy in the INSERT statement.
+        # Rows for different tables accumulate independently, so
+        # interleaved EdxTrackEvent, EventIp, Answer, etc. rows still
+        # end up in few, large INSERT statements. The insertSig holds
+        # the column names, Ex.: 'col1,col2':
+        self.insertBuffers = OrderedDict()
+
+        # Limits at which a buffer's rows are turned
+        # into an INSERT statement:
+        self.maxAllowedPacketSize = JSONToRelation.MAX_ALLOWED_PACKET_SIZE if maxAllowedPacketSize is None else maxAllowedPacketSize
+        self.maxRowsPerInsert = JSONToRelation.MAX_ROWS_PER_INSERT if maxRowsPerInsert is None else maxRowsPerInsert
 
         # Count JSON objects (i.e. JSON file lines) as they are passed
         # to us for parsing. Used for logging malformed entries:
@@ -350,19 +389,28 @@ class JSONToRelation(object):
             colDataType = userDefinedHintType
         self.destination.ensureColExistence(colName, colDataType, self, tableName)
 
-    def convert(self, prependColHeader=False):
+    def convert(self, prependColHeader=False, workers=1, linesPerShard=None):
         '''
         Main user-facing API method. Read from the JSON source establish
         in the __init__() call. Create a MySQL schema as the JSON is read.
         Convert each JSON object into the requested output format (e.g. CSV),
         and deliver it to the destination (e.g. a file)
 
+        If workers is greater than 1, the JSON lines are parsed in a pool
+        of that many worker processes. See convertSharded() for details.
+
         :param prependColHeader: If true, the final destination, if it is stdout or a file,
                 will have the column names prepended. Note that this option requires that
                 the output file is first written to a temp file, and then merged with the
                 completed column name header row to the final destination that was specified
                 by the client.
         :type prependColHeader: Boolean
+        :param workers: number of processes among which to split the parsing work. Default: 1,
+                i.e. all parsing happens in the calling process.
+        :type workers: int
+        :param linesPerShard: number of JSON lines handed to a worker at a time. Only
+                used when workers > 1. Default: JSONToRelation.LINES_PER_SHARD
+        :type linesPerShard: {int | None}
         '''
         savedFinalOutDest = None
         if self.destination.getOutputFormat() != self.destination.OutputFormat.SQL_INSERT_STATEMENTS:
@@ -376,38 +424,16 @@ class JSONToRelation(object):
                 # to self.destination before this point:
                 savedFinalOutDest.copySchemas(self.destination)
 
-        #*************
-        #numErrorsSoFar = 0
-        #*************
         with self.destination as outFd, self.jsonSource as inFd:
-            for jsonStr in inFd:
-                # Skip empty rows:
-                if jsonStr == '\n' or len(jsonStr) == 0:
-                    continue
-                newRow = []
-                try:
-                    # processOneJSONObject will call pushtToTable() for all
-                    # tables necessary for each event type. The method will
-                    # direct the top level event information to the table
-                    # called self.mainTableName.
-                    self.jsonParserInstance.processOneJSONObject(jsonStr, newRow)
-                except (ValueError, KeyError) as e:
-                    JSONToRelation.logger.warn('Line %s: bad JSON object: %s' % (self.makeFileCitation(), `e`))
-                    #***************
-                    # Uncomment to print the offending JSON string, and quit:
-                    #print('=====================================')
-                    #print(jsonStr)
-                    #numErrorsSoFar += 1
-                    #if numErrorsSoFar > 5:
-                    #    raise
-
-                    # Uncomment to get stacktrace for the above caught errors:
-                    #import sys
-                    #import traceback
-                    #traceback.print_tb(sys.exc_info()[2])
-                    #print('-------------------------------------')
-                    #***************
-                self.bumpLineCounter()
+            if workers > 1:
+                self.convertSharded(inFd, outFd, workers, linesPerShard)
+            else:
+                for jsonStr in inFd:
+                    # Skip empty rows:
+                    if jsonStr == '\n' or len(jsonStr) == 0:
+                        continue
+                    self.convertOneJSONLine(jsonStr)
+                    self.bumpLineCounter()
 
             # Since we hold back SQL insertion values to include them
             # all into one INSERT statement, need to flush after last
@@ -445,6 +471,166 @@ class JSONToRelation(object):
                 except:
                     pass
 
+    def convertOneJSONLine(self, jsonStr):
+        '''
+        Hand one JSON line to the parser. Malformed JSON objects
+        are logged, and otherwise skipped.
+
+        :param jsonStr: one line from the JSON source
+        :type jsonStr: String
+        '''
+        #*************
+        #numErrorsSoFar = 0
+        #*************
+        newRow = []
+        try:
+            # processOneJSONObject will call pushtToTable() for all
+            # tables necessary for each event type. The method will
+            # direct the top level event information to the table
+            # called self.mainTableName.
+            self.jsonParserInstance.processOneJSONObject(jsonStr, newRow)
+        except (ValueError, KeyError) as e:
+            JSONToRelation.logger.warn('Line %s: bad JSON object: %s' % (self.makeFileCitation(), `e`))
+            #***************
+            # Uncomment to print the offending JSON string, and quit:
+            #print('=====================================')
+            #print(jsonStr)
+            #numErrorsSoFar += 1
+            #if numErrorsSoFar > 5:
+            #    raise
+
+            # Uncomment to get stacktrace for the above caught errors:
+            #import sys
+            #import traceback
+            #traceback.print_tb(sys.exc_info()[2])
+            #print('-------------------------------------')
+            #***************
+
+    def convertSharded(self, inFd, outFd, workers, linesPerShard=None):
+        '''
+        Parse the JSON lines from inFd in a pool of worker processes.
+        The input is cut into line-aligned shards of linesPerShard lines.
+        The workers are forked from this process, so each starts out with
+        its own copy of the fully initialized parser (IP table, modulestore
+        lookups, etc.); nothing is re-read from disk.
+
+        Workers do not write any output themselves. They return the
+        rows their parser pushed for a shard, and this process feeds
+        those rows to the destination in input order.
+
+        Parser state that spans lines, like the EdX parser's per-IP
+        downtime tracking, cannot be carried from shard to shard by the
+        workers: a worker's shards don't follow each other in the input.
+        So each worker starts every shard afresh (see the parser's
+        startShard()), and leaves decisions that depend on earlier lines
+        open. This process makes them as it merges the shards in input
+        order (see the parser's mergeShardState()). With parsers that
+        implement these methods, such as EdXTrackLogJSONParser, the
+        rows are the same as in a single-process conversion, except
+        for generated keys, whichever worker finishes first.
+
+        Schema changes that a parser makes while parsing (i.e. calls
+        to ensureColExistence() for newly discovered columns) are not
+        seen by this process; use parsers with fixed schemas, such as
+        EdXTrackLogJSONParser.
+
+        :param inFd: source of JSON lines
+        :type inFd: InputSource
+        :param outFd: destination for the finished rows
+        :type outFd: OutputDisposition
+        :param workers: number of worker processes
+        :type workers: int
+        :param linesPerShard: number of JSON lines per unit of work. Default: JSONToRelation.LINES_PER_SHARD
+        :type linesPerShard: {int | None}
+        '''
+        if linesPerShard is None:
+            linesPerShard = JSONToRelation.LINES_PER_SHARD
+        # Anything buffered, but not yet written by this process
+        # would otherwise be duplicated into each forked worker:
+        outFd.flush()
+        pool = multiprocessing.Pool(workers, _initShardWorker, (self,))
+        # Results of shards that were submitted, but not merged yet.
+        # Limit their number, so that we don't read the whole input
+        # file into memory ahead of the workers:
+        pendingShards = deque()
+        try:
+            for shard in self.makeShards(inFd, linesPerShard):
+                pendingShards.append(pool.apply_async(_convertShard, (shard,)))
+                if len(pendingShards) >= 2 * workers:
+                    self.mergeShardResult(pendingShards.popleft().get(), outFd)
+            while len(pendingShards) > 0:
+                self.mergeShardResult(pendingShards.popleft().get(), outFd)
+            pool.close()
+        except:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+
+    def makeShards(self, inFd, linesPerShard):
+        '''
+        Generator over units of work for convertSharded(). Each shard
+        is a tuple (lineCounter, jsonLines), where lineCounter is the value
+        of self.lineCounter at the shard's first line. Empty lines are
+        dropped, just as in a single-process conversion.
+
+        :param inFd: source of JSON lines
+        :type inFd: InputSource
+        :param linesPerShard: maximum number of lines per shard
+        :type linesPerShard: int
+        '''
+        jsonLines = []
+        for jsonStr in inFd:
+            # Skip empty rows:
+            if jsonStr == '\n' or len(jsonStr) == 0:
+                continue
+            jsonLines.append(jsonStr)
+            if len(jsonLines) >= linesPerShard:
+                yield (self.lineCounter, jsonLines)
+                self.lineCounter += len(jsonLines)
+                jsonLines = []
+        if len(jsonLines) > 0:
+            yield (self.lineCounter, jsonLines)
+            self.lineCounter += len(jsonLines)
+
+    def convertShard(self, shard):
+        '''
+        Runs in a worker process of convertSharded(). Parses the
+        lines of one shard, and returns the rows that the parser pushed,
+        together with any statistics the parser collected for the shard.
+
+        :param shard: tuple (lineCounter, jsonLines) as produced by makeShards()
+        :type shard: (int, [String])
+        :return: the pushed rows, in the order they were pushed, the parser's statistics, and its state at the shard's end
+        :rtype: ([{(String,String,List<<any>>) | List<<any>>}], <any>, <any>)
+        '''
+        (self.lineCounter, jsonLines) = shard
+        self.shardRows = []
+        self.jsonParserInstance.startShard()
+        try:
+            for jsonStr in jsonLines:
+                self.convertOneJSONLine(jsonStr)
+                self.bumpLineCounter()
+            return (self.shardRows, self.jsonParserInstance.takeWorkerStats(), self.jsonParserInstance.takeShardState())
+        finally:
+            self.shardRows = None
+
+    def mergeShardResult(self, shardResult, outFd):
+        '''
+        Have the parser complete the rows returned by one worker shard,
+        write them to the destination, and pass the worker's statistics
+        to the parser. Must be called for the shards in input order.
+
+        :param shardResult: rows, statistics, and parser state as returned by convertShard()
+        :type shardResult: ([{(String,String,List<<any>>) | List<<any>>}], <any>, <any>)
+        :param outFd: destination for the rows
+        :type outFd: OutputDisposition
+        '''
+        (rows, workerStats, shardState) = shardResult
+        rows = self.jsonParserInstance.mergeShardState(rows, shardState)
+        for row in rows:
+            self.processFinishedRow(row, outFd)
+        self.jsonParserInstance.mergeWorkerStats(workerStats)
 
     def pushString(self, whatToWrite):
         '''
@@ -455,6 +641,9 @@ class JSONToRelation(object):
         :param whatToWrite: a complete SQL statement.
         :type whatToWrite: String
         '''
+        # Keep statements in order with any held-back INSERT values:
+        if len(self.insertBuffers) > 0:
+            self.processFinishedRow('FLUSH', self.destination)
         self.destination.write(whatToWrite)
 
     def pushToTable(self, row, outFd=None):
@@ -473,6 +662,15 @@ class JSONToRelation(object):
         #if row.count('eventID') > 1:
         #    raise ValueError("Found it!: %s" % self.tmpJSONStr)
         #****************************
+        if self.shardRows is not None:
+            # We are a worker process of convertSharded(). The parent
+            # process does all the writing. The parser may keep modifying
+            # the values array after pushing it, so ship a copy:
+            if isinstance(row, tuple):
+                (tableName, insertSig, valsArray) = row
+                row = (tableName, insertSig, list(valsArray))
+            self.shardRows.append(row)
+            return
         if outFd is None:
             outFd = self.destination
         self.processFinishedRow(row, outFd)
@@ -502,172 +700,276 @@ class JSONToRelation(object):
         # information than CSV destined parsers. MySQL dumps provide
         # a list ('tableName', 'insertSig', [valsArray]), while the
         # others produce just an array of values:
-        if isinstance(filledNewRow, tuple) or filledNewRow == "FLUSH":
-            # Calling parser created INSERT statements:
-            filledNewRow = self.prepareMySQLRow(filledNewRow)
-        if filledNewRow is not None:
+        if isinstance(filledNewRow, tuple) and \
+            isinstance(outFd, OutputFile) and \
+            outFd.getOutputFormat() == OutputDisposition.OutputFormat.CSV:
+            # Only the CSV files are wanted; no need to go
+            # through INSERT statements:
+            (tableName, insertSig, valsArray) = filledNewRow #@UnusedVariable
             try:
-                outFd.writerow(filledNewRow)
+                outFd.writeCSVValuesRow(tableName, self.encodeValuesRow(valsArray))
             except Exception as e:
-                JSONToRelation.logger.warn('Error during writerow() call in json_to_relation.processFinishRow(): %s' % `e`)
+                JSONToRelation.logger.warn('Error during writeCSVValuesRow() call in json_to_relation.processFinishRow(): %s' % `e`)
+            return
+        if isinstance(filledNewRow, tuple) and \
+            isinstance(outFd, OutputFile) and \
+            outFd.getOutputFormat() == OutputDisposition.OutputFormat.PARQUET:
+            # Columnar files take the values as they are:
+            (tableName, insertSig, valsArray) = filledNewRow
+            try:
+                outFd.writeParquetRow(tableName, insertSig, valsArray)
+            except Exception as e:
+                JSONToRelation.logger.warn('Error during writeParquetRow() call in json_to_relation.processFinishRow(): %s' % `e`)
+            return
+        if filledNewRow == 'FLUSH':
+            # Write out the held-back values of all tables, one
+            # INSERT statement at a time:
+            for insertBatch in self.popInsertBatches():
+                self.writeInsertBatch(insertBatch, outFd)
+            return
+        if isinstance(filledNewRow, tuple):
+            # Calling parser created INSERT statements:
+            insertBatch = self.holdBackInsertRow(filledNewRow)
+            if insertBatch is not None:
+                self.writeInsertBatch(insertBatch, outFd)
+            return
+        try:
+            outFd.writerow(filledNewRow)
+        except Exception as e:
+            JSONToRelation.logger.warn('Error during writerow() call in json_to_relation.processFinishRow(): %s' % `e`)
+
+    def writeInsertBatch(self, insertBatch, outFd):
+        '''
+        Write one INSERT statement for a batch of held-back rows. When
+        the destination also wants CSV, the batch's encoded rows are
+        handed along, so they need not be parsed out of the statement.
+
+        :param insertBatch: table name, insert signature, and encoded rows as returned by holdBackInsertRow()
+        :type insertBatch: (String, String, [String])
+        :param outFd: an instance of a class that writes to the destination
+        :type outFd: OutputDisposition
+        '''
+        (tableName, insertSig, encodedRows) = insertBatch
+        try:
+            if isinstance(outFd, OutputFile):
+                outFd.writeInsertStatement(self.makeInsertStatement(tableName, insertSig, encodedRows),
+                                           tableName,
+                                           encodedRows)
+            else:
+                outFd.writerow(self.makeInsertStatement(tableName, insertSig, encodedRows))
+        except Exception as e:
+            JSONToRelation.logger.warn('Error during writerow() call in json_to_relation.processFinishRow(): %s' % `e`)
 
     def prepareMySQLRow(self, insertInfo):
         '''
         Receives either a triple ('tableName', 'insertSig', [valsArray]),
         or the string 'FLUSH'. Generates either None, or a legal MySQL insert statement.
-        The method is lazy.
-
-        It collects values to be inserted into the same table, and the same
-        columns within that table, and returns a non-Null string only when
-        the incoming insertInfo is for a different table, or a different set
-        of columns in the same table (as the previous calls). In that case the
-        returned string is a legal MySQL INSERT statement, possibly multi-valued.
+        The method is lazy: see holdBackInsertRow() for when
+        an INSERT statement is generated.
 
-        If insertInfo is the string 'FLUSH', then an INSERT statement is
-        returned for any held-back prior values.
+        If insertInfo is the string 'FLUSH', then the INSERT statements
+        for all held-back values are returned, separated by newlines.
 
         :param insertInfo: information on what to generate for MySQL dumps
         :type insertInfo: {(String, String, [<any>]) | String)}
+        :return: INSERT statement(s), or None if all values are held back
+        :rtype: {String | None}
+        '''
+        if insertInfo == 'FLUSH':
+            insertStatements = self.finalizeInsertStatements()
+            return '\n'.join(insertStatements) if len(insertStatements) > 0 else None
+        insertBatch = self.holdBackInsertRow(insertInfo)
+        if insertBatch is None:
+            return None
+        return self.makeInsertStatement(*insertBatch)
+
+    def holdBackInsertRow(self, insertInfo):
+        '''
+        Receives a triple ('tableName', 'insertSig', [valsArray]). The values
+        are encoded right away, and held back in a buffer for the given table
+        and set of columns. Each such buffer fills independently of the others.
+        A batch of rows is returned only when the INSERT statement would exceed
+        self.maxAllowedPacketSize bytes or self.maxRowsPerInsert rows. In that case
+        the batch holds the previously held-back rows, and the new values start
+        the next batch.
+
+        :param insertInfo: information on what to generate for MySQL dumps
+        :type insertInfo: (String, String, [<any>])
+        :return: None, or table name, insert signature, and encoded rows for one INSERT statement
+        :rtype: {(String, String, [String]) | None}
         '''
         try:
             (tableName, insertSig, valsArray) = insertInfo
         except ValueError:
-            if insertInfo == 'FLUSH':
-                return self.finalizeInsertStatement()
-            else:
-                raise ValueError('Bad argument to prepareMySQLRow: %s' % str(insertInfo))
-
-        # Compute approximate new size of hold-back buffer with these new values:
-        newCacheSize = self.valsCacheSize + self.calculateHeldBackDataSize(valsArray)
-
-        # Have we started accumulating values in an earlier call?
-        if self.currInsertSig is not None:
-            if tableName == self.currOutTable and insertSig == self.currInsertSig:
-                if newCacheSize > JSONToRelation.MAX_ALLOWED_PACKET_SIZE:
-                    # New vals could be held back, but buffer is full:
-                    # Construct INSERT statement from the cached values:
-                    insertStatement = self.finalizeInsertStatement()
-                    # Start accumulating values for this new INSERT request:
-                    self.currOutTable = tableName
-                    self.currInsertSig = insertSig
-                    self.currValsArray.append(copy.copy(valsArray))
-                    return insertStatement
-                else:
-                    # Can hold back the new values:
-                    self.valsCacheSize = newCacheSize
-                    self.currValsArray.append(copy.copy(valsArray))
-                    return None
-            else:
-                # Were accumulating vals, but this call is for a different
-                # table or set of columns:
-                insertStatement = self.finalizeInsertStatement()
-                # Start accumulating values for this new INSERT request:
-                self.currOutTable = tableName
-                self.currInsertSig = insertSig
-                # Copy the array into the cache buffer: valsArray
-                # is passed by reference, and subsequent changes
-                # would overwrite the cache. Shallow copy suffices,
-                # because all row values are base types:
-                self.currValsArray = [copy.copy(valsArray)]
-                return insertStatement
-
-        # We have not yet started to accumulate values:
+            raise ValueError('Bad argument to prepareMySQLRow: %s' % str(insertInfo))
+
+        # Encoding takes a snapshot of the values, so the parser
+        # may keep modifying valsArray after this call:
+        encodedRow = self.encodeValuesRow(valsArray)
+        # Count the bytes the row will occupy in the INSERT
+        # statement, including the separator, parens, and
+        # indentation that surround each row in the VALUES part:
+        if encodedRow.__class__ is str:
+            rowSize = len(encodedRow) + 8
         else:
-            # If even the first INSERT values are too big for
-            # the empty hold-back buffer: just send the INSERT
+            rowSize = len(encodedRow.encode('utf-8')) + 8
+        bufferKey = (tableName, insertSig)
+        try:
+            insertBuffer = self.insertBuffers[bufferKey]
+        except KeyError:
+            # The INSERT INTO...VALUES part, minus what
+            # the above counted for the first row:
+            statementSize = len(tableName) + len(insertSig) + 23 + rowSize
+            # If even the new values alone are too big for
+            # an empty hold-back buffer: just send the INSERT
             # right away:
-            if newCacheSize > JSONToRelation.MAX_ALLOWED_PACKET_SIZE:
-                valuesPartFileStr = self.constructValuesStr(valsArray)
-                insertStatement = "INSERT INTO %s (%s) VALUES %s;" % (tableName, insertSig, valuesPartFileStr.getvalue())
-                return insertStatement
-            # Hold back the new values:
-            self.valsCacheSize = newCacheSize
-            self.currOutTable = tableName
-            self.currInsertSig = insertSig
-            # Copy the array into the cache buffer: valsArray
-            # is passed by reference, and subsequent changes
-            # would overwrite the cache. Shallow copy suffices,
-            # because all row values are base types:
-            self.currValsArray = [copy.copy(valsArray)]
+            if statementSize > self.maxAllowedPacketSize:
+                return (tableName, insertSig, [encodedRow])
+            self.insertBuffers[bufferKey] = [[encodedRow], statementSize]
             return None
 
-    def finalizeInsertStatement(self):
+        if insertBuffer[1] + rowSize > self.maxAllowedPacketSize or \
+            len(insertBuffer[0]) >= self.maxRowsPerInsert:
+            # Buffer is full: hand out the held-back values,
+            # and start a new batch with the new ones:
+            self.insertBuffers[bufferKey] = [[encodedRow], len(tableName) + len(insertSig) + 23 + rowSize]
+            return (tableName, insertSig, insertBuffer[0])
+
+        # Can hold back the new values:
+        insertBuffer[0].append(encodedRow)
+        insertBuffer[1] += rowSize
+        return None
+
+    def popInsertBatch(self, tableName, insertSig):
+        '''
+        Remove the values held back for the given table and set of columns.
+
+        :param tableName: table for which values were held back
+        :type tableName: String
+        :param insertSig: column names part of the INSERT statement. Ex.: 'col1,col2'
+        :type insertSig: String
+        :return: None if nothing to insert. Else table name, insert signature, and encoded rows
+        :rtype: {(String, String, [String]) | None}
+        '''
+        insertBuffer = self.insertBuffers.pop((tableName, insertSig), None)
+        if insertBuffer is None or len(insertBuffer[0]) == 0:
+            # Nothing to INSERT:
+            return None
+        return (tableName, insertSig, insertBuffer[0])
+
+    def popInsertBatches(self):
+        '''
+        Remove the values held back for all tables, ordered
+        by when their buffer received its first values.
+
+        :return: table name, insert signature, and encoded rows for each INSERT statement
+        :rtype: [(String, String, [String])]
+        '''
+        insertBatches = []
+        for (tableName, insertSig) in self.insertBuffers.keys():
+            insertBatch = self.popInsertBatch(tableName, insertSig)
+            if insertBatch is not None:
+                insertBatches.append(insertBatch)
+        return insertBatches
+
+    def finalizeInsertStatement(self, tableName, insertSig):
         '''
-        Create a possibly multivalued INSERT statement from what is
-        stored in self.currOutTable, self.currInsertSig, and self.currValsArray.
-        Example return::
+        Create a possibly multivalued INSERT statement from the values
+        held back for the given table and set of columns, and empty
+        that buffer. Example return::
 
            INSERT INTO myTable (col2, col2) VALUES
               ('foo',10),
               ('bar',20);
 
+        :param tableName: table for which values were held back
+        :type tableName: String
+        :param insertSig: column names part of the INSERT statement. Ex.: 'col1,col2'
+        :type insertSig: String
         :return: a fully formed SQL INSERT statement, possibly including multiple values. None if nothing to insert.
         :rtype: {String | None}
         '''
+        insertBatch = self.popInsertBatch(tableName, insertSig)
+        if insertBatch is None:
+            return None
+        return self.makeInsertStatement(*insertBatch)
 
-        try:
-            if len(self.currValsArray) == 0:
-                # Nothing to INSERT:
-                res = None
-                return res
+    def finalizeInsertStatements(self):
+        '''
+        Create INSERT statements for all held-back values, and
+        empty all hold-back buffers. The statements are ordered
+        by when their buffer received its first values.
 
-            valsFileStr = self.constructValuesStr(self.currValsArray)
+        :return: fully formed SQL INSERT statements; empty if nothing was held back
+        :rtype: [String]
+        '''
+        return [self.makeInsertStatement(*insertBatch) for insertBatch in self.popInsertBatches()]
 
-            res = "INSERT INTO %s (%s) VALUES %s;" % (self.currOutTable, self.currInsertSig, valsFileStr.getvalue())
-        finally:
-            # We are no longer accumulating INSERT values right now:
-            self.currOutTable = None
-            self.currInsertSig = None
-            self.currValsArray = []
-            self.insertValCacheSize = 0
-            return res
-
-    def constructValuesStr(self, valsArrays):
-        '''
-        Takes an array of arrays that hold the values to use in
-        an INSERT statement. Ex: [['foo',10],['bar',20]]. Returns
-        a StringIO string file containing a legal INSERT statement's
-        VALUES part: ('foo',10),('bar',20)
-
-        :param valsArrays: array of values arrays
-        :type valsArrays: [[<any>]]
-        :return: IOString string file with legal VALUES section of INSERT statement
-
-        :rtype: IOString
-        '''
-        # Build the values part:
-        valsFileStr = StringIO()
-        # Avoid putting anything into the
-        # file string in the nested loop below, so
-        # that noting needs to be stripped
-        # out afterwards; avoids a string copy.
-        # Not sure whether this optimization is
-        # needed, but there it is:
-        isFirstValTuple = True
-        isFirstVal = True
-        for insertVals in valsArrays:
-            if isFirstValTuple:
-                valsFileStr.write('\n    (')
-                isFirstValTuple = False
+    def makeInsertStatement(self, tableName, insertSig, encodedRows):
+        '''
+        Create an INSERT statement from rows that were already
+        encoded by encodeValuesRow().
+
+        :param tableName: table into which to insert
+        :type tableName: String
+        :param insertSig: column names part of the INSERT statement. Ex.: 'col1,col2'
+        :type insertSig: String
+        :param encodedRows: the values of each row. Ex.: ["'foo',10", "'bar',20"]
+        :type encodedRows: [String]
+        :return: a fully formed SQL INSERT statement
+        :rtype: String
+        '''
+        return "INSERT INTO %s (%s) VALUES \n    (%s);" % (tableName, insertSig, '),\n    ('.join(encodedRows))
+
+    @classmethod
+    def maxPacketSizeFromServer(cls, mysqldb):
+        '''
+        Ask a MySQL server for its max_allowed_packet setting, and
+        return the length of the longest INSERT statement to generate
+        for that server. Pass the result to the constructor's
+        maxAllowedPacketSize.
+
+        :param mysqldb: connection to the server into which the output will be loaded
+        :type mysqldb: MySQLDB
+        :return: the server's max_allowed_packet minus PACKET_SIZE_MARGIN
+        :rtype: int
+        '''
+        for (serverPacketSize,) in mysqldb.query('SELECT @@max_allowed_packet'):
+            return int(serverPacketSize) - cls.PACKET_SIZE_MARGIN
+        raise ValueError('Could not obtain max_allowed_packet from MySQL server.')
+
+    def encodeValuesRow(self, insertVals):
+        '''
+        Takes the values for one row of an INSERT statement, and
+        returns them as they appear between the parentheses of
+        the statement's VALUES part. Ex: ['foo',10,None] returns
+        'foo',10,null. The same string is one line in the CSV
+        file of the row's table.
+
+        :param insertVals: values of one row
+        :type insertVals: [<any>]
+        :return: comma separated values
+        :rtype: String
+        '''
+        encodedVals = []
+        append = encodedVals.append
+        for insertVal in insertVals:
+            # Dispatch on the value's own type: parsers do not
+            # always push values matching their column's type
+            # (e.g. 'null' strings for INT columns). Plain strings,
+            # the most common case, are checked first. They get a quote
+            # char arround them, except for 'null', which needs to be
+            # written without quotes:
+            if insertVal.__class__ is str:
+                append("'" + insertVal + "'" if insertVal != 'null' else insertVal)
+            # Turn 'None' entries from JSON-converted empty JSON flds to null:
+            elif insertVal is None:
+                append('null')
+            elif isinstance(insertVal, basestring):
+                append("'" + insertVal + "'" if insertVal != 'null' else insertVal)
             else:
-                valsFileStr.write(',\n    (')
-            for insertVal in insertVals:
-                if isFirstVal:
-                    isFirstVal = False
-                else:
-                    valsFileStr.write(str(','))
-                # Ensure that strings get a quote char arround them, except
-                # for 'null', which needs to be written without quotes:
-                if insertVal == 'null':
-                    valsFileStr.write(insertVal)
-                # Turn 'None' entries from JSON-converted empty JSON flds to null:
-                elif insertVal == None:
-                    valsFileStr.write('null')
-                else:
-                    valsFileStr.write("'" + insertVal + "'" if isinstance(insertVal,basestring) else str(insertVal))
-            valsFileStr.write(')')
-            isFirstVal = True
-        return valsFileStr
+                append(str(insertVal))
+        return ','.join(encodedVals)
 
     def getSchema(self, tableName=None):
         '''
@@ -713,25 +1015,6 @@ class JSONToRelation(object):
     def bumpNextNewColPos(self):
         self.nextNewColPos += 1
 
-    def calculateHeldBackDataSize(self, valueArray):
-        '''
-        Computes number of ASCII bytes needed for the
-        values in the given array. Used to estimate
-        when held-back INSERT data needs to be flushed
-        to server. Ex: ['foo', 10] returns 7.
-
-        :param valueArray: array of mixed-type values to be INSERTed into MySQL at some point
-        :type valueArray: [<any>]
-        '''
-        arrSize = 0
-        for val in valueArray:
-            arrSize += len(str(val))
-        # Add bytes for commas, spaces after the commas, and
-        # a pair of quotes around strings (assume worst case of
-        # every value being a string:
-        arrSize += 4*len(valueArray)
-        return arrSize
-
     def ensureLegalIdentifierChars(self, proposedMySQLName):
         '''
         Given a proposed MySQL identifier, such as a column name,
@@ -0,0 +1,94 @@
+# Copyright (c) 2014, Stanford University
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+'''
+Created on Oct 18, 2026
+
+A bounded memo with least-recently-used eviction and
+hit/miss counters. Used in front of lookups that the
+transform repeats many times with the same keys, such
+as IP-to-country translation.
+'''
+
+from collections import OrderedDict
+
+class LRUCache(object):
+    '''
+    Dict-like cache that holds at most maxSize entries.
+    When full, adding an entry evicts the entry that
+    was least recently read or written.
+    '''
+
+    def __init__(self, maxSize):
+        '''
+        :param maxSize: maximum number of entries kept; must be at least 1
+        :type maxSize: int
+        '''
+        if maxSize < 1:
+            raise ValueError("LRUCache size must be at least 1; was %s" % str(maxSize))
+        self.maxSize = maxSize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        '''
+        Return the value cached under key, or default if
+        key is not cached. Counts a hit or a miss.
+
+        :param key: lookup key
+        :type key: <hashable>
+        :param default: value to return if key is not in the cache
+        :type default: <any>
+        '''
+        try:
+            # Re-insert to mark as most recently used:
+            value = self.entries.pop(key)
+        except KeyError:
+            self.misses += 1
+            return default
+        self.entries[key] = value
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        '''
+        Cache value under key, evicting the least
+        recently used entry if the cache is full.
+        '''
+        try:
+            del self.entries[key]
+        except KeyError:
+            if len(self.entries) >= self.maxSize:
+                self.entries.popitem(last=False)
+        self.entries[key] = value
+
+    def clear(self):
+        self.entries.clear()
+
+    def takeCounts(self):
+        '''
+        Return hits and misses since the previous call,
+        and start counting from zero.
+
+        :return: number of hits and of misses
+        :rtype: (int,int)
+        '''
+        counts = (self.hits, self.misses)
+        self.hits = 0
+        self.misses = 0
+        return counts
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __len__(self):
+        return len(self.entries)
@@ -0,0 +1,300 @@
+# Copyright (c) 2014, Stanford University
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+'''
+Created on Oct 18, 2026
+
+Minimal reader for MaxMind DB (.mmdb) files, such as the GeoLite2
+country database in data/GeoLite2-Country.mmdb.gz.
+
+The database file is memory mapped. A lookup walks the binary search
+tree one address bit at a time, directly on the mapped bytes, and only
+the data record at the end of the walk is decoded into Python objects.
+Both IPv4 and IPv6 addresses are supported.
+
+File format: http://maxmind.github.io/MaxMind-DB/
+'''
+
+import gzip
+import mmap
+import os
+import shutil
+import socket
+import struct
+import tempfile
+
+
+class MMDBReader(object):
+    '''
+    Looks up IP addresses in a MaxMind DB file.
+    '''
+
+    METADATA_START_MARKER = '\xab\xcd\xefMaxMind.com'
+    # Only the end of the file is searched for the metadata:
+    METADATA_MAX_SIZE = 128 * 1024
+    # Zero bytes between the search tree and the data section:
+    DATA_SECTION_SEPARATOR_SIZE = 16
+
+    # Data field types:
+    TYPE_EXTENDED  = 0
+    TYPE_POINTER   = 1
+    TYPE_UTF8      = 2
+    TYPE_DOUBLE    = 3
+    TYPE_BYTES     = 4
+    TYPE_UINT16    = 5
+    TYPE_UINT32    = 6
+    TYPE_MAP       = 7
+    TYPE_INT32     = 8
+    TYPE_UINT64    = 9
+    TYPE_UINT128   = 10
+    TYPE_ARRAY     = 11
+    TYPE_CONTAINER = 12
+    TYPE_END       = 13
+    TYPE_BOOLEAN   = 14
+    TYPE_FLOAT     = 15
+
+    def __init__(self, dbPath):
+        '''
+        Memory map the given database file, and read its metadata.
+
+        :param dbPath: path to an uncompressed .mmdb file
+        :type dbPath: String
+        :raise ValueError: if the file is not a MaxMind DB file
+        '''
+        with open(dbPath, 'rb') as fd:
+            self.buf = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+        metadataStart = self.buf.rfind(MMDBReader.METADATA_START_MARKER,
+                                       max(0, self.buf.size() - MMDBReader.METADATA_MAX_SIZE))
+        if metadataStart < 0:
+            raise ValueError("File %s is not a MaxMind DB file." % dbPath)
+        metadataStart += len(MMDBReader.METADATA_START_MARKER)
+        (self.metadata, offset) = self.decode(metadataStart, metadataStart) #@UnusedVariable
+
+        self.nodeCount  = self.metadata['node_count']
+        self.recordSize = self.metadata['record_size']
+        self.ipVersion  = self.metadata['ip_version']
+        if self.recordSize not in (24, 28, 32):
+            raise ValueError("Unsupported MaxMind DB record size: %s" % str(self.recordSize))
+        self.nodeByteSize = self.recordSize / 4
+        searchTreeSize = self.nodeByteSize * self.nodeCount
+        self.dataSectionStart = searchTreeSize + MMDBReader.DATA_SECTION_SEPARATOR_SIZE
+
+        # In IPv6 trees, IPv4 addresses live under ::/96;
+        # remember the node where that subtree starts:
+        self.ipv4StartNode = 0
+        if self.ipVersion == 6:
+            node = 0
+            for bitNum in range(96): #@UnusedVariable
+                if node >= self.nodeCount:
+                    break
+                node = self.readNode(node, 0)
+            self.ipv4StartNode = node
+
+    def close(self):
+        self.buf.close()
+
+    def lookup(self, ipStr):
+        '''
+        Return the data record for the network that contains
+        the given IP address, or None if the database holds
+        no data for the address.
+
+        :param ipStr: IPv4 address like '171.64.65.66', or IPv6 address like '2001:db8::1'
+        :type ipStr: String
+        :return: the decoded data record, usually a dict
+        :rtype: {<any> | None}
+        :raise ValueError: if ipStr is not a valid IP address
+        '''
+        offset = self.findDataOffset(ipStr)
+        if offset is None:
+            return None
+        return self.decode(offset, self.dataSectionStart)[0]
+
+    def findDataOffset(self, ipStr):
+        '''
+        Walk the search tree for the given IP address. Returns the
+        offset of its data record in the file, or None if the database
+        has no data for the address. Since many networks share the same
+        record, callers can use the offset as a key for caching decoded
+        records.
+
+        :param ipStr: IPv4 or IPv6 address string
+        :type ipStr: String
+        :return: file offset of the data record
+        :rtype: {int | None}
+        :raise ValueError: if ipStr is not a valid IP address
+        '''
+        if ipStr is None:
+            raise ValueError("IP string is not a valid IP address: None")
+        try:
+            if ':' in ipStr:
+                if self.ipVersion != 6:
+                    raise ValueError("Cannot look up IPv6 address in IPv4 database: '%s'" % ipStr)
+                packedIP = socket.inet_pton(socket.AF_INET6, ipStr)
+                node = 0
+            else:
+                packedIP = socket.inet_pton(socket.AF_INET, ipStr)
+                node = self.ipv4StartNode
+        except (socket.error, TypeError):
+            raise ValueError("IP string is not a valid IP address: '%s'" % str(ipStr))
+
+        nodeCount = self.nodeCount
+        for byte in packedIP:
+            byte = ord(byte)
+            for bitPos in range(7, -1, -1):
+                if node >= nodeCount:
+                    break
+                node = self.readNode(node, (byte >> bitPos) & 1)
+        if node <= nodeCount:
+            # node == nodeCount means 'no data':
+            return None
+        return (node - nodeCount) - MMDBReader.DATA_SECTION_SEPARATOR_SIZE + self.dataSectionStart
+
+    def readNode(self, nodeNum, bit):
+        '''
+        Return the left (bit==0) or right (bit==1)
+        record of the given search tree node.
+        '''
+        buf = self.buf
+        base = nodeNum * self.nodeByteSize
+        if self.recordSize == 24:
+            offset = base + 3 * bit
+            return (ord(buf[offset]) << 16) | (ord(buf[offset+1]) << 8) | ord(buf[offset+2])
+        elif self.recordSize == 28:
+            middle = ord(buf[base + 3])
+            if bit == 0:
+                middle = (middle & 0xF0) >> 4
+            else:
+                middle = middle & 0x0F
+            offset = base + 4 * bit
+            return (middle << 24) | (ord(buf[offset]) << 16) | (ord(buf[offset+1]) << 8) | ord(buf[offset+2])
+        else:
+            offset = base + 4 * bit
+            return struct.unpack('>I', buf[offset:offset+4])[0]
+
+    def decode(self, offset, sectionStart):
+        '''
+        Decode the data field at the given offset. Pointers in
+        the data are relative to sectionStart.
+
+        :param offset: file offset of the field's control byte
+        :type offset: int
+        :param sectionStart: file offset of the section that holds the field
+        :type sectionStart: int
+        :return: decoded value, and offset of the next field
+        :rtype: (<any>, int)
+        '''
+        buf = self.buf
+        ctrlByte = ord(buf[offset])
+        offset += 1
+        fieldType = ctrlByte >> 5
+        if fieldType == MMDBReader.TYPE_POINTER:
+            pointerSize = ((ctrlByte >> 3) & 0x3) + 1
+            pointerBytes = buf[offset:offset+pointerSize]
+            offset += pointerSize
+            if pointerSize == 1:
+                pointer = ((ctrlByte & 0x7) << 8) | ord(pointerBytes)
+            elif pointerSize == 2:
+                pointer = (((ctrlByte & 0x7) << 16) | struct.unpack('>H', pointerBytes)[0]) + 2048
+            elif pointerSize == 3:
+                pointer = (((ctrlByte & 0x7) << 24) | struct.unpack('>I', '\x00' + pointerBytes)[0]) + 526336
+            else:
+                pointer = struct.unpack('>I', pointerBytes)[0]
+            (value, unusedOffset) = self.decode(sectionStart + pointer, sectionStart) #@UnusedVariable
+            return (value, offset)
+
+        if fieldType == MMDBReader.TYPE_EXTENDED:
+            fieldType = 7 + ord(buf[offset])
+            offset += 1
+
+        size = ctrlByte & 0x1f
+        if size >= 29:
+            if size == 29:
+                size = 29 + ord(buf[offset])
+                offset += 1
+            elif size == 30:
+                size = 285 + struct.unpack('>H', buf[offset:offset+2])[0]
+                offset += 2
+            else:
+                size = 65821 + struct.unpack('>I', '\x00' + buf[offset:offset+3])[0]
+                offset += 3
+
+        if fieldType == MMDBReader.TYPE_MAP:
+            value = {}
+            for entryNum in range(size): #@UnusedVariable
+                (key, offset) = self.decode(offset, sectionStart)
+                (value[key], offset) = self.decode(offset, sectionStart)
+            return (value, offset)
+        if fieldType == MMDBReader.TYPE_ARRAY:
+            value = []
+            for entryNum in range(size): #@UnusedVariable
+                (entry, offset) = self.decode(offset, sectionStart)
+                value.append(entry)
+            return (value, offset)
+        if fieldType == MMDBReader.TYPE_BOOLEAN:
+            return (size != 0, offset)
+
+        fieldBytes = buf[offset:offset+size]
+        offset += size
+        if fieldType == MMDBReader.TYPE_UTF8:
+            return (fieldBytes.decode('utf-8'), offset)
+        if fieldType == MMDBReader.TYPE_DOUBLE:
+            return (struct.unpack('>d', fieldBytes)[0], offset)
+        if fieldType == MMDBReader.TYPE_FLOAT:
+            return (struct.unpack('>f', fieldBytes)[0], offset)
+        if fieldType == MMDBReader.TYPE_BYTES:
+            return (fieldBytes, offset)
+        if fieldType == MMDBReader.TYPE_INT32:
+            return (struct.unpack('>i', fieldBytes.rjust(4, '\x00'))[0], offset)
+        if fieldType in (MMDBReader.TYPE_UINT16, MMDBReader.TYPE_UINT32,
+                         MMDBReader.TYPE_UINT64, MMDBReader.TYPE_UINT128):
+            value = 0
+            for byte in fieldBytes:
+                value = (value << 8) | ord(byte)
+            return (value, offset)
+        raise ValueError("Unsupported MaxMind DB data type %d at offset %d" % (fieldType, offset))
+
+    @classmethod
+    def ensureDecompressed(cls, gzPath):
+        '''
+        Return the path to an uncompressed copy of the given
+        gzipped database. The copy is made next to the .gz file,
+        or in the temp directory if that is not writable, and is
+        only redone when the .gz file is newer than the copy.
+
+        :param gzPath: path to a gzipped .mmdb file
+        :type gzPath: String
+        :return: path to the uncompressed .mmdb file
+        :rtype: String
+        '''
+        dbPath = gzPath[:-3] if gzPath.endswith('.gz') else gzPath + '.mmdb'
+        for candidatePath in (dbPath, os.path.join(tempfile.gettempdir(), os.path.basename(dbPath))):
+            if os.path.exists(candidatePath) and \
+               os.path.getmtime(candidatePath) >= os.path.getmtime(gzPath):
+                return candidatePath
+            try:
+                # Decompress into a temp file, and move into place
+                # when done, so that concurrent transforms never see
+                # a partial database:
+                (fd, tmpPath) = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(candidatePath)))
+                with os.fdopen(fd, 'wb') as outFd:
+                    gzFd = gzip.open(gzPath, 'rb')
+                    try:
+                        shutil.copyfileobj(gzFd, outFd)
+                    finally:
+                        gzFd.close()
+                # mkstemp() creates files readable only by their owner:
+                os.chmod(tmpPath, 0644)
+                os.rename(tmpPath, candidatePath)
+                return candidatePath
+            except (IOError, OSError):
+                continue
+        raise IOError("Could not decompress %s" % gzPath)
@@ -19,11 +19,17 @@ human readable form.
 '''
 from UserDict import DictMixin
 import csv
-import json
+import decimal
 import os
 import cPickle
 import re
+import sqlite3
 import subprocess
+import tempfile
+
+import ijson
+
+from lruCache import LRUCache
 
 class ModulestoreImporter(DictMixin):
     '''
@@ -56,13 +62,23 @@ class ModulestoreImporter(DictMixin):
     To save time for Python clients, the hash-to-info dict is pickled to a file
     as a cache. Clients may choose to use this cache as part of instance construction.
     
+    Alternatively, with lookupStore=SQLITE_STORE, the hash-to-info information
+    is kept in an SQLite file instead of a pickle. Lookups then query that file,
+    so the information is never loaded into memory as a whole. Parallel
+    transforms share the file through the OS page cache, rather than each
+    holding its own copy of the dict.
+    
     Look for string 'non-Stanford' for modifications needed in installations
     other than Stanford.
     '''
 
     hashLookupCache = None
 
-    def __init__(self, jsonFileName, useCache=True, pickleCachePath=None, parent=None):
+    # Kinds of cache for the hash-->info lookup:
+    PICKLE_STORE = 'pickle'
+    SQLITE_STORE = 'sqlite'
+
+    def __init__(self, jsonFileName, useCache=True, pickleCachePath=None, parent=None, lookupStore=PICKLE_STORE):
         '''
         Prepares instance for subsequent calls to getDisplayName() or
         export(). Preparations include looking for either the given file
@@ -91,12 +107,21 @@ class ModulestoreImporter(DictMixin):
                methods logInfo(), logWarn(), logDebug(), and logError(). If this
                argument is left at None, no logging is done.
         :type parent: GenericJSONParser
+        :param lookupStore: PICKLE_STORE to hold the hash-->info dict in memory, and
+               cache it in a pickle file; SQLITE_STORE to keep it in an SQLite file
+               next to where the pickle file would be (extension .sqlite), and query
+               that file for each lookup.
+        :type lookupStore: String
         @raise OSError: when there is a problem calling the cronRefreshModuleStore.sh script.
         @raise ValueError: when modulestore JSON could not be parsed.
         '''
         self.useCache = useCache
         self.jsonFileName = jsonFileName
         self.parent = parent
+        if lookupStore not in (ModulestoreImporter.PICKLE_STORE, ModulestoreImporter.SQLITE_STORE):
+            raise ValueError("Unknown lookup store '%s'; use '%s' or '%s'" %\
+                             (lookupStore, ModulestoreImporter.PICKLE_STORE, ModulestoreImporter.SQLITE_STORE))
+        self.lookupStore = lookupStore
         
         # Regex to identify long course names that end
         # with an edX hash string: 'Medicine/HRP259/4820b254e28c4889b760884ffd049ce'
@@ -110,6 +135,11 @@ class ModulestoreImporter(DictMixin):
             self.pickleCachePath = os.path.join(os.path.dirname(__file__), 'data/hashLookup.pkl')
         else:
             self.pickleCachePath = pickleCachePath
+        self.sqliteCachePath = os.path.splitext(self.pickleCachePath)[0] + '.sqlite'
+        if lookupStore == ModulestoreImporter.SQLITE_STORE:
+            cachePath = self.sqliteCachePath
+        else:
+            cachePath = self.pickleCachePath
             
         # Ensure the target directory exists:
         if not os.path.exists(os.path.dirname(self.pickleCachePath)):
@@ -120,7 +150,7 @@ class ModulestoreImporter(DictMixin):
             # below, and uncomment the error throw:
             self.importModstore(jsonFileName)
             #raise IOError("File %s does not exist. Try setting useCache=True to use possibly existing cache; if that fails, must run cronRefreshModuleStore.sh" % jsonFileName)
-        elif useCache and not os.path.exists(self.pickleCachePath):
+        elif useCache and not os.path.exists(cachePath):
             if not os.path.exists(jsonFileName):
                 # NOTE: non-Stanford installation: comment the line
                 # below, and uncomment the error throw:
@@ -131,13 +161,12 @@ class ModulestoreImporter(DictMixin):
             # Just work with the JSON file, and create the cache:
             useCache = False
         
-        # Pattern to ensure that the first non-comment char in the
-        # file is '{', the opening brace. Allows any number of comments
-        # that start with '#':
-        self.legalJSONStartPattern = re.compile('^([\s]*[#][^\n]*\n)*[\s]*[{]')
-        
         cacheAccessSucceeded = True
         # Get dict {"all" : [{...}, {...},...]}
+        if useCache and lookupStore == ModulestoreImporter.SQLITE_STORE:
+            self.hashLookup = SQLiteHashLookup(self.sqliteCachePath)
+            self.buildCourseShortNameToCourseName()
+            return
         if useCache:
             if ModulestoreImporter.hashLookupCache is not None:
                 self.hashLookup = ModulestoreImporter.hashLookupCache
@@ -154,6 +183,14 @@ class ModulestoreImporter(DictMixin):
                 return
     
         # No use of cache, or cache unavailable:
+        if lookupStore == ModulestoreImporter.SQLITE_STORE:
+            # Stream the entries straight into the SQLite
+            # file, without building the dict in memory:
+            SQLiteHashLookup.create(self.sqliteCachePath, self.iterHashLookupEntries())
+            self.hashLookup = SQLiteHashLookup(self.sqliteCachePath)
+            self.buildCourseShortNameToCourseName()
+            return
+
         self.loadModstoreFromJSON()
         
         # Save the lookup in a quick-to-load Python pickle file for future use
@@ -398,50 +435,98 @@ class ModulestoreImporter(DictMixin):
            3. _id.category != 'course' and _id.name is not a hash string: self.hashLookup key <-- '_id.course'_'_id.category'_'_id.name'
         This scheme is not perfect, but it suffices for what we want to do.
         '''
-        jsonStr = open(self.jsonFileName, 'r').read()
-        if self.legalJSONStartPattern.search(jsonStr) is None:
-            # Doesn't start with opening brace:
-            jsonStr = '{"all" :' + jsonStr + "}"
-        
-        try:
-            self.modstoreDict = json.loads(jsonStr)
-        except ValueError:
-            errMsg = "Bad JSON found in module store extract file %s: %s" % (self.jsonFileName, jsonStr)
-            self.logError(errMsg)
-            raise ValueError(errMsg)
-        
-        # Create a lookup table mapping hashes of problems
-        # and other modules into human-readable names:
         self.hashLookup = {}
-        for modstoreEntryDict in self.modstoreDict['all']:
-            # modstoreEntryDict is like this:
-            # {u'_id': {u'category': u'annotatable', u'name': u'Annotation', u'course': u'templates', u'tag': u'i4x', u'org': u'edx', u'revision': None}, u'metadata': {u'display_name': u'Annotation'}}
-            try:
-                infoDict = {}
-                infoDict['org'] = modstoreEntryDict['_id'].get('org', '')
-                infoDict['course_short_name'] = modstoreEntryDict['_id'].get('course', '')
-                infoDict['category'] = modstoreEntryDict['_id'].get('category', '')
-                infoDict['revision'] = modstoreEntryDict['_id'].get('revision', '')
-                infoDict['name'] = modstoreEntryDict['_id'].get('name', '')                
-                infoDict['display_name'] = modstoreEntryDict['metadata'].get('display_name', '')
-                
-                if infoDict['category'] == 'course':
-                    key = modstoreEntryDict['_id'].get('course', '')
-                    self.hashLookup[key] = infoDict
-                elif self.hashStringOnlyPattern.search(infoDict['name']) is not None:
-                    # Name is a hash str:
-                    key = modstoreEntryDict['_id'].get('name', '')
-                    self.hashLookup[key] = infoDict
-                else:
-                    key = modstoreEntryDict['_id'].get('course', '') + '_' +\
-                          modstoreEntryDict['_id'].get('category', '') + '_' +\
-                          modstoreEntryDict['_id'].get('name', '')
-                    self.hashLookup[key] = infoDict
-            except KeyError:
-                # The 'about' entries don't have metadata; just ignore those entries:
-                pass
+        for (key, infoDict) in self.iterHashLookupEntries():
+            self.hashLookup[key] = infoDict
         # Build lookup for short course name to three-part standard name:
         self.buildCourseShortNameToCourseName()
+
+    def iterHashLookupEntries(self):
+        '''
+        Generator of (key, infoDict) pairs for self.hashLookup, one for
+        each usable entry of the JSON file passed into __init__(). The
+        file is parsed incrementally, so only one entry at a time is
+        held in memory. For keys that occur more than once, the last
+        pair wins.
+
+        :return: key and info dict as explained in loadModstoreFromJSON()
+        :rtype: (String, dict)
+        :raise ValueError: when modulestore JSON could not be parsed.
+        '''
+        with open(self.jsonFileName, 'r') as jsonFd:
+            entriesPrefix = self.positionAtJSONStart(jsonFd)
+            try:
+                for modstoreEntryDict in ijson.items(jsonFd, entriesPrefix):
+                    hashLookupEntry = self.makeHashLookupEntry(modstoreEntryDict)
+                    if hashLookupEntry is not None:
+                        yield hashLookupEntry
+            except ijson.JSONError as e:
+                errMsg = "Bad JSON found in module store extract file %s: %s" % (self.jsonFileName, str(e))
+                self.logError(errMsg)
+                raise ValueError(errMsg)
+
+    def positionAtJSONStart(self, jsonFd):
+        '''
+        Skip any leading comment lines (starting with '#') of the
+        modulestore extract file, and leave the file positioned at the
+        start of the JSON. The extract is either an array of modulestore
+        entries, or an object whose 'all' field is such an array. Returns
+        the ijson prefix under which the entries are found.
+
+        :param jsonFd: modulestore extract file, open for reading at its start
+        :type jsonFd: file
+        :return: 'all.item' if the file holds an object; else 'item'
+        :rtype: String
+        '''
+        while True:
+            lineStart = jsonFd.tell()
+            line = jsonFd.readline()
+            strippedLine = line.strip()
+            if len(line) > 0 and (len(strippedLine) == 0 or strippedLine[0] == '#'):
+                continue
+            jsonFd.seek(lineStart)
+            return 'all.item' if strippedLine.startswith('{') else 'item'
+
+    def makeHashLookupEntry(self, modstoreEntryDict):
+        '''
+        Turn one modulestore entry into a self.hashLookup key and
+        info dict, as explained in loadModstoreFromJSON().
+
+        :param modstoreEntryDict: one entry of the modulestore extract
+        :type modstoreEntryDict: dict
+        :return: key and info dict, or None for entries without metadata
+        :rtype: {(String, dict) | None}
+        '''
+        # modstoreEntryDict is like this:
+        # {u'_id': {u'category': u'annotatable', u'name': u'Annotation', u'course': u'templates', u'tag': u'i4x', u'org': u'edx', u'revision': None}, u'metadata': {u'display_name': u'Annotation'}}
+        try:
+            infoDict = {}
+            infoDict['org'] = modstoreEntryDict['_id'].get('org', '')
+            infoDict['course_short_name'] = modstoreEntryDict['_id'].get('course', '')
+            infoDict['category'] = modstoreEntryDict['_id'].get('category', '')
+            infoDict['revision'] = modstoreEntryDict['_id'].get('revision', '')
+            infoDict['name'] = modstoreEntryDict['_id'].get('name', '')                
+            infoDict['display_name'] = modstoreEntryDict['metadata'].get('display_name', '')
+            for (fldName, val) in infoDict.items():
+                # ijson returns non-integer numbers, such as a display
+                # name of 1.5, as Decimal, which sqlite3 cannot store.
+                # Use the float that json.load() used to produce:
+                if isinstance(val, decimal.Decimal):
+                    infoDict[fldName] = float(val)
+            
+            if infoDict['category'] == 'course':
+                key = modstoreEntryDict['_id'].get('course', '')
+            elif self.hashStringOnlyPattern.search(infoDict['name']) is not None:
+                # Name is a hash str:
+                key = modstoreEntryDict['_id'].get('name', '')
+            else:
+                key = modstoreEntryDict['_id'].get('course', '') + '_' +\
+                      modstoreEntryDict['_id'].get('category', '') + '_' +\
+                      modstoreEntryDict['_id'].get('name', '')
+            return (key, infoDict)
+        except KeyError:
+            # The 'about' entries don't have metadata; just ignore those entries:
+            return None
                   
     def buildCourseShortNameToCourseName(self):
         '''
@@ -458,10 +543,11 @@ class ModulestoreImporter(DictMixin):
         entry.
         '''
         self.courseNameLookup = {}
-        for infoDictID in self.hashLookup.keys():
-            infoDict = self.hashLookup[infoDictID]
-            if infoDict.get('category', None) != 'course':
-                continue
+        if isinstance(self.hashLookup, SQLiteHashLookup):
+            courseInfoDicts = self.hashLookup.infoDictsOfCategory('course')
+        else:
+            courseInfoDicts = [infoDict for infoDict in self.hashLookup.values() if infoDict.get('category', None) == 'course']
+        for infoDict in courseInfoDicts:
             shortName = infoDict['course_short_name']
             # Weed out test course names, like '1' and '123', and '2013':
             # Require the course name to start with a letter.
@@ -512,4 +598,122 @@ class ModulestoreImporter(DictMixin):
     def logDebug(self, msg):
         if self.parent is not None:
             self.parent.logDebug(msg)
-    
\ No newline at end of file
+
+class SQLiteHashLookup(object):
+    '''
+    Read-only, dict-like view of the hash-->info lookup of
+    ModulestoreImporter, stored in an SQLite file. Each lookup
+    is a query by primary key. Results of the most recent lookups
+    are kept in an LRUCache, because log events refer to the
+    same few resources over and over.
+    '''
+
+    # Columns of the HashInfo table, in addition to the key:
+    INFO_COLS = ['org', 'course_short_name', 'category', 'revision', 'name', 'display_name']
+
+    DEFAULT_CACHE_SIZE = 5000
+
+    # Cache entry for keys known not to be in the store:
+    NOT_FOUND = object()
+
+    def __init__(self, sqlitePath, cacheSize=DEFAULT_CACHE_SIZE):
+        '''
+        :param sqlitePath: file created by SQLiteHashLookup.create()
+        :type sqlitePath: String
+        :param cacheSize: number of lookup results to keep in memory
+        :type cacheSize: int
+        '''
+        self.sqlitePath = sqlitePath
+        self.lookupCache = LRUCache(cacheSize)
+        self.connection = None
+        self.connectionPid = None
+
+    @classmethod
+    def create(cls, sqlitePath, hashLookup):
+        '''
+        Write the given hash-->info dict to a new SQLite file,
+        replacing any existing one. The file is built under a
+        temporary name, and then renamed, so that concurrent
+        readers never see a partial file.
+
+        :param sqlitePath: file to create
+        :type sqlitePath: String
+        :param hashLookup: dict mapping hash keys to info dicts as per ModulestoreImporter.loadModstoreFromJSON(),
+            or an iterable of (key, infoDict) pairs. Later pairs replace earlier ones with the same key.
+        :type hashLookup: {dict | iterable}
+        '''
+        if isinstance(hashLookup, dict):
+            hashLookup = hashLookup.iteritems()
+        (fd, tmpPath) = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(sqlitePath)))
+        os.close(fd)
+        try:
+            connection = sqlite3.connect(tmpPath)
+            try:
+                connection.execute('CREATE TABLE HashInfo (hash_key TEXT PRIMARY KEY, %s)' %\
+                                   ', '.join(['%s TEXT' % colName for colName in SQLiteHashLookup.INFO_COLS]))
+                connection.executemany('INSERT OR REPLACE INTO HashInfo VALUES (?%s)' % (', ?' * len(SQLiteHashLookup.INFO_COLS)),
+                                       ([hashKey] + [infoDict.get(colName, None) for colName in SQLiteHashLookup.INFO_COLS]
+                                        for (hashKey, infoDict) in hashLookup))
+                connection.execute('CREATE INDEX HashInfoCategoryIdx ON HashInfo (category)')
+                connection.commit()
+            finally:
+                connection.close()
+            # mkstemp() creates files readable only by their owner:
+            os.chmod(tmpPath, 0644)
+            os.rename(tmpPath, sqlitePath)
+        except:
+            os.remove(tmpPath)
+            raise
+
+    def getConnection(self):
+        # SQLite connections must not be used across fork(),
+        # so each process opens its own:
+        if self.connection is None or self.connectionPid != os.getpid():
+            self.connection = sqlite3.connect(self.sqlitePath)
+            self.connectionPid = os.getpid()
+        return self.connection
+
+    def makeInfoDict(self, row):
+        return dict(zip(SQLiteHashLookup.INFO_COLS, row))
+
+    def get(self, hashKey, default=None):
+        infoDict = self.lookupCache.get(hashKey)
+        if infoDict is None:
+            row = self.getConnection().execute('SELECT %s FROM HashInfo WHERE hash_key = ?' % ', '.join(SQLiteHashLookup.INFO_COLS),
+                                               (hashKey,)).fetchone()
+            infoDict = self.makeInfoDict(row) if row is not None else SQLiteHashLookup.NOT_FOUND
+            self.lookupCache.put(hashKey, infoDict)
+        if infoDict is SQLiteHashLookup.NOT_FOUND:
+            return default
+        return infoDict
+
+    def infoDictsOfCategory(self, category):
+        '''
+        Return the info dicts of all entries of the given category.
+
+        :param category: category, such as 'course' or 'video'
+        :type category: String
+        :return: info dicts as per ModulestoreImporter.loadModstoreFromJSON()
+        :rtype: [dict]
+        '''
+        return [self.makeInfoDict(row) for row in
+                self.getConnection().execute('SELECT %s FROM HashInfo WHERE category = ?' % ', '.join(SQLiteHashLookup.INFO_COLS),
+                                             (category,))]
+
+    def keys(self):
+        return [row[0] for row in self.getConnection().execute('SELECT hash_key FROM HashInfo')]
+
+    def __getitem__(self, hashKey):
+        infoDict = self.get(hashKey)
+        if infoDict is None:
+            raise KeyError(hashKey)
+        return infoDict
+
+    def __contains__(self, hashKey):
+        return self.get(hashKey) is not None
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return self.getConnection().execute('SELECT COUNT(*) FROM HashInfo').fetchone()[0]
@@ -20,12 +20,25 @@ Modifications:
 import StringIO
 from collections import OrderedDict
 import csv
+import logging
 import re
 import sys
 import os
 import tempfile
+import zlib
 
 from col_data_type import ColDataType
+from parquetTableWriter import ParquetTableWriter
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
 
 
 class OutputDisposition(object):
@@ -61,6 +74,8 @@ class OutputDisposition(object):
             self.outputDest = outputDestObj
         self.csvTableFiles = {}
         self.schemas = TableSchemas()
+        # No compression unless a subclass supports it:
+        self.compression = None
     
     def __enter__(self):
         return self.outputDest
@@ -88,6 +103,18 @@ class OutputDisposition(object):
     def getOutputFormat(self):
         return self.outputFormat
 
+    def getDecompressCommand(self):
+        '''
+        Return the shell command that decompresses an output file
+        to stdout, or None if output is not compressed.
+
+        :return: shell command that expects the file name as its argument, or None
+        :rtype: {String | None}
+        '''
+        if self.compression is None:
+            return None
+        return OutputDisposition.Compression.DECOMPRESS_COMMANDS[self.compression]
+
     def addSchemaHints(self, tableName, schemaHints):
         '''
         Provide a schema hint dict for the table of the given name.
@@ -195,6 +222,22 @@ class OutputDisposition(object):
         CSV = 0
         SQL_INSERT_STATEMENTS = 1
         SQL_INSERTS_AND_CSV = 2
+        PARQUET = 3
+
+    #--------------------- Available Output Compressions
+
+    class Compression():
+        GZIP = 'gzip'
+        ZSTD = 'zstd'
+        LZ4  = 'lz4'
+
+        FILE_SUFFIXES = {GZIP : '.gz',
+                         ZSTD : '.zst',
+                         LZ4  : '.lz4'}
+
+        DECOMPRESS_COMMANDS = {GZIP : 'gzip -dc',
+                               ZSTD : 'zstd -dcq',
+                               LZ4  : 'lz4 -dcq'}
             
 #--------------------- Available Output Destination Options:  
         
@@ -260,6 +303,120 @@ class OutputPipe(OutputDisposition):
         return self.name
 
 
+class BufferedFileWriter(object):
+    '''
+    Collects what is written to a file object in memory, and
+    passes it on in one write() call once bufferSize bytes have
+    accumulated, or when flush() or close() are called. Keeps
+    the number of system calls low when output goes to network
+    file systems, where each one costs a round trip.
+    '''
+
+    def __init__(self, fileObj, bufferSize):
+        '''
+        Wrap a file object that is open for writing.
+
+        :param fileObj: file object to which the buffer contents are written. Open it
+                  unbuffered, so that the data are not copied into a second buffer.
+        :type fileObj: File
+        :param bufferSize: number of bytes to collect before writing them out
+        :type bufferSize: int
+        '''
+        self.fileObj = fileObj
+        self.name = fileObj.name
+        self.bufferSize = bufferSize
+        self.chunks = []
+        self.bufferedBytes = 0
+
+    def write(self, data):
+        # Like File.write(), refuse unicode that is not
+        # ASCII right away, rather than when writing out:
+        if data.__class__ is unicode:
+            data = data.encode('ascii')
+        self.chunks.append(data)
+        self.bufferedBytes += len(data)
+        if self.bufferedBytes >= self.bufferSize:
+            self.writeBuffer()
+
+    def writeBuffer(self):
+        '''
+        Pass the collected data to the underlying
+        file object, without flushing that object.
+        '''
+        if len(self.chunks) > 0:
+            self.fileObj.write(''.join(self.chunks))
+            self.chunks = []
+            self.bufferedBytes = 0
+
+    def flush(self):
+        self.writeBuffer()
+        self.fileObj.flush()
+
+    def close(self):
+        try:
+            self.writeBuffer()
+        finally:
+            self.fileObj.close()
+
+
+class CompressingFileWriter(object):
+    '''
+    Compresses what is written to it as a gzip, zstd, or lz4
+    stream into a file object. Meant to be wrapped in a
+    BufferedFileWriter, so that data arrives in large chunks.
+    The compressed stream is only completed by close(); flush()
+    passes on what the compressor has released so far.
+    Appending to an existing compressed file adds a new gzip
+    member or frame, which the decompressors read as one stream.
+    '''
+
+    GZIP_LEVEL = 6
+    ZSTD_LEVEL = 3
+
+    def __init__(self, fileObj, compression):
+        '''
+        :param fileObj: file object to which the compressed stream is written
+        :type fileObj: File
+        :param compression: one of the OutputDisposition.Compression values
+        :type compression: String
+        :raise ValueError: if the compression is unknown, or its module is not installed
+        '''
+        self.fileObj = fileObj
+        self.name = fileObj.name
+        if compression == OutputDisposition.Compression.GZIP:
+            # A wbits of 16 plus the window size makes zlib
+            # produce the gzip format:
+            self.compressObj = zlib.compressobj(CompressingFileWriter.GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        elif compression == OutputDisposition.Compression.ZSTD:
+            if zstandard is None:
+                raise ValueError("Output compression 'zstd' requires the zstandard module.")
+            self.compressObj = zstandard.ZstdCompressor(level=CompressingFileWriter.ZSTD_LEVEL).compressobj()
+        elif compression == OutputDisposition.Compression.LZ4:
+            if lz4 is None:
+                raise ValueError("Output compression 'lz4' requires the lz4 module.")
+            self.compressObj = lz4.frame.LZ4FrameCompressor()
+            self.fileObj.write(self.compressObj.begin())
+        else:
+            raise ValueError("Unknown output compression: '%s'" % str(compression))
+
+    def write(self, data):
+        compressed = self.compressObj.compress(data)
+        if len(compressed) > 0:
+            self.fileObj.write(compressed)
+
+    def flush(self):
+        self.fileObj.flush()
+
+    def close(self):
+        if self.fileObj.closed:
+            # Already completed the stream:
+            return
+        try:
+            self.fileObj.write(self.compressObj.flush())
+        finally:
+            self.fileObj.close()
+
+
 class OutputFile(OutputDisposition):
     
     # When looking at INSERT INTO tableName (...,
@@ -271,7 +428,11 @@ class OutputFile(OutputDisposition):
     # we'll cut out in the code:
     VALUES_PATTERN = re.compile(r'^[\s]{4}\(([^\n]*)\n{0,1}')
     
-    def __init__(self, fileName, outputFormat, options='ab'):
+    # Bytes collected for each output file
+    # before they are written to disk:
+    WRITE_BUFFER_SIZE = 1024 * 1024
+    
+    def __init__(self, fileName, outputFormat, options='ab', bufferSize=None, compression=None):
         '''
         Create instance of an output file destination for converted log files.
         Such an instance is created both for OutputFormat.SQL_INSERT_STATEMENTS and
@@ -288,38 +449,116 @@ class OutputFile(OutputDisposition):
         :param options: output file options as per Python built-in 'open()'. Defaults to append/binary. The
                   latter for compatibility with Windows
         :type options: String
+        :param bufferSize: number of bytes collected for the output file, and for each CSV
+                  table file, before they are written out. Default: WRITE_BUFFER_SIZE
+        :type bufferSize: {int | None}
+        :param compression: if not None, one of the OutputDisposition.Compression values. The CSV
+                  table files are then compressed, and their names get the compression's suffix.
+                  If the output format includes INSERT statements, the same holds for the
+                  fileName file. With CSV-only output that file remains uncompressed, and its
+                  LOAD commands decompress the CSV files (see getDecompressCommand()).
+                  With PARQUET output the compression is used as the Parquet files' codec
+                  instead; fileName then remains uncompressed.
+        :type compression: {String | None}
+        :raise ValueError: if compression is unknown, or PARQUET output is requested without pyarrow
         '''
         super(OutputFile, self).__init__(outputFormat)        
+        if compression is not None and compression not in OutputDisposition.Compression.FILE_SUFFIXES:
+            raise ValueError("Unknown output compression: '%s'" % str(compression))
+        if outputFormat == OutputDisposition.OutputFormat.PARQUET and not ParquetTableWriter.isAvailable():
+            raise ValueError('Parquet output requires the pyarrow module.')
+        self.compression = compression
+        # CSV and Parquet table file names start with the given file name:
+        self.csvFileNamePrefix = fileName
+        # With formats that write tables to files of their
+        # own, fileName only receives the SQL DDL:
+        compressMainFile = outputFormat == OutputDisposition.OutputFormat.SQL_INSERT_STATEMENTS or\
+                           outputFormat == OutputDisposition.OutputFormat.SQL_INSERTS_AND_CSV
+        if compression is not None and compressMainFile and fileName != os.devnull:
+            fileName += OutputDisposition.Compression.FILE_SUFFIXES[compression]
         # Make file name accessible as property just like 
         # Python file objects do:
         self.name = fileName  # @UnusedVariable
         self.outputFormat = outputFormat
         # Open the output file as 'append' and 'binary'
         # The latter is needed for Windows.
-        self.fileHandle = open(fileName, options)
+        self.bufferSize = OutputFile.WRITE_BUFFER_SIZE if bufferSize is None else bufferSize
+        self.fileHandle = self.openOutFile(fileName,
+                                           options,
+                                           compress=compressMainFile)
         self.csvWriter = csv.writer(sys.stdout, dialect='excel', delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
         if outputFormat == OutputDisposition.OutputFormat.CSV or\
             outputFormat == OutputDisposition.OutputFormat.SQL_INSERTS_AND_CSV:
             # Prepare for CSV files needed for the tables:
             self.tableCSVWriters = {}
+        elif outputFormat == OutputDisposition.OutputFormat.PARQUET:
+            # One ParquetTableWriter per table:
+            self.parquetWriters = OrderedDict()
         
+    def openOutFile(self, fileName, options, compress=True):
+        '''
+        Open one output file for buffered, and possibly compressed writing.
+
+        :param fileName: name of file to open
+        :type fileName: String
+        :param options: file options as per Python built-in 'open()'
+        :type options: String
+        :param compress: if False, the file is not compressed, even if self.compression is set
+        :type compress: Boolean
+        :return: file object open for writing
+        :rtype: BufferedFileWriter
+        '''
+        fileObj = open(fileName, options, 0)
+        if compress and self.compression is not None:
+            fileObj = CompressingFileWriter(fileObj, self.compression)
+        return BufferedFileWriter(fileObj, self.bufferSize)
+
     def close(self):
-        self.fileHandle.close()
         # Also close any CSV out files that might exist:
-        try:
-            for csvFD in self.csvTableFiles.values():
-                csvFD.close()
-        except:
-            pass
+        fileObjs = [self.fileHandle] + self.csvTableFiles.values()
+        if self.outputFormat == OutputDisposition.OutputFormat.PARQUET:
+            # Parquet files are only complete once closed:
+            fileObjs.extend(self.parquetWriters.values())
+            self.parquetWriters.clear()
+        self.closeAll(fileObjs)
 
     def flush(self):
-        self.fileHandle.flush()
-        for csvFD in self.tableCSVWriters.values():
+        OutputFile.applyToAll('flush', [self.fileHandle] + self.csvTableFiles.values())
+
+    def closeAll(self, fileObjs):
+        '''
+        Close each of the given files. Closing writes out what their
+        buffers still hold, so a failure to close one file must neither
+        go unnoticed, nor keep the other files from being closed.
+
+        :param fileObjs: objects with a close() method
+        :type fileObjs: [File]
+        :raise IOError: the first error that occurred, after all files were closed
+        '''
+        OutputFile.applyToAll('close', fileObjs)
+
+    @staticmethod
+    def applyToAll(methodName, fileObjs):
+        '''
+        Call the named method of each given file. Errors are logged,
+        and the first one is re-raised once all files had their turn.
+
+        :param methodName: name of the method to call, such as 'flush'
+        :type methodName: String
+        :param fileObjs: objects with the named method
+        :type fileObjs: [File]
+        '''
+        firstError = None
+        for fileObj in fileObjs:
             try:
-                csvFD.flush()
-            except:
-                pass
-            
+                getattr(fileObj, methodName)()
+            except Exception as e:
+                logging.getLogger('jsonToRel').error("Could not %s %s: %s" % (methodName, getattr(fileObj, 'name', fileObj), `e`))
+                if firstError is None:
+                    firstError = sys.exc_info()
+        if firstError is not None:
+            raise firstError[0], firstError[1], firstError[2]
+
     def remove(self):
         try:
             os.remove(self.fileHandle.name)
@@ -383,17 +622,47 @@ class OutputFile(OutputDisposition):
             # We are either outputting INSERT statements, or
             # both those and CSV, or just CSV derived from a 
             # full MySQL INSERT parser, like edxTrackLogJSONParser. 
-            # Start with the INSERTS:
-            if self.outputFormat == OutputDisposition.OutputFormat.SQL_INSERT_STATEMENTS or\
-                self.outputFormat == OutputDisposition.OutputFormat.SQL_INSERTS_AND_CSV:
-                self.fileHandle.write(colElementArray + '\n')
-
-            # If we are outputting either CSV or INSERTs and CSV, do the CSV
-            # part now:
-            if self.outputFormat != OutputDisposition.OutputFormat.SQL_INSERT_STATEMENTS:
+            self.writeInsertStatement(colElementArray)
+
+    def writeInsertStatement(self, insertStatement, tableName=None, valuesRows=None):
+        '''
+        Write one MySQL INSERT statement, and/or the CSV rows it
+        contains, depending on the output format. Callers that
+        still have the statement's rows at hand pass them in
+        valuesRows, so that the CSV rows need not be extracted
+        from the statement again.
+
+        :param insertStatement: Well-formed MySQL INSERT statement
+        :type insertStatement: String
+        :param tableName: name of table the statement inserts into. Only
+                  needed with valuesRows.
+        :type tableName: String
+        :param valuesRows: each row's comma-separated values, as in the
+                  parentheses of the statement's VALUES part
+        :type valuesRows: [String]
+        '''
+        # Start with the INSERTS:
+        if self.outputFormat == OutputDisposition.OutputFormat.SQL_INSERT_STATEMENTS or\
+            self.outputFormat == OutputDisposition.OutputFormat.SQL_INSERTS_AND_CSV:
+            # Two writes to the buffer save copying
+            # the statement for the concatenation:
+            self.fileHandle.write(insertStatement)
+            self.fileHandle.write('\n')
+
+        # If we are outputting either CSV or INSERTs and CSV, do the CSV
+        # part now:
+        if self.outputFormat != OutputDisposition.OutputFormat.SQL_INSERT_STATEMENTS:
+            if valuesRows is None:
                 # Strip the CSV parts out from the INSERT statement, which may
                 # contain multiple VALUE statements:
-                self.writeCSVRowsFromInsertStatement(colElementArray) 
+                self.writeCSVRowsFromInsertStatement(insertStatement)
+            else:
+                try:
+                    theOutFd = self.csvTableFiles[tableName]
+                except KeyError:
+                    self.ensureOpenCSVOutFileFromTableName(tableName)
+                    theOutFd = self.csvTableFiles[tableName]
+                theOutFd.write('\n'.join(valuesRows) + '\n')
         
     def write(self, whatToWrite):
         '''
@@ -403,7 +672,6 @@ class OutputFile(OutputDisposition):
         :type whatToWrite:
         '''
         self.fileHandle.write(whatToWrite)
-        self.fileHandle.flush()
         
     def startNewTable(self, tableName, schemaHintsNewTable):
         '''
@@ -419,6 +687,9 @@ class OutputFile(OutputDisposition):
         self.addSchemaHints(tableName, schemaHintsNewTable)
         if self.outputFormat == OutputDisposition.OutputFormat.SQL_INSERT_STATEMENTS:
             return
+        if self.outputFormat == OutputDisposition.OutputFormat.PARQUET:
+            self.ensureParquetWriterFromTableName(tableName)
+            return
         # We are producing CSV (possibly in addition to Inserts):
         try:
             # Already have a table writer for this table?
@@ -456,7 +727,7 @@ class OutputFile(OutputDisposition):
             self.csvTableFiles[tableName] = outFile 
             return outFile
         csvOutFileName = self.getCSVTableOutFileName(tableName)
-        outFile = open(csvOutFileName, 'w')
+        outFile = self.openOutFile(csvOutFileName, 'w')
         self.csvTableFiles[tableName] = outFile
         self.tableCSVWriters[tableName] = csv.writer(outFile, 
                                                      dialect='excel', 
@@ -466,9 +737,83 @@ class OutputFile(OutputDisposition):
         return self.tableCSVWriters[tableName]
     
     def getCSVTableOutFileName(self, tableName):
-        # The 'None' below ensures that we get the
-        # main file's name back:
-        return "%s_%sTable.csv" % (self.getFileName(None), tableName) 
+        csvOutFileName = "%s_%sTable.csv" % (self.csvFileNamePrefix, tableName)
+        if self.compression is not None:
+            csvOutFileName += OutputDisposition.Compression.FILE_SUFFIXES[self.compression]
+        return csvOutFileName
+
+    def getParquetTableOutFileName(self, tableName):
+        return "%s_%sTable.parquet" % (self.csvFileNamePrefix, tableName)
+
+    def ensureParquetWriterFromTableName(self, tableName, insertSig=None):
+        '''
+        Return the ParquetTableWriter for the given table, creating
+        its file if needed. The file's columns are those of the table's
+        schema. Tables without a schema, which parsers may fill without
+        calling startNewTable(), get the columns in insertSig, all as text.
+
+        :param tableName: name of table whose Parquet writer is wanted
+        :type tableName: String
+        :param insertSig: comma-separated column names of the first row for the table
+        :type insertSig: {String | None}
+        :return: writer for the table's rows
+        :rtype: ParquetTableWriter
+        '''
+        try:
+            return self.parquetWriters[tableName]
+        except KeyError:
+            pass
+        try:
+            colSpecs = [(colSpec.getName(), colSpec.colDataType) for colSpec in self.schemas[tableName].values()]
+        except KeyError:
+            colSpecs = []
+        if len(colSpecs) == 0:
+            if insertSig is None:
+                raise ValueError("No schema for Parquet table %s." % tableName)
+            colSpecs = [(colName.strip(), ColDataType.TEXT) for colName in insertSig.split(',')]
+        parquetWriter = ParquetTableWriter(self.getParquetTableOutFileName(tableName),
+                                           colSpecs,
+                                           compression=self.compression)
+        self.parquetWriters[tableName] = parquetWriter
+        return parquetWriter
+
+    def writeParquetRow(self, tableName, insertSig, valsArray):
+        '''
+        Append one row to the Parquet file of the given table. Used in
+        place of INSERT statements with PARQUET output.
+
+        :param tableName: name of table to which the row belongs
+        :type tableName: String
+        :param insertSig: comma-separated names of the columns in valsArray. Ex.: 'col1,col2'
+        :type insertSig: String
+        :param valsArray: the row's values, as pushed by the parser
+        :type valsArray: [<any>]
+        '''
+        try:
+            parquetWriter = self.parquetWriters[tableName]
+        except KeyError:
+            parquetWriter = self.ensureParquetWriterFromTableName(tableName, insertSig)
+        parquetWriter.addRow(insertSig, valsArray)
+
+    def writeCSVValuesRow(self, tableName, valuesRow):
+        '''
+        Append one row to the CSV file of the given table. Used in
+        place of writeCSVRowsFromInsertStatement() when no INSERT
+        statements are wanted: the row is written exactly as it
+        would have been extracted from an INSERT statement.
+
+        :param tableName: name of table to which the row belongs
+        :type tableName: String
+        :param valuesRow: the row's comma-separated values, as in the
+                   parentheses of an INSERT statement's VALUES part
+        :type valuesRow: String
+        '''
+        try:
+            theOutFd = self.csvTableFiles[tableName]
+        except KeyError:
+            self.ensureOpenCSVOutFileFromTableName(tableName)
+            theOutFd = self.csvTableFiles[tableName]
+        theOutFd.write(valuesRow + '\n')
 
     def writeCSVRowsFromInsertStatement(self, insertStatement):
         '''
@@ -0,0 +1,253 @@
+# Copyright (c) 2014, Stanford University
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+'''
+Created on Oct 18, 2026
+
+Writes relational tables as Parquet files, for querying the
+transformed tracking logs from Spark or DuckDB without going
+through MySQL. Rows are collected column by column, and written
+as one Parquet row group per ROW_GROUP_SIZE rows. Requires the
+optional pyarrow module.
+'''
+
+from col_data_type import ColDataType
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+class ParquetTableWriter(object):
+    '''
+    Writes the rows of one table to one Parquet file. Usage:
+
+        writer = ParquetTableWriter('/tmp/Answer.parquet',
+                                    [('answer_id', ColDataType.UUID),
+                                     ('problem_id', ColDataType.TEXT),
+                                     ('answer', ColDataType.TEXT)])
+        writer.addRow('answer_id,problem_id,answer', ['a1b2', 'p1', 'correct'])
+        writer.close()
+
+    Values arrive as the parsers push them for MySQL INSERT
+    statements: 'null' and None are NULL, and quotes in strings
+    are backslash-escaped. Both are undone here. Values that do
+    not convert to a numeric column's type become NULL, much as
+    MySQL would not store them as given either.
+    '''
+
+    # Rows per Parquet row group:
+    ROW_GROUP_SIZE = 100000
+
+    # Range of Parquet's 64-bit integer columns:
+    INT64_MIN = -2**63
+    INT64_MAX = 2**63 - 1
+
+    def __init__(self, fileName, colSpecs, rowGroupSize=None, compression=None):
+        '''
+        Create the Parquet file, with one column for each column spec.
+
+        :param fileName: path of the Parquet file to create
+        :type fileName: String
+        :param colSpecs: column names and types, in table order
+        :type colSpecs: [(String, ColDataType)]
+        :param rowGroupSize: rows per row group. Default: ROW_GROUP_SIZE
+        :type rowGroupSize: {int | None}
+        :param compression: Parquet compression codec, such as 'gzip', 'zstd', or 'lz4'. Default: snappy
+        :type compression: {String | None}
+        :raise ValueError: if pyarrow is not installed
+        '''
+        if pyarrow is None:
+            raise ValueError('Parquet output requires the pyarrow module.')
+        self.fileName = fileName
+        self.rowGroupSize = ParquetTableWriter.ROW_GROUP_SIZE if rowGroupSize is None else rowGroupSize
+        self.colNames = [colName for (colName, colDataType) in colSpecs]
+        self.colPositions = dict([(colName, pos) for (pos, colName) in enumerate(self.colNames)])
+        self.converters = [ParquetTableWriter.converterFor(colDataType) for (colName, colDataType) in colSpecs]
+        self.arrowSchema = pyarrow.schema([(colName, ParquetTableWriter.arrowTypeFor(colDataType))
+                                           for (colName, colDataType) in colSpecs])
+        self.writer = pyarrow.parquet.ParquetWriter(fileName,
+                                                    self.arrowSchema,
+                                                    compression='snappy' if compression is None else compression)
+        # For each insertSig seen so far: the append methods and
+        # converters for its columns, and the append methods
+        # for the columns it lacks:
+        self.insertSigPlans = {}
+        self.startRowGroup()
+
+    @staticmethod
+    def isAvailable():
+        '''
+        :return: True if pyarrow is installed
+        :rtype: Boolean
+        '''
+        return pyarrow is not None
+
+    def startRowGroup(self):
+        self.colValues = [[] for _ in self.colNames]
+        self.numRows = 0
+        self.insertSigPlans.clear()
+
+    def addRow(self, insertSig, valsArray):
+        '''
+        Add one row to the current row group, and write out the
+        row group once it is full.
+
+        :param insertSig: comma-separated names of the columns in valsArray. Ex.: 'col1,col2'
+        :type insertSig: String
+        :param valsArray: the row's values
+        :type valsArray: [<any>]
+        :raise ValueError: if insertSig names a column the file does not have
+        '''
+        try:
+            (colPlan, missingColAppends) = self.insertSigPlans[insertSig]
+        except KeyError:
+            (colPlan, missingColAppends) = self.makeInsertSigPlan(insertSig)
+        for ((appendVal, convert), val) in zip(colPlan, valsArray):
+            appendVal(convert(val))
+        for appendVal in missingColAppends:
+            appendVal(None)
+        self.numRows += 1
+        if self.numRows >= self.rowGroupSize:
+            self.writeRowGroup()
+
+    def makeInsertSigPlan(self, insertSig):
+        colNames = [colName.strip() for colName in insertSig.split(',')]
+        try:
+            positions = [self.colPositions[colName] for colName in colNames]
+        except KeyError as e:
+            raise ValueError("Column %s is not in Parquet file %s." % (str(e), self.fileName))
+        colPlan = [(self.colValues[pos].append, self.converters[pos]) for pos in positions]
+        missingColAppends = [self.colValues[pos].append for pos in range(len(self.colNames)) if pos not in positions]
+        self.insertSigPlans[insertSig] = (colPlan, missingColAppends)
+        return (colPlan, missingColAppends)
+
+    def writeRowGroup(self):
+        '''
+        Write the rows collected so far as one row group.
+        '''
+        if self.numRows == 0:
+            return
+        try:
+            arrays = [ParquetTableWriter.makeArrowArray(values, colType) for (values, colType) in zip(self.colValues, self.arrowSchema.types)]
+            self.writer.write_table(pyarrow.Table.from_arrays(arrays, schema=self.arrowSchema))
+        finally:
+            # Even if these rows could not be written, later
+            # rows should not fail along with them:
+            self.startRowGroup()
+
+    @staticmethod
+    def makeArrowArray(values, colType):
+        try:
+            return pyarrow.array(values, type=colType)
+        except pyarrow.ArrowInvalid:
+            if colType != pyarrow.string():
+                raise
+            # Some byte string is not UTF-8. Rather than losing
+            # the row group, replace the offending bytes:
+            return pyarrow.array([val.decode('utf-8', 'replace') if isinstance(val, str) else val for val in values],
+                                 type=colType)
+
+    def close(self):
+        '''
+        Write the last row group, and complete the file.
+        '''
+        try:
+            self.writeRowGroup()
+        finally:
+            self.writer.close()
+
+    @staticmethod
+    def arrowTypeFor(colDataType):
+        '''
+        Map a MySQL column type to a Parquet column type. All integer
+        types become 64 bits: Parquet encodes small values compactly
+        anyway. Values beyond 64 bits become NULL (see toInt()).
+        Dates and times remain the strings the parsers produce.
+
+        :param colDataType: MySQL column type
+        :type colDataType: ColDataType
+        :return: corresponding Arrow data type
+        :rtype: pyarrow.DataType
+        '''
+        if colDataType in ParquetTableWriter.INT_TYPES:
+            return pyarrow.int64()
+        elif colDataType == ColDataType.FLOAT:
+            return pyarrow.float32()
+        elif colDataType == ColDataType.DOUBLE:
+            return pyarrow.float64()
+        elif colDataType == ColDataType.BOOL:
+            return pyarrow.bool_()
+        else:
+            return pyarrow.string()
+
+    @staticmethod
+    def converterFor(colDataType):
+        if colDataType in ParquetTableWriter.INT_TYPES:
+            return ParquetTableWriter.toInt
+        elif colDataType == ColDataType.FLOAT or colDataType == ColDataType.DOUBLE:
+            return ParquetTableWriter.toFloat
+        elif colDataType == ColDataType.BOOL:
+            return ParquetTableWriter.toBool
+        else:
+            return ParquetTableWriter.toString
+
+    @staticmethod
+    def toString(val):
+        if val is None or val == 'null':
+            return None
+        if not isinstance(val, basestring):
+            return str(val)
+        if '\\' in val:
+            # Undo Utils.makeInsertSafe()'s quote escaping:
+            return val.replace("\\'", "'")
+        return val
+
+    @staticmethod
+    def toInt(val):
+        if val.__class__ is int:
+            # Python ints fit into 64 bits:
+            return val
+        try:
+            val = int(val)
+        except (ValueError, TypeError):
+            try:
+                val = int(float(val))
+            except (ValueError, TypeError, OverflowError):
+                return None
+        # Longs beyond 64 bits, such as BIGINT UNSIGNED
+        # values, would fail the whole row group:
+        if val < ParquetTableWriter.INT64_MIN or val > ParquetTableWriter.INT64_MAX:
+            return None
+        return val
+
+    @staticmethod
+    def toFloat(val):
+        if val.__class__ is float:
+            return val
+        try:
+            return float(val)
+        except (ValueError, TypeError):
+            return None
+
+    @staticmethod
+    def toBool(val):
+        if val is True or val is False:
+            return val
+        intVal = ParquetTableWriter.toInt(val)
+        return None if intVal is None else intVal != 0
+
+ParquetTableWriter.INT_TYPES = frozenset([ColDataType.TINYINT,
+                                          ColDataType.SMALLINT,
+                                          ColDataType.MEDIUMINT,
+                                          ColDataType.INT,
+                                          ColDataType.BIGINT])
@@ -109,6 +109,61 @@ class TestModulestoreImporter(unittest.TestCase):
     def testModuleStoreImporter(self):
         self.useTheDict()
 
+    @unittest.skipIf(not TEST_ALL, "Temporarily disabled")    
+    def testSQLiteLookupStore(self):
+        jsonFileName = os.path.join(TestModulestoreImporter.dataDir, 'modulestore_latest.json')
+        tmpDir = tempfile.mkdtemp()
+        try:
+            pickleCachePath = os.path.join(tmpDir, 'hashLookup.pkl')
+            # Builds the SQLite file from the JSON file:
+            self.importer = ModulestoreImporter(jsonFileName, useCache=False, pickleCachePath=pickleCachePath, lookupStore=ModulestoreImporter.SQLITE_STORE)
+            self.assertTrue(os.path.exists(os.path.join(tmpDir, 'hashLookup.sqlite')))
+            self.assertFalse(os.path.exists(pickleCachePath))
+            self.useTheDict()
+            # Uses the existing SQLite file:
+            self.importer = ModulestoreImporter(jsonFileName, useCache=True, pickleCachePath=pickleCachePath, lookupStore=ModulestoreImporter.SQLITE_STORE)
+            self.useTheDict()
+            self.assertIsNone(self.importer.getDisplayName('00000000000000000000000000000000'))
+            self.assertEqual(3, len(self.importer.hashLookup))
+        finally:
+            shutil.rmtree(tmpDir)
+
+    @unittest.skipIf(not TEST_ALL, "Temporarily disabled")    
+    def testNumericFieldValues(self):
+        # Numbers in the extract must not keep the
+        # entries from being stored in SQLite:
+        tmpDir = tempfile.mkdtemp()
+        try:
+            jsonFileName = os.path.join(tmpDir, 'modulestore_latest.json')
+            with open(jsonFileName, 'w') as outFd:
+                outFd.write('[{"_id" : {"category" : "problem", "name" : "0123456789abcdef0123456789abcdef", "course" : "HRP258", "tag" : "i4x", "org" : "Medicine", "revision" : 2}, "metadata" : {"display_name" : 1.5}}]\n')
+            self.importer = ModulestoreImporter(jsonFileName, useCache=False, pickleCachePath=os.path.join(tmpDir, 'hashLookup.pkl'), lookupStore=ModulestoreImporter.SQLITE_STORE)
+            self.assertEqual('1.5', self.importer.getDisplayName('0123456789abcdef0123456789abcdef'))
+        finally:
+            shutil.rmtree(tmpDir)
+
+    @unittest.skipIf(not TEST_ALL, "Temporarily disabled")    
+    def testCommentedObjectJSON(self):
+        # Extract files may start with comment lines, and may
+        # hold an object whose 'all' field is the entry array:
+        tmpDir = tempfile.mkdtemp()
+        try:
+            jsonFileName = os.path.join(tmpDir, 'modulestore_latest.json')
+            with open(jsonFileName, 'w') as outFd:
+                outFd.write('# Modulestore extract\n#   second comment line\n\n{"all" : ')
+                with open(os.path.join(TestModulestoreImporter.dataDir, 'modulestore_latest.json'), 'r') as inFd:
+                    outFd.write(inFd.read())
+                outFd.write('}\n')
+            self.importer = ModulestoreImporter(jsonFileName, useCache=False, pickleCachePath=os.path.join(tmpDir, 'hashLookup.pkl'))
+            self.useTheDict()
+            self.assertEqual(3, len(self.importer.hashLookup))
+            
+            with open(jsonFileName, 'w') as outFd:
+                outFd.write('[{"_id" : {"name" : "foo"}, ')
+            self.assertRaises(ValueError, ModulestoreImporter, jsonFileName, useCache=False, pickleCachePath=os.path.join(tmpDir, 'hashLookup.pkl'))
+        finally:
+            shutil.rmtree(tmpDir)
+
     @unittest.skipIf(not TEST_ALL, "Temporarily disabled")    
     def testExportHashInfoToCSV(self):
 
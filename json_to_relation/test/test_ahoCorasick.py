@@ -0,0 +1,54 @@
+# Copyright (c) 2014, Stanford University
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+'''
+Created on Oct 18, 2026
+'''
+import random
+import unittest
+
+from json_to_relation.ahoCorasick import AhoCorasickMatcher
+
+TEST_ALL = True
+
+class TestAhoCorasick(unittest.TestCase):
+
+    @unittest.skipIf(not TEST_ALL, "Temporarily disabled")
+    def testPriority(self):
+        matcher = AhoCorasickMatcher(['EDUC115N', 'HRP258', 'db', 'EE'])
+        self.assertEqual('EDUC115N', matcher.findBestMatch('/courses/Education/EDUC115N/How_to_Learn_Math'))
+        self.assertEqual('HRP258', matcher.findBestMatch('Medicine/HRP258/Statistics_in_Medicine'))
+        # Higher priority wins regardless of position in the text:
+        self.assertEqual('HRP258', matcher.findBestMatch('dbHRP258'))
+        self.assertEqual('db', matcher.findBestMatch('EEdb'))
+        self.assertIsNone(matcher.findBestMatch('Medicine/HRP259/Stats'))
+        self.assertIsNone(AhoCorasickMatcher([]).findBestMatch('anything'))
+
+    @unittest.skipIf(not TEST_ALL, "Temporarily disabled")
+    def testSameAsLinearScan(self):
+        # Overlapping patterns exercise the failure links:
+        rand = random.Random(17)
+        alphabet = 'abc'
+        for trialNum in range(50): #@UnusedVariable
+            patterns = list(set([''.join(rand.choice(alphabet) for charNum in range(rand.randint(1, 5))) #@UnusedVariable
+                                 for patternNum in range(rand.randint(1, 8))])) #@UnusedVariable
+            patterns.sort(key=len, reverse=True)
+            matcher = AhoCorasickMatcher(patterns)
+            for textNum in range(20): #@UnusedVariable
+                text = ''.join(rand.choice(alphabet) for charNum in range(rand.randint(0, 12))) #@UnusedVariable
+                expected = None
+                for pattern in patterns:
+                    if text.find(pattern) > -1:
+                        expected = pattern
+                        break
+                self.assertEqual(expected, matcher.findBestMatch(text))
+
+if __name__ == "__main__":
+    unittest.main()
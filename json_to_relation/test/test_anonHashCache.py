@@ -0,0 +1,78 @@
+# Copyright (c) 2014, Stanford University
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+'''
+Created on Oct 18, 2026
+'''
+import glob
+import hashlib
+import os
+import shutil
+import stat
+import tempfile
+import unittest
+
+from json_to_relation.anonHashCache import AnonHashCache
+
+
+TEST_ALL = True
+
+class TestAnonHashCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        self.storePath = os.path.join(self.tmpDir, 'anonHashes')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    @unittest.skipIf(not TEST_ALL, "Temporarily disabled")
+    def testMemoryCache(self):
+        hasher = AnonHashCache(cacheSize=2)
+        expected = hashlib.new('ripemd160', 'abc').hexdigest()
+        self.assertEqual(expected, hasher.hash('abc'))
+        self.assertEqual(expected, hasher.hash('abc'))
+        self.assertEqual(expected, hasher.hash(u'abc'))
+        self.assertEqual((2, 1), hasher.lookupCache.takeCounts())
+        self.assertEqual(hashlib.new('ripemd160', 'def').hexdigest(), hasher.hash('def'))
+
+    @unittest.skipIf(not TEST_ALL, "Temporarily disabled")
+    def testPersistentStore(self):
+        hasher = AnonHashCache(storePath=self.storePath)
+        anonName = hasher.hash('someScreenName')
+        hasher.close()
+        # Only the owner may read the name/hash pairs:
+        storeFiles = glob.glob(self.storePath + '*')
+        self.assertTrue(len(storeFiles) > 0)
+        for storeFile in storeFiles:
+            self.assertEqual(0, os.stat(storeFile).st_mode & (stat.S_IRWXG | stat.S_IRWXO))
+        # A new run finds the hash in the store:
+        hasher = AnonHashCache(storePath=self.storePath)
+        self.assertEqual(anonName, hasher.store['someScreenName'])
+        self.assertEqual(anonName, hasher.hash('someScreenName'))
+        hasher.close()
+
+    @unittest.skipIf(not TEST_ALL, "Temporarily disabled")
+    def testPrewarm(self):
+        hasher = AnonHashCache(storePath=self.storePath)
+        pairs = [('name1', AnonHashCache.computeHash('name1')),
+                 (u'name2', AnonHashCache.computeHash('name2')),
+                 (None, None)]
+        self.assertEqual(2, hasher.prewarm(pairs))
+        self.assertEqual(AnonHashCache.computeHash('name2'), hasher.store['name2'])
+        hasher.close()
+
+        hasher = AnonHashCache()
+        hasher.prewarm(pairs)
+        self.assertEqual(AnonHashCache.computeHash('name1'), hasher.hash('name1'))
+        self.assertEqual((1, 0), hasher.lookupCache.takeCounts())
+
+if __name__ == "__main__":
+    unittest.main()
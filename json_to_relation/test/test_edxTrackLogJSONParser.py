@@ -32,12 +32,15 @@ truth to the new column being presents.
 '''
 import StringIO
 from collections import OrderedDict
+import datetime
 import json
 import os
 import re
 import shutil
+import subprocess
 import sys
 import tempfile
+import time
 import unittest
 
 from json_to_relation.edxTrackLogJSONParser import EdXTrackLogJSONParser
@@ -308,6 +311,38 @@ class TestEdxTrackLogJSONParser(unittest.TestCase):
         edxParser.processOneJSONObject(self.loginEvent, row)
         #print row
         
+    @unittest.skipIf(not TEST_ALL, "Temporarily disabled")
+    def testEventHandlerRegistry(self):
+        fileConverter = JSONToRelation(self.stringSource,
+                                       OutputFile(os.devnull, OutputDisposition.OutputFormat.CSV),
+                                       mainTableName='Main'
+                                       )
+        edxParser = EdXTrackLogJSONParser(fileConverter, 'Main', replaceTables=True, dbName='Edx', useDisplayNameCache=True)
+        fileConverter.setParser(edxParser)
+
+        # Exact matches, prefix matches, and the slash fallback:
+        self.assertEqual(edxParser.handleVideoSeek, edxParser.getEventHandlerSpec('seek_video')[0])
+        self.assertEqual(edxParser.handleBook, edxParser.getEventHandlerSpec('book')[0])
+        self.assertEqual(edxParser.handleBook, edxParser.getEventHandlerSpec('textbook.pdf.thumbnails.toggled')[0])
+        self.assertIsNone(edxParser.getEventHandlerSpec('/dashboard')[0])
+        self.assertEqual(edxParser.handlePathStyledEventTypes, edxParser.getEventHandlerSpec('/courses/Medicine/HRP258/foo')[0])
+        self.assertIsNone(edxParser.getEventHandlerSpec('no_such_event'))
+
+        # Longer prefixes win over shorter ones:
+        edxParser.registerEventHandler('/courses/Medicine', edxParser.handleForumEvent, isPrefix=True, returnsRow=False)
+        self.assertEqual(edxParser.handleForumEvent, edxParser.getEventHandlerSpec('/courses/Medicine/HRP258/foo')[0])
+        self.assertEqual(edxParser.handlePathStyledEventTypes, edxParser.getEventHandlerSpec('/courses/Education/foo')[0])
+
+        # A newly registered handler gets called with the decoded event:
+        handlerCalls = []
+        def myHandler(record, row, event):
+            handlerCalls.append(event)
+            return row
+        edxParser.registerEventHandler('speed_change_video', myHandler)
+        edxParser.processOneJSONObject(self.videoEvent, [])
+        self.assertEqual(1, len(handlerCalls))
+        self.assertEqual('1.0', handlerCalls[0]['new_speed'])
+
     @unittest.skipIf(not TEST_ALL, "Temporarily disabled")
     def testEdxHeartbeat(self):        
         # Test series of heartbeats that did not experience a server outage:
@@ -405,6 +440,139 @@ class TestEdxTrackLogJSONParser(unittest.TestCase):
         self.assertEqual('Medicine/HRP258/Statistics_in_Medicine', edxParser.extractCanonicalCourseName('Medicine/HRP258/Statistics_in_Medicine'))
         self.assertEqual('Education/EDUC115N/How_to_Learn_Math', edxParser.extractCanonicalCourseName('/courses/Education/EDUC115N/How_to_Learn_Math/modx/i4x://Education/EDUC115N/sequential/1b3ac347ca064b3eaaddbc27d4200964/goto_position'))
  
+    @unittest.skipIf(not TEST_ALL, "Temporarily disabled")
+    def testCourseIdCache(self):
+        fileConverter = JSONToRelation(self.stringSource,
+                                       OutputFile(os.devnull, OutputDisposition.OutputFormat.CSV),
+                                       mainTableName='Main'
+                                       )
+        edxParser = EdXTrackLogJSONParser(fileConverter, 'Main', replaceTables=True, dbName='Edx', useDisplayNameCache=True)
+        fileConverter.setParser(edxParser)
+        browserRecord = {'event_source' : 'browser',
+                         'event_type' : 'play_video',
+                         'page' : 'https://class.stanford.edu/courses/Medicine/HRP258/Statistics_in_Medicine/courseware/'}
+        expected = edxParser.resolveCourseId(browserRecord)
+        edxParser.courseIdCache.takeCounts()
+        self.assertEqual(expected, edxParser.get_course_id(browserRecord))
+        # Same page, different event type: answered from the cache:
+        browserRecord['event_type'] = 'pause_video'
+        self.assertEqual(expected, edxParser.get_course_id(browserRecord))
+        self.assertEqual((1, 1), edxParser.courseIdCache.takeCounts())
+        # problem_* events are not cached:
+        problemRecord = {'event_source' : 'server',
+                         'event_type' : 'problem_check',
+                         'event' : '{"correct_map": {"i4x-Medicine-HRP258-problem-8dd11b4339884ab78bc844ce45847141_2_1": {}}}'}
+        self.assertIsNone(edxParser.makeCourseIdCacheKey(problemRecord))
+        self.assertEqual(('Medicine-HRP258', 'Medicine-HRP258', ''), edxParser.get_course_id(problemRecord))
+        self.assertEqual((0, 0), edxParser.courseIdCache.takeCounts())
+
+    @unittest.skipIf(not TEST_ALL, "Temporarily disabled")
+    def testNestedJSONDecodedOnce(self):
+        fileConverter = JSONToRelation(self.stringSource,
+                                       OutputFile(os.devnull, OutputDisposition.OutputFormat.CSV),
+                                       mainTableName='Main'
+                                       )
+        edxParser = EdXTrackLogJSONParser(fileConverter, 'Main', replaceTables=True, dbName='Edx', useDisplayNameCache=True)
+        fileConverter.setParser(edxParser)
+        loginEvent = '{"POST": {}, "GET": {"next": ["/courses/Medicine/HRP258/Statistics_in_Medicine/courseware/80160e/"]}}'
+        loginRecord = {'event_source' : 'server',
+                       'event_type' : '/accounts/login',
+                       'event' : loginEvent}
+        edxParser.resolveCourseId(loginRecord)
+        # Kept for the event decode in processOneJSONObject():
+        self.assertEqual({}, edxParser.nestedJSONCache[loginEvent]['POST'])
+        # With backslashes, makeJSONSafe() changes the string, so
+        # processOneJSONObject() must decode the event itself:
+        loginRecord['event'] = '{"POST": {"email": "a\\nb"}, "GET": {}}'
+        edxParser.resolveCourseId(loginRecord)
+        self.assertNotIn(loginRecord['event'], edxParser.nestedJSONCache)
+
+    @unittest.skipIf(not TEST_ALL, "Temporarily disabled")
+    def testQuotedStringEvent(self):
+        # The event of problem_check/problem_save records is sometimes
+        # a JSON string literal. Its quotes must not end up in the values:
+        testFilePath = os.path.join(os.path.dirname(__file__),"data/problem_checkSimpleCase.json")
+        resultFile = tempfile.NamedTemporaryFile(prefix='oolala', suffix='.sql')
+        resultFileName = resultFile.name
+        resultFile.close()
+        dest = OutputFile(resultFileName, OutputDisposition.OutputFormat.SQL_INSERT_STATEMENTS)
+        fileConverter = JSONToRelation(InURI(testFilePath),
+                                       dest,
+                                       mainTableName='EdxTrackEvent'
+                                       )
+        edxParser = EdXTrackLogJSONParser(fileConverter, 'EdxTrackEvent', replaceTables=True, dbName='Edx', useDisplayNameCache=True)
+        fileConverter.setParser(edxParser)
+        fileConverter.convert()
+        dest.close()
+        with open(resultFileName, 'r') as fd:
+            sql = fd.read()
+        os.remove(resultFileName)
+        self.assertIn("'input_i4x-Medicine-HRP258-problem-7451f8fe15a642e1820767db411a4a3e_2_1','choice_2',", sql)
+        self.assertIn("'input_i4x-Medicine-HRP258-problem-7451f8fe15a642e1820767db411a4a3e_3_1','choice_2',", sql)
+        self.assertNotIn("'\"input_", sql)
+        self.assertNotIn('choice_2"', sql)
+
+    @unittest.skipIf(not TEST_ALL, "Temporarily disabled")
+    def testCompressedCSVLoadCommands(self):
+        tmpDir = tempfile.mkdtemp()
+        fifoOpenTimeout = EdXTrackLogJSONParser.FIFO_OPEN_TIMEOUT
+        EdXTrackLogJSONParser.FIFO_OPEN_TIMEOUT = 1
+        try:
+            # Quotes in file names must not break the shell or SQL quoting:
+            dest = OutputFile(os.path.join(tmpDir, "it's.sql"), OutputDisposition.OutputFormat.CSV, compression=OutputDisposition.Compression.GZIP)
+            fileConverter = JSONToRelation(InURI(os.path.join(self.currDir, 'data/problem_checkSimpleCase.json')), dest, mainTableName='EdxTrackEvent')
+            edxParser = EdXTrackLogJSONParser(fileConverter, 'EdxTrackEvent', replaceTables=True, dbName='Edx', useDisplayNameCache=True)
+            dest.writeInsertStatement("INSERT INTO Answer (answer) VALUES \n    ('foo');", 'Answer', ["'foo'"])
+            dest.close()
+            csvFileName = dest.getCSVTableOutFileName('Answer')
+            fifoName = csvFileName + '.fifo'
+            loadCommands = edxParser.createCSVTableLoadCommands(dest).split('\n')
+            loadIndex = loadCommands.index("LOAD DATA LOCAL INFILE '%s' IGNORE INTO TABLE Answer FIELDS OPTIONALLY ENCLOSED BY \"'\" TERMINATED BY ','; " %\
+                                           fifoName.replace("'", "\\'"))
+            self.assertEqual("system rm -f '%s'" % fifoName.replace("'", "'\\''"), loadCommands[loadIndex + 1])
+            # Run the 'system' command that feeds the named pipe,
+            # and read the pipe in place of the LOAD:
+            systemCommand = loadCommands[loadIndex - 1]
+            self.assertTrue(systemCommand.startswith('system '))
+            subprocess.check_call(systemCommand[len('system '):], shell=True)
+            with open(fifoName, 'r') as fd:
+                self.assertEqual("'foo'\n", fd.read())
+            # Without a reader, the watchdog makes the decompressor
+            # give up, and no process is left using the pipe:
+            subprocess.check_call(systemCommand[len('system '):], shell=True)
+            for _ in range(50):
+                if subprocess.call(['pgrep', '-f', tmpDir], stdout=open(os.devnull, 'w')) != 0:
+                    break
+                time.sleep(0.1)
+            else:
+                self.fail('Decompressor still waiting for a reader')
+        finally:
+            EdXTrackLogJSONParser.FIFO_OPEN_TIMEOUT = fifoOpenTimeout
+            shutil.rmtree(tmpDir)
+
+    @unittest.skipIf(not TEST_ALL, "Temporarily disabled")
+    def testEventTimeAndQuarter(self):
+        fileConverter = JSONToRelation(self.stringSource,
+                                       OutputFile(os.devnull, OutputDisposition.OutputFormat.CSV),
+                                       mainTableName='Main'
+                                       )
+        edxParser = EdXTrackLogJSONParser(fileConverter, 'Main', replaceTables=True, dbName='Edx', useDisplayNameCache=True)
+        fileConverter.setParser(edxParser)
+        for timeStr in ['2013-07-18T08:43:32.573390', '2013-07-18T08:43:32.5', '2013-12-01T00:00:00.000001']:
+            expected = datetime.datetime.strptime(timeStr, '%Y-%m-%dT%H:%M:%S.%f')
+            self.assertEqual(expected, edxParser.getEventTimeFromLogTimeString(timeStr))
+            self.assertEqual(expected, edxParser.getEventTimeFromLogTimeString(timeStr + '+00:00'))
+        self.assertEqual(datetime.datetime(2013, 7, 18, 8, 43, 32), edxParser.getEventTimeFromLogTimeString(u'2013-07-18T08:43:32+00:00'))
+        # Shapes the fast path does not handle still go through strptime:
+        self.assertEqual(datetime.datetime(2013, 7, 8, 8, 43, 32), edxParser.getEventTimeFromLogTimeString('2013-7-8T08:43:32.0'))
+        self.assertRaises(ValueError, edxParser.getEventTimeFromLogTimeString, '2013-13-18T08:43:32.573390')
+        self.assertRaises(ValueError, edxParser.getEventTimeFromLogTimeString, 'yesterday, around noon')
+
+        self.assertEqual('summer2013', edxParser.getQuarter(datetime.datetime(2013, 7, 18)))
+        self.assertEqual('winter2013', edxParser.getQuarter(datetime.datetime(2013, 12, 1)))
+        self.assertEqual('winter2014', edxParser.getQuarter(datetime.datetime(2014, 2, 28)))
+        self.assertEqual('summer2013', edxParser.getQuarter(datetime.datetime(2013, 7, 1)))
+
     @unittest.skipIf(not TEST_ALL, "Temporarily disabled")
     def testProblemCheckEventTypeComplexCase(self):
 
@@ -749,6 +917,26 @@ class TestEdxTrackLogJSONParser(unittest.TestCase):
         else:
             self.assertFileContentEquals(truthFile, dest.name)
 
+    @unittest.skipIf(not TEST_ALL, "Temporarily disabled")
+    def testAboutEventStats(self):
+        # Events finished in handleCommonFields() are counted
+        # under their event type, not as undetermined:
+        testFilePath = os.path.join(os.path.dirname(__file__),"data/aboutTest.json")
+        resultFile = tempfile.NamedTemporaryFile(prefix='oolala', suffix='.sql')
+        resultFileName = resultFile.name
+        resultFile.close()
+        dest = OutputFile(resultFileName, OutputDisposition.OutputFormat.SQL_INSERT_STATEMENTS)
+        fileConverter = JSONToRelation(InURI(testFilePath),
+                                       dest,
+                                       mainTableName='EdxTrackEvent'
+                                       )
+        edxParser = EdXTrackLogJSONParser(fileConverter, 'EdxTrackEvent', replaceTables=True, dbName='Edx', useDisplayNameCache=True, collectStats=True)
+        fileConverter.setParser(edxParser)
+        fileConverter.convert()
+        dest.close()
+        os.remove(resultFileName)
+        self.assertEqual({'about' : 1}, edxParser.stats.eventTypeCounts)
+
     @unittest.skipIf(not TEST_ALL, "Temporarily disabled")
     def testSeekVideo(self):
         testFilePath = os.path.join(os.path.dirname(__file__),"data/seekVideo.json")
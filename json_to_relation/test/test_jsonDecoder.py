@@ -0,0 +1,73 @@
+# Copyright (c) 2014, Stanford University
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+'''
+Created on Oct 18, 2026
+'''
+import glob
+import json
+import os
+import unittest
+
+from json_to_relation.jsonDecoder import JSONDecoder
+
+
+TEST_ALL = True
+
+class TestJSONDecoder(unittest.TestCase):
+
+    def setUp(self):
+        self.samples = ['{"event_type": "play_video", "time": "2013-07-18T08:43:32.573390+00:00", "event": "{\\"currentTime\\":0.1}"}',
+                        '{"big": 123456789012345678901234567890, "float": 0.1, "neg": -1.5e-7, "uni": "caf\\u00e9"}',
+                        '[1, 2, {"a": null, "b": true}]'
+                        ]
+        for fileName in glob.glob(os.path.join(os.path.dirname(__file__), 'data/*.json'))[:20]:
+            with open(fileName, 'r') as fd:
+                self.samples.extend([line for line in fd if line.strip()][:5])
+        # Not acceptable to json.loads():
+        self.badSamples = ['{"event_type": "play_video"', "{'single': 'quotes'}", '{"a": 1} trailing', '',
+                           '{"agent": "Mozilla/5.0\t(Windows)"}',
+                           '{"a": 1,}']
+        # Of these, ujson accepts the raw tab, and the trailing comma:
+        self.ujsonAccepted = self.badSamples[-2:]
+
+    def checkAgreesWithStdlib(self, decoder, lenientOn=[]):
+        for sample in self.samples:
+            try:
+                expected = json.loads(sample)
+            except ValueError:
+                self.assertRaises(ValueError, decoder.loads, sample)
+                continue
+            self.assertEqual(expected, decoder.loads(sample))
+        for sample in self.badSamples:
+            if sample in lenientOn:
+                decoder.loads(sample)
+            else:
+                self.assertRaises(ValueError, decoder.loads, sample)
+
+    @unittest.skipIf(not TEST_ALL, "Temporarily disabled")
+    def testStdlib(self):
+        decoder = JSONDecoder(JSONDecoder.STDLIB)
+        self.assertEqual(JSONDecoder.STDLIB, decoder.backend)
+        self.checkAgreesWithStdlib(decoder)
+
+    @unittest.skipIf(not TEST_ALL, "Temporarily disabled")
+    def testDefault(self):
+        decoder = JSONDecoder()
+        self.assertEqual(JSONDecoder.STDLIB, decoder.backend)
+        self.checkAgreesWithStdlib(decoder)
+        self.assertRaises(ValueError, JSONDecoder, 'yaml')
+
+    @unittest.skipIf(not JSONDecoder.isAvailable(JSONDecoder.UJSON), "ujson is not installed")
+    def testUjson(self):
+        self.checkAgreesWithStdlib(JSONDecoder(JSONDecoder.UJSON), lenientOn=self.ujsonAccepted)
+
+if __name__ == "__main__":
+    unittest.main()
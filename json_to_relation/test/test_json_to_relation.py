@@ -11,6 +11,7 @@
 import StringIO
 from collections import OrderedDict
 import os
+import re
 import shutil
 import tempfile
 import unittest
@@ -200,6 +201,86 @@ class TestJSONToRelation(unittest.TestCase):
         print("Stress test done")
         
 
+    @unittest.skipIf(not TEST_ALL, "Temporarily disabled")
+    def test_sharded_conversion(self):
+        # Convert the same file once in this process, and once in
+        # a pool of workers with tiny shards; the per-table CSV
+        # files must be the same, except for the generated UUIDs.
+        # The downtime sample has a heartbeat after a downtime,
+        # and heartbeats that are dropped; with one-line shards,
+        # each worker starts every line afresh:
+        uuidPattern = re.compile('[a-f0-9]{8}_[a-f0-9]{4}_[a-f0-9]{4}_[a-f0-9]{4}_[a-f0-9]{12}')
+        tmpDir = tempfile.mkdtemp(prefix='shardTest')
+        try:
+            for (jsonFileName, linesPerShard) in [('edxTrackLogSample.json', 4),
+                                                  ('edxTrackLogSample.json', 1),
+                                                  ('edxHeartbeatEventDownTime.json', 1)]:
+                outFiles = []
+                rowCounts = []
+                for workers in [1,3]:
+                    outFileName = os.path.join(tmpDir, '%s_%s_workers%s.sql' % (jsonFileName, linesPerShard, workers))
+                    source = InURI(os.path.join(os.path.dirname(__file__),"data", jsonFileName))
+                    outFile = OutputFile(outFileName, OutputDisposition.OutputFormat.CSV, options='wb')
+                    self.fileConverter = JSONToRelation(source, 
+                                                        outFile,
+                                                        mainTableName='EdxTrackEvent',
+                                                        logFile=self.tmpLogFile.name
+                                                        )
+                    edxJsonToRelParser = EdXTrackLogJSONParser(self.fileConverter, "EdxTrackEvent", useDisplayNameCache=True, collectStats=True)
+                    self.fileConverter.jsonParserInstance = edxJsonToRelParser
+                    self.fileConverter.convert(workers=workers, linesPerShard=linesPerShard)
+                    outFiles.append(outFile)
+                    rowCounts.append(edxJsonToRelParser.stats.tableRowCounts)
+                (serialOut, shardedOut) = outFiles
+                for tableName in ['EdxTrackEvent', 'Answer', 'State', 'CorrectMap', 'InputState', 'EventIp']:
+                    serialFileName = serialOut.getCSVTableOutFileName(tableName)
+                    if not os.path.exists(serialFileName):
+                        continue
+                    with open(serialFileName, 'r') as fd:
+                        expected = uuidPattern.sub('<uuid>', fd.read())
+                    with open(shardedOut.getCSVTableOutFileName(tableName), 'r') as fd:
+                        sharded = uuidPattern.sub('<uuid>', fd.read())
+                    self.assertEqual(expected, sharded)
+                self.assertEqual(rowCounts[0], rowCounts[1])
+        finally:
+            shutil.rmtree(tmpDir)
+
+    @unittest.skipIf(not TEST_ALL, "Temporarily disabled")
+    def test_direct_csv_output(self):
+        # CSV-only output is written straight from the pushed rows;
+        # with INSERTs and CSV, the CSV is extracted from the INSERT
+        # statements. The per-table CSV files must be the same, except
+        # for the generated UUIDs:
+        uuidPattern = re.compile('[a-f0-9]{8}_[a-f0-9]{4}_[a-f0-9]{4}_[a-f0-9]{4}_[a-f0-9]{12}')
+        tmpDir = tempfile.mkdtemp(prefix='directCSVTest')
+        try:
+            outFiles = []
+            for outputFormat in [OutputDisposition.OutputFormat.SQL_INSERTS_AND_CSV, OutputDisposition.OutputFormat.CSV]:
+                outFileName = os.path.join(tmpDir, 'format%s.sql' % outputFormat)
+                source = InURI(os.path.join(os.path.dirname(__file__),"data/edxTrackLogSample.json"))
+                outFile = OutputFile(outFileName, outputFormat, options='wb')
+                self.fileConverter = JSONToRelation(source,
+                                                    outFile,
+                                                    mainTableName='EdxTrackEvent',
+                                                    logFile=self.tmpLogFile.name
+                                                    )
+                edxJsonToRelParser = EdXTrackLogJSONParser(self.fileConverter, "EdxTrackEvent", useDisplayNameCache=True)
+                self.fileConverter.jsonParserInstance = edxJsonToRelParser
+                self.fileConverter.convert()
+                outFiles.append(outFile)
+            (fromInsertsOut, directOut) = outFiles
+            for tableName in ['EdxTrackEvent', 'Answer', 'State', 'CorrectMap', 'InputState', 'EventIp']:
+                fromInsertsFileName = fromInsertsOut.getCSVTableOutFileName(tableName)
+                if not os.path.exists(fromInsertsFileName):
+                    continue
+                with open(fromInsertsFileName, 'r') as fd:
+                    expected = uuidPattern.sub('<uuid>', fd.read())
+                with open(directOut.getCSVTableOutFileName(tableName), 'r') as fd:
+                    direct = uuidPattern.sub('<uuid>', fd.read())
+                self.assertEqual(expected, direct)
+        finally:
+            shutil.rmtree(tmpDir)
+
     @unittest.skipIf(not TEST_ALL, "Temporarily disabled")
     def test_schema_hints(self):
         self.fileConverter = JSONToRelation(self.stringSource, 
@@ -235,78 +316,101 @@ class TestJSONToRelation(unittest.TestCase):
     def testInsertStatementConstruction(self):
         
         # No value array in hold-back buffer:
-        self.fileConverter.currInsertSig = 'col1, col2'
-        self.fileConverter.currOutTable = 'TestTable'
-        self.fileConverter.currValsArray = []
-        self.assertIsNone(self.fileConverter.finalizeInsertStatement())
+        self.assertIsNone(self.fileConverter.finalizeInsertStatement('TestTable', 'col1, col2'))
 
         # One value array in hold-back buffer:
-        self.fileConverter.currInsertSig = 'col1, col2'
-        self.fileConverter.currOutTable = 'MyTable'
-        self.fileConverter.currValsArray = [['foo', 10]]
-        res = self.fileConverter.finalizeInsertStatement()
+        self.assertIsNone(self.fileConverter.prepareMySQLRow(('MyTable', 'col1, col2', ['foo', 10])))
+        res = self.fileConverter.finalizeInsertStatement('MyTable', 'col1, col2')
         #print res
         self.assertEqual("INSERT INTO MyTable (col1, col2) VALUES \n    ('foo',10);", res)
+        self.assertNotIn(('MyTable', 'col1, col2'), self.fileConverter.insertBuffers)
         
-        self.fileConverter.currInsertSig = 'col1, col2'
-        self.fileConverter.currOutTable = 'MyTable'
-        self.fileConverter.currValsArray = [['foo', 10], ['bar', 20]]
-        res = self.fileConverter.finalizeInsertStatement()
+        self.fileConverter.prepareMySQLRow(('MyTable', 'col1, col2', ['foo', 10]))
+        self.fileConverter.prepareMySQLRow(('MyTable', 'col1, col2', ['bar', 20]))
+        res = self.fileConverter.finalizeInsertStatement('MyTable', 'col1, col2')
         #print res
         self.assertEqual("INSERT INTO MyTable (col1, col2) VALUES \n    ('foo',10),\n    ('bar',20);", res)
         
+    @unittest.skipIf(not TEST_ALL, "Temporarily disabled")
+    def testEncodeValuesRow(self):
+        self.assertEqual(u"'foo',10,null,null,3.5,'','\xe9'",
+                         self.fileConverter.encodeValuesRow(['foo', 10, None, 'null', 3.5, '', u'\xe9']))
+        self.assertEqual("null,True,12345678901234", self.fileConverter.encodeValuesRow([u'null', True, 12345678901234L]))
+        self.assertEqual('', self.fileConverter.encodeValuesRow([]))
+
     @unittest.skipIf(not TEST_ALL, "Temporarily disabled")
     def testPrepareMySQLRow(self):
         
-        # Pretend to be the edx parser, sending one insert's worth of
-        # info. This will fit into the hold-back buffer, and return None:
-        insertInfo = ('MyTable', 'col1, col2', [['foo', 10],['bar',20]])
-        #print(res)
-        self.assertEqual('LoadInfo', self.fileConverter.currOutTable)
-        self.assertEqual('load_info_id,load_date_time,load_file', self.fileConverter.currInsertSig)
-        currValsArr = self.fileConverter.currValsArray
-        self.assertEqual('d4e622ff221b1eec00405f1b69893ff544ac5d75', currValsArr[0][0])
-        self.assertEqual('file:///home/paepcke/EclipseWorkspaces/json_to_relation/json_to_relation/test/data/twoJSONRecords.json', currValsArr[0][2])
+        # The parser's constructor held back the LoadInfo row:
+        loadInfoRows = self.fileConverter.insertBuffers[('LoadInfo', 'load_info_id,load_date_time,load_file')][0]
+        self.assertEqual(1, len(loadInfoRows))
+        self.assertTrue(loadInfoRows[0].startswith("'d4e622ff221b1eec00405f1b69893ff544ac5d75',"))
+        self.assertTrue(loadInfoRows[0].endswith(",'file:///home/paepcke/EclipseWorkspaces/json_to_relation/json_to_relation/test/data/twoJSONRecords.json'"))
+        self.fileConverter.finalizeInsertStatements()
+        self.assertEqual(0, len(self.fileConverter.insertBuffers))
+        
+        # Pretend to be the edx parser, sending interleaved rows for
+        # two tables. Each table's rows are held back separately:
+        valsArray = ['foo', 10]
+        self.assertIsNone(self.fileConverter.prepareMySQLRow(('MyTable', 'col1, col2', valsArray)))
+        # Parser reuses its values array; the held-back row must not change:
+        valsArray[0] = 'changed'
+        self.assertIsNone(self.fileConverter.prepareMySQLRow(('OtherTable', 'col1', [None])))
+        self.assertIsNone(self.fileConverter.prepareMySQLRow(('MyTable', 'col1, col2', ['bar', 20])))
+        self.assertIsNone(self.fileConverter.prepareMySQLRow(('OtherTable', 'col1', ['null'])))
+        
+        # Call FLUSH to get the held-back values, in the order
+        # in which the tables were first seen:
+        res = self.fileConverter.prepareMySQLRow('FLUSH')
+        self.assertEqual("INSERT INTO MyTable (col1, col2) VALUES \n    ('foo',10),\n    ('bar',20);\n" +\
+                         "INSERT INTO OtherTable (col1) VALUES \n    (null),\n    (null);", res)
+        self.assertEqual(0, len(self.fileConverter.insertBuffers))
+        self.assertIsNone(self.fileConverter.prepareMySQLRow('FLUSH'))
         
         # Lower the allowed MySQL packet size to force immediate creation of INSERT statement:
-        self.fileConverter.__class__.MAX_ALLOWED_PACKET_SIZE = 3
-        self.fileConverter.currInsertSig = None
-        self.fileConverter.currOutTable = None
-        self.fileConverter.currValsArray = []
-        res = self.fileConverter.prepareMySQLRow(insertInfo)
-        self.assertEqual("INSERT INTO MyTable (col1, col2) VALUES \n    ('foo',10),\n    ('bar',20);", res)
+        self.fileConverter.maxAllowedPacketSize = 3
+        res = self.fileConverter.prepareMySQLRow(('MyTable', 'col1, col2', ['foo', 10]))
+        self.assertEqual("INSERT INTO MyTable (col1, col2) VALUES \n    ('foo',10);", res)
+        self.assertEqual(0, len(self.fileConverter.insertBuffers))
 
-        # Set the allowed MySQL packet size to allow a first INSERT statement to be 
-        # held back, but a second call must trigger sending of the held back
-        # values, holding back the newly submitted values: 
-        
-        # First call:
-        self.fileConverter.__class__.MAX_ALLOWED_PACKET_SIZE = 211
-        self.fileConverter.currInsertSig = None
-        self.fileConverter.currOutTable = None
-        self.fileConverter.currValsArray = []
-        res = self.fileConverter.prepareMySQLRow(insertInfo)
-        self.assertIsNone(res)
-        self.assertEqual('MyTable', self.fileConverter.currOutTable)
-        self.assertEqual('col1, col2', self.fileConverter.currInsertSig)
-        self.assertEqual([[['foo', 10], ['bar', 20]]], self.fileConverter.currValsArray)
+        # Allow a first row to be held back, but a second call must
+        # trigger sending of the held back values, holding back the
+        # newly submitted values. The limit is on the exact length
+        # of the INSERT statement:
+        self.fileConverter.maxAllowedPacketSize = len(res)
+        self.assertIsNone(self.fileConverter.prepareMySQLRow(('MyTable', 'col1, col2', ['foo', 10])))
+        res = self.fileConverter.prepareMySQLRow(('MyTable', 'col1, col2', ['blue', 30.1]))
+        self.assertEqual("INSERT INTO MyTable (col1, col2) VALUES \n    ('foo',10);", res)
+        self.assertEqual(["'blue',30.1"], self.fileConverter.insertBuffers[('MyTable', 'col1, col2')][0])
+        res = self.fileConverter.prepareMySQLRow('FLUSH')
+        self.assertEqual("INSERT INTO MyTable (col1, col2) VALUES \n    ('blue',30.1);", res)
 
-        # Second call:
-        insertMoreInfo = ('MyTable', 'col1, col2', [['blue', 30.1],['green',40.99]])
-        res = self.fileConverter.prepareMySQLRow(insertMoreInfo)
-        # Should have insert statement for the prior submission...
-        self.assertEqual("INSERT INTO MyTable (col1, col2) VALUES \n    (['foo', 10],['bar', 20]);", res)
-        # ... and the hold-back buffer should have the new submission:
-        self.assertEqual('MyTable', self.fileConverter.currOutTable)
-        self.assertEqual('col1, col2', self.fileConverter.currInsertSig)
-        self.assertEqual([[['blue', 30.1], ['green', 40.99]]], self.fileConverter.currValsArray)
-         
-        # Call FLUSH to get the held-back values:
+        # Byte counts match the statement, also for non-ASCII values:
+        self.fileConverter.maxAllowedPacketSize = JSONToRelation.MAX_ALLOWED_PACKET_SIZE
+        self.fileConverter.prepareMySQLRow(('MyTable', 'col1, col2', ['foo', 10]))
+        self.fileConverter.prepareMySQLRow(('MyTable', 'col1, col2', [u'gr\xfcn', 40.99]))
+        statementSize = self.fileConverter.insertBuffers[('MyTable', 'col1, col2')][1]
+        self.assertEqual(len(self.fileConverter.prepareMySQLRow('FLUSH').encode('utf-8')), statementSize)
+
+        # Row count limit:
+        self.fileConverter.maxRowsPerInsert = 2
+        self.assertIsNone(self.fileConverter.prepareMySQLRow(('MyTable', 'col1, col2', ['foo', 10])))
+        self.assertIsNone(self.fileConverter.prepareMySQLRow(('MyTable', 'col1, col2', ['bar', 20])))
+        res = self.fileConverter.prepareMySQLRow(('MyTable', 'col1, col2', ['green', 40.99]))
+        self.assertEqual("INSERT INTO MyTable (col1, col2) VALUES \n    ('foo',10),\n    ('bar',20);", res)
         res = self.fileConverter.prepareMySQLRow('FLUSH')
-        self.assertEqual("INSERT INTO MyTable (col1, col2) VALUES \n    (['blue', 30.1],['green', 40.99]);", res)
-        self.assertIsNone(self.fileConverter.currOutTable)
-        self.assertIsNone(self.fileConverter.currInsertSig)
-        self.assertEqual([], self.fileConverter.currValsArray)
+        self.assertEqual("INSERT INTO MyTable (col1, col2) VALUES \n    ('green',40.99);", res)
+        
+    @unittest.skipIf(not TEST_ALL, "Temporarily disabled")
+    def testMaxPacketSizeFromServer(self):
+        
+        class ServerStandIn(object):
+            def query(self, queryStr):
+                self.queryStr = queryStr
+                yield (67108864,)
+        server = ServerStandIn()
+        self.assertEqual(67108864 - JSONToRelation.PACKET_SIZE_MARGIN, JSONToRelation.maxPacketSizeFromServer(server))
+        self.assertEqual('SELECT @@max_allowed_packet', server.queryStr)
         
 #--------------------------------------------------------------------------------------------------    
     def assertFileContentEquals(self, expected, filePath):
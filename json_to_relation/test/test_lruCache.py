@@ -0,0 +1,52 @@
+# Copyright (c) 2014, Stanford University
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+'''
+Created on Oct 18, 2026
+'''
+import unittest
+
+from json_to_relation.lruCache import LRUCache
+
+TEST_ALL = True
+
+class TestLRUCache(unittest.TestCase):
+
+    @unittest.skipIf(not TEST_ALL, "Temporarily disabled")
+    def testEviction(self):
+        cache = LRUCache(2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        # Reading 'a' makes 'b' the least recently used:
+        self.assertEqual(1, cache.get('a'))
+        cache.put('c', 3)
+        self.assertEqual(2, len(cache))
+        self.assertTrue('a' in cache)
+        self.assertFalse('b' in cache)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual('gone', cache.get('b', 'gone'))
+        # Overwriting an entry does not evict:
+        cache.put('c', 4)
+        self.assertEqual(4, cache.get('c'))
+        self.assertEqual(2, len(cache))
+
+    @unittest.skipIf(not TEST_ALL, "Temporarily disabled")
+    def testCounts(self):
+        cache = LRUCache(10)
+        cache.get('x')
+        cache.put('x', 'y')
+        cache.get('x')
+        cache.get('x')
+        self.assertEqual((2, 1), cache.takeCounts())
+        self.assertEqual((0, 0), cache.takeCounts())
+        self.assertRaises(ValueError, LRUCache, 0)
+
+if __name__ == "__main__":
+    unittest.main()
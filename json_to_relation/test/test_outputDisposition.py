@@ -0,0 +1,193 @@
+# Copyright (c) 2014, Stanford University
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+'''
+Created on Oct 18, 2026
+'''
+import gzip
+import os
+import shutil
+import tempfile
+import unittest
+from collections import OrderedDict
+
+from json_to_relation.col_data_type import ColDataType
+from json_to_relation.input_source import InString
+from json_to_relation.json_to_relation import JSONToRelation
+from json_to_relation.output_disposition import BufferedFileWriter, OutputFile, \
+    OutputDisposition, ColumnSpec
+
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+try:
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+TEST_ALL = True
+
+class TestOutputDisposition(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        self.outFileName = os.path.join(self.tmpDir, 'out.sql')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    def readOutFile(self, fileName=None):
+        with open(self.outFileName if fileName is None else fileName, 'r') as fd:
+            return fd.read()
+
+    @unittest.skipIf(not TEST_ALL, "Temporarily disabled")
+    def testBufferedFileWriter(self):
+        writer = BufferedFileWriter(open(self.outFileName, 'w', 0), 10)
+        self.assertEqual(self.outFileName, writer.name)
+        writer.write('12345')
+        writer.write(u'678')
+        # Nothing reaches the file below the buffer size:
+        self.assertEqual('', self.readOutFile())
+        writer.write('90')
+        self.assertEqual('1234567890', self.readOutFile())
+        writer.write('abc')
+        writer.flush()
+        self.assertEqual('1234567890abc', self.readOutFile())
+        # Non-ASCII unicode fails at the write, as with File objects:
+        self.assertRaises(UnicodeEncodeError, writer.write, u'\xe9')
+        writer.write('def')
+        writer.close()
+        self.assertEqual('1234567890abcdef', self.readOutFile())
+
+    @unittest.skipIf(not TEST_ALL, "Temporarily disabled")
+    def testOutputFileBuffering(self):
+        dest = OutputFile(self.outFileName, OutputDisposition.OutputFormat.SQL_INSERTS_AND_CSV, bufferSize=1024)
+        dest.write('USE Edx;\n')
+        dest.writerow("INSERT INTO MyTable (col1,col2) VALUES \n    ('foo',10),\n    ('bar',20);")
+        csvFileName = dest.getCSVTableOutFileName('MyTable')
+        # Held in the buffers until flush():
+        self.assertEqual('', self.readOutFile())
+        self.assertEqual('', self.readOutFile(csvFileName))
+        dest.flush()
+        self.assertEqual("USE Edx;\nINSERT INTO MyTable (col1,col2) VALUES \n    ('foo',10),\n    ('bar',20);\n", self.readOutFile())
+        self.assertEqual("'foo',10\n'bar',20\n", self.readOutFile(csvFileName))
+        dest.writeInsertStatement("INSERT INTO MyTable (col1,col2) VALUES \n    ('blue',30);", 'MyTable', ["'blue',30"])
+        dest.close()
+        self.assertEqual("'foo',10\n'bar',20\n'blue',30\n", self.readOutFile(csvFileName))
+
+    @unittest.skipIf(not TEST_ALL, "Temporarily disabled")
+    def testCloseErrorsNotSwallowed(self):
+        dest = OutputFile(self.outFileName, OutputDisposition.OutputFormat.SQL_INSERTS_AND_CSV, compression=OutputDisposition.Compression.GZIP)
+        dest.writeInsertStatement("INSERT INTO Bad (col1) VALUES \n    ('foo');", 'Bad', ["'foo'"])
+        dest.writeInsertStatement("INSERT INTO Good (col1) VALUES \n    ('bar');", 'Good', ["'bar'"])
+        def failingClose():
+            raise IOError('No space left on device')
+        dest.csvTableFiles['Bad'].close = failingClose
+        self.assertRaises(IOError, dest.close)
+        # The other files were still completed:
+        with gzip.open(dest.getCSVTableOutFileName('Good'), 'rb') as fd:
+            self.assertEqual("'bar'\n", fd.read())
+        with gzip.open(dest.getFileName(), 'rb') as fd:
+            self.assertIn("('bar');", fd.read())
+        # Closing again, as after a 'with' block, is harmless:
+        del dest.csvTableFiles['Bad']
+        dest.close()
+
+    @unittest.skipIf(not TEST_ALL, "Temporarily disabled")
+    def testGzipOutput(self):
+        (sqlContent, csvContent) = self.writeCompressed(OutputDisposition.Compression.GZIP)
+        self.assertEqual(self.outFileName + '.gz', self.dest.getFileName())
+        self.assertEqual(self.outFileName + '_MyTableTable.csv.gz', self.dest.getCSVTableOutFileName('MyTable'))
+        self.assertEqual('gzip -dc', self.dest.getDecompressCommand())
+        with gzip.open(self.dest.getFileName(), 'rb') as fd:
+            self.assertEqual(sqlContent, fd.read())
+        with gzip.open(self.dest.getCSVTableOutFileName('MyTable'), 'rb') as fd:
+            self.assertEqual(csvContent, fd.read())
+
+    @unittest.skipIf(not TEST_ALL or zstandard is None, "Temporarily disabled, or zstandard not installed")
+    def testZstdOutput(self):
+        (sqlContent, csvContent) = self.writeCompressed(OutputDisposition.Compression.ZSTD)
+        self.assertEqual(self.outFileName + '_MyTableTable.csv.zst', self.dest.getCSVTableOutFileName('MyTable'))
+        for (fileName, content) in [(self.dest.getFileName(), sqlContent), (self.dest.getCSVTableOutFileName('MyTable'), csvContent)]:
+            with open(fileName, 'rb') as fd:
+                self.assertEqual(content, zstandard.ZstdDecompressor().decompressobj().decompress(fd.read()))
+
+    @unittest.skipIf(not TEST_ALL or lz4 is None, "Temporarily disabled, or lz4 not installed")
+    def testLz4Output(self):
+        (sqlContent, csvContent) = self.writeCompressed(OutputDisposition.Compression.LZ4)
+        self.assertEqual(self.outFileName + '_MyTableTable.csv.lz4', self.dest.getCSVTableOutFileName('MyTable'))
+        for (fileName, content) in [(self.dest.getFileName(), sqlContent), (self.dest.getCSVTableOutFileName('MyTable'), csvContent)]:
+            with open(fileName, 'rb') as fd:
+                self.assertEqual(content, lz4.frame.decompress(fd.read()))
+
+    @unittest.skipIf(not TEST_ALL, "Temporarily disabled")
+    def testCSVOnlyLoadFileUncompressed(self):
+        dest = OutputFile(self.outFileName, OutputDisposition.OutputFormat.CSV, compression=OutputDisposition.Compression.GZIP)
+        dest.write('LOAD DATA LOCAL INFILE ...;\n')
+        dest.close()
+        # The file with the LOAD commands can still be sourced into MySQL:
+        self.assertEqual(self.outFileName, dest.getFileName())
+        self.assertEqual('LOAD DATA LOCAL INFILE ...;\n', self.readOutFile())
+        self.assertRaises(ValueError, OutputFile, self.outFileName, OutputDisposition.OutputFormat.CSV, compression='rar')
+
+    @unittest.skipIf(not TEST_ALL or pyarrow is None, "Temporarily disabled, or pyarrow not installed")
+    def testParquetOutput(self):
+        dest = OutputFile(self.outFileName, OutputDisposition.OutputFormat.PARQUET, compression=OutputDisposition.Compression.GZIP)
+        converter = JSONToRelation(InString(''), dest, mainTableName='EdxTrackEvent')
+        schema = OrderedDict()
+        for (colName, colType) in [('answer_id', ColDataType.UUID), ('attempts', ColDataType.INT)]:
+            schema[colName] = ColumnSpec(colName, colType, converter)
+        converter.startNewTable('Answer', schema)
+        converter.pushString('CREATE TABLE Answer ...;\n')
+        converter.processFinishedRow(('Answer', 'answer_id,attempts', ['a1', 2]), dest)
+        # A table without a schema gets text columns:
+        converter.processFinishedRow(('EventIp', 'event_table_id,event_ip', ['e1', '10.0.0.1']), dest)
+        converter.processFinishedRow('FLUSH', dest)
+        dest.close()
+        # The main file holds just the DDL, uncompressed:
+        self.assertEqual('CREATE TABLE Answer ...;\n', self.readOutFile())
+        self.assertEqual(self.outFileName + '_AnswerTable.parquet', dest.getParquetTableOutFileName('Answer'))
+        answerTable = pyarrow.parquet.read_table(dest.getParquetTableOutFileName('Answer'))
+        self.assertEqual({'answer_id' : ['a1'], 'attempts' : [2]}, answerTable.to_pydict())
+        self.assertEqual(['string', 'int64'], [str(colType) for colType in answerTable.schema.types])
+        eventIpTable = pyarrow.parquet.read_table(dest.getParquetTableOutFileName('EventIp'))
+        self.assertEqual({'event_table_id' : ['e1'], 'event_ip' : ['10.0.0.1']}, eventIpTable.to_pydict())
+
+    def writeCompressed(self, compression):
+        '''
+        Write an INSERT statement and its CSV rows through an OutputFile
+        with the given compression. Use a small buffer, so that the
+        compressor receives several chunks.
+        '''
+        self.dest = OutputFile(self.outFileName,
+                               OutputDisposition.OutputFormat.SQL_INSERTS_AND_CSV,
+                               bufferSize=100,
+                               compression=compression)
+        sqlContent = ''
+        csvContent = ''
+        for rowNum in range(100):
+            insertStatement = "INSERT INTO MyTable (col1,col2) VALUES \n    ('foo%s',%s);" % (rowNum, rowNum)
+            self.dest.writerow(insertStatement)
+            sqlContent += insertStatement + '\n'
+            csvContent += "'foo%s',%s\n" % (rowNum, rowNum)
+        self.dest.close()
+        return (sqlContent, csvContent)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,129 @@
+# Copyright (c) 2014, Stanford University
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+
+'''
+Created on Oct 18, 2026
+'''
+import os
+import shutil
+import tempfile
+import unittest
+
+from json_to_relation.col_data_type import ColDataType
+from json_to_relation.parquetTableWriter import ParquetTableWriter
+
+try:
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+TEST_ALL = True
+
+class TestParquetTableWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        self.outFileName = os.path.join(self.tmpDir, 'Answer.parquet')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    @unittest.skipIf(not TEST_ALL or pyarrow is None, "Temporarily disabled, or pyarrow not installed")
+    def testTypeMapping(self):
+        writer = ParquetTableWriter(self.outFileName,
+                                    [('answer_id', ColDataType.UUID),
+                                     ('attempts', ColDataType.TINYINT),
+                                     ('grade', ColDataType.DOUBLE),
+                                     ('correct', ColDataType.BOOL),
+                                     ('time', ColDataType.DATETIME)])
+        writer.addRow('answer_id,attempts,grade,correct,time', ['a1', 3, '0.5', 1, '2013-08-01 10:00:00'])
+        writer.close()
+        schema = pyarrow.parquet.read_schema(self.outFileName)
+        self.assertEqual(['string', 'int64', 'double', 'bool', 'string'], [str(colType) for colType in schema.types])
+
+    @unittest.skipIf(not TEST_ALL or pyarrow is None, "Temporarily disabled, or pyarrow not installed")
+    def testRowGroupsAndValues(self):
+        writer = ParquetTableWriter(self.outFileName,
+                                    [('answer_id', ColDataType.UUID),
+                                     ('answer', ColDataType.TEXT),
+                                     ('attempts', ColDataType.INT)],
+                                    rowGroupSize=2)
+        writer.addRow('answer_id,answer,attempts', ['a1', "don\\'t know", '3'])
+        writer.addRow('answer_id,answer,attempts', ['a2', 'null', 'n/a'])
+        # Columns missing from the insertSig are NULL:
+        writer.addRow('answer,answer_id', [42, 'a3'])
+        # Bytes that are not UTF-8 don't lose the row group:
+        writer.addRow('answer_id,answer', ['a4', 'caf\xe9'])
+        writer.close()
+        parquetFile = pyarrow.parquet.ParquetFile(self.outFileName)
+        self.assertEqual(2, parquetFile.num_row_groups)
+        self.assertEqual({'answer_id' : ['a1', 'a2', 'a3', 'a4'],
+                          'answer' : ["don't know", None, '42', u'caf\ufffd'],
+                          'attempts' : [3, None, None, None]},
+                         parquetFile.read().to_pydict())
+
+    @unittest.skipIf(not TEST_ALL or pyarrow is None, "Temporarily disabled, or pyarrow not installed")
+    def testUnknownColumn(self):
+        writer = ParquetTableWriter(self.outFileName, [('answer_id', ColDataType.UUID)])
+        self.assertRaises(ValueError, writer.addRow, 'answer_id,problem_id', ['a1', 'p1'])
+        writer.close()
+        self.assertEqual(0, pyarrow.parquet.ParquetFile(self.outFileName).num_row_groups)
+
+    # The value converters don't need pyarrow:
+
+    @unittest.skipIf(not TEST_ALL, "Temporarily disabled")
+    def testToString(self):
+        self.assertIsNone(ParquetTableWriter.toString(None))
+        self.assertIsNone(ParquetTableWriter.toString('null'))
+        self.assertEqual('42', ParquetTableWriter.toString(42))
+        self.assertEqual("don't know", ParquetTableWriter.toString("don\\'t know"))
+        self.assertEqual('C:\\tmp', ParquetTableWriter.toString('C:\\tmp'))
+        self.assertEqual(u'caf\xe9', ParquetTableWriter.toString(u'caf\xe9'))
+
+    @unittest.skipIf(not TEST_ALL, "Temporarily disabled")
+    def testToInt(self):
+        self.assertEqual(3, ParquetTableWriter.toInt(3))
+        self.assertEqual(3, ParquetTableWriter.toInt('3'))
+        self.assertEqual(3, ParquetTableWriter.toInt('3.7'))
+        self.assertEqual(-3, ParquetTableWriter.toInt(-3L))
+        for val in [None, 'null', 'n/a', '', 'nan']:
+            self.assertIsNone(ParquetTableWriter.toInt(val))
+
+    @unittest.skipIf(not TEST_ALL, "Temporarily disabled")
+    def testToIntRange(self):
+        self.assertEqual(2**63 - 1, ParquetTableWriter.toInt(2**63 - 1))
+        self.assertEqual(-2**63, ParquetTableWriter.toInt(str(-2**63)))
+        # BIGINT UNSIGNED values beyond Parquet's int64, which
+        # would otherwise fail the whole row group:
+        for val in [2**64 - 1, str(2**64 - 1), 2**63, -2**63 - 1, '1e30', 'inf']:
+            self.assertIsNone(ParquetTableWriter.toInt(val))
+
+    @unittest.skipIf(not TEST_ALL, "Temporarily disabled")
+    def testToFloat(self):
+        self.assertEqual(0.5, ParquetTableWriter.toFloat(0.5))
+        self.assertEqual(0.5, ParquetTableWriter.toFloat('0.5'))
+        self.assertEqual(2.0, ParquetTableWriter.toFloat(2))
+        for val in [None, 'null', 'n/a']:
+            self.assertIsNone(ParquetTableWriter.toFloat(val))
+
+    @unittest.skipIf(not TEST_ALL, "Temporarily disabled")
+    def testToBool(self):
+        self.assertTrue(ParquetTableWriter.toBool(True))
+        self.assertFalse(ParquetTableWriter.toBool(False))
+        self.assertTrue(ParquetTableWriter.toBool(1))
+        self.assertTrue(ParquetTableWriter.toBool('2'))
+        self.assertFalse(ParquetTableWriter.toBool('0'))
+        for val in [None, 'null', 'true']:
+            self.assertIsNone(ParquetTableWriter.toBool(val))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+# Copyright (c) 2014, Stanford University
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+'''
+Created on Oct 18, 2026
+'''
+import json
+import os
+import tempfile
+import unittest
+
+from json_to_relation.transformStats import TransformStats
+
+TEST_ALL = True
+
+class TestTransformStats(unittest.TestCase):
+
+    @unittest.skipIf(not TEST_ALL, "Temporarily disabled")
+    def testCounting(self):
+        stats = TransformStats()
+        stats.recordEvent('play_video', 0.5)
+        stats.recordEvent('play_video', 0.25)
+        stats.recordEvent(None, 1.0)
+        stats.recordRow('EdxTrackEvent')
+        stats.recordRow('EdxTrackEvent')
+        stats.recordRow('Answer')
+        stats.recordBadJSONRescue()
+
+        self.assertEqual(2, stats.eventTypeCounts['play_video'])
+        self.assertAlmostEqual(0.75, stats.eventTypeTimes['play_video'])
+        self.assertEqual(1, stats.eventTypeCounts[TransformStats.UNKNOWN_EVENT_TYPE])
+        self.assertEqual({'EdxTrackEvent' : 2, 'Answer' : 1}, stats.tableRowCounts)
+        self.assertEqual(1, stats.badJSONRescues)
+
+        summary = stats.summary()
+        # Most expensive event type comes first:
+        self.assertTrue(summary.find(TransformStats.UNKNOWN_EVENT_TYPE) < summary.find('play_video'))
+        self.assertTrue(summary.endswith('Bad JSON rescues: 1'))
+
+    @unittest.skipIf(not TEST_ALL, "Temporarily disabled")
+    def testMergeAndJSON(self):
+        stats = TransformStats()
+        stats.recordEvent('book', 1.0)
+        stats.recordRow('EdxTrackEvent')
+
+        workerStats = TransformStats()
+        workerStats.recordEvent('book', 2.0)
+        workerStats.recordEvent('seq_goto', 1.0)
+        workerStats.recordRow('EdxTrackEvent')
+        workerStats.recordBadJSONRescue()
+        workerStats.recordCacheUse('ipCountry', 9, 1)
+        stats.recordCacheUse('ipCountry', 1, 1)
+
+        # Merge the dict form, as it arrives from worker processes:
+        stats.merge(workerStats.asDict())
+        self.assertEqual(2, stats.eventTypeCounts['book'])
+        self.assertAlmostEqual(3.0, stats.eventTypeTimes['book'])
+        self.assertEqual(1, stats.eventTypeCounts['seq_goto'])
+        self.assertEqual(2, stats.tableRowCounts['EdxTrackEvent'])
+        self.assertEqual(1, stats.badJSONRescues)
+        self.assertEqual([10, 2], stats.cacheCounts['ipCountry'])
+        self.assertTrue(stats.summary().endswith('ipCountry cache: 10 hits, 2 misses (83.3% hits)'))
+
+        (fd, statsFileName) = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+        try:
+            stats.writeJSON(statsFileName)
+            with open(statsFileName, 'r') as fd:
+                self.assertEqual(stats.asDict(), json.load(fd))
+        finally:
+            os.remove(statsFileName)
+
+if __name__ == "__main__":
+    unittest.main()
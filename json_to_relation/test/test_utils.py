@@ -13,10 +13,33 @@ Created on Sep 22, 2013
 
 @author: paepcke
 '''
+import random
+import timeit
 import unittest
 
+from unidecode import unidecode
+
 from json_to_relation.generic_json_parser import GenericJSONParser, Stack
 from json_to_relation.mysqldb import MySQLDB
+from json_to_relation.utils import Utils
+
+# Timing comparisons depend on the machine's load,
+# so they only run on request:
+RUN_BENCHMARKS = False
+
+
+def charByCharInsertSafe(unsafeStr):
+    '''
+    The makeInsertSafe() implementation that Utils.makeInsertSafe()
+    replaced. Reference for output equivalence and speed.
+    '''
+    if unsafeStr is None or not isinstance(unsafeStr, basestring) or len(unsafeStr) == 0:
+        return ''
+    for oneChar in unsafeStr:
+        if ord(oneChar) > 128:
+            unsafeStr = unidecode(unicode(unsafeStr))
+            break
+    return unsafeStr.replace('\n', "; ").replace('\r', "; ").replace('\\', '').replace("'", r"\'")
 
 
 class Test(unittest.TestCase):
@@ -61,6 +84,47 @@ class Test(unittest.TestCase):
         self.assertEqual('10,11.23,"My Poem"', mysqlDb.ensureSQLTyping((10, 11.23, 'My Poem')))
         self.assertEqual('10', mysqlDb.ensureSQLTyping((10,)))
         self.assertEqual('"foo"', mysqlDb.ensureSQLTyping(('foo',)))
+
+    def testMakeInsertSafe(self):
+        samples = [None, '', 10, ['a'], 'x', u'x', chr(128), u'\x80',
+                   "it's a \\path\\ with\r\nlines\n",
+                   u'Caf\xe9 \u4e2d\u6587 isn\'t \\ascii\n',
+                   'Mozilla/5.0 (Windows NT 6.1; WOW64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/28.0.1500.72 Safari/537.36'
+                   ]
+        randGen = random.Random(4711)
+        alphabet = u"ab \n\r\\'\x7f\x80\x81\xe9\u4e2d"
+        for _ in range(500):
+            randStr = u''.join([randGen.choice(alphabet) for _ in range(randGen.randint(0, 20))])
+            samples.append(randStr)
+            if all([ord(oneChar) <= 128 for oneChar in randStr]):
+                samples.append(str(''.join([chr(ord(oneChar)) for oneChar in randStr])))
+        for sample in samples:
+            expected = charByCharInsertSafe(sample)
+            result = Utils.makeInsertSafe(sample)
+            self.assertEqual(expected, result)
+            self.assertEqual(type(expected), type(result))
+        # Non-ASCII byte strings fail the same way as before:
+        self.assertRaises(UnicodeDecodeError, charByCharInsertSafe, 'caf\xc3\xa9')
+        self.assertRaises(UnicodeDecodeError, Utils.makeInsertSafe, 'caf\xc3\xa9')
+
+    @unittest.skipIf(not RUN_BENCHMARKS, "Benchmark; set RUN_BENCHMARKS to run")
+    def testMakeInsertSafeSpeed(self):
+        # Mix of typical field values: user agents, pages,
+        # session ids, and answers with quotes and newlines:
+        fieldValues = ['Mozilla/5.0 (Macintosh; Intel Mac OS X 10_8_4) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/28.0.1500.71 Safari/537.36',
+                       'https://class.stanford.edu/courses/Medicine/HRP258/Statistics_in_Medicine/courseware/495757ee7b25401599b1ef0495b068e4/6fd116e15ab9436fa70b8c22474b3c17/',
+                       '75a8c9042ba10156301728f61e487414',
+                       "I'd say the median,\nsince it's robust",
+                       u'choice_2'
+                       ]
+        def runAll(insertSafeFunc):
+            for fieldValue in fieldValues:
+                insertSafeFunc(fieldValue)
+        oldTime = min(timeit.repeat(lambda: runAll(charByCharInsertSafe), number=2000, repeat=3))
+        newTime = min(timeit.repeat(lambda: runAll(Utils.makeInsertSafe), number=2000, repeat=3))
+        self.assertLess(newTime, oldTime,
+                        'makeInsertSafe: char by char %.2fus; current %.2fus per field (%.1fx)' % \
+                        (oldTime * 1000000 / (2000 * len(fieldValues)), newTime * 1000000 / (2000 * len(fieldValues)), oldTime / newTime))
         
         
 if __name__ == "__main__":
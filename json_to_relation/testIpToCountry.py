@@ -13,6 +13,9 @@ Created on Feb 12, 2014
 
 @author: paepcke
 '''
+import os
+import shutil
+import tempfile
 import unittest
 
 from ipToCountry import IpCountryDict
@@ -58,7 +61,129 @@ class IpToCountryTester(unittest.TestCase):
         twoLetThreeLetCountryTuple = lookup.lookupIP('203.38.148.185')
         self.assertTupleEqual(twoLetThreeLetCountryTuple, ('AU','AUS','Australia'))
         
+class IpToCountryIndexTester(unittest.TestCase):
+    '''
+    Tests the range index on a small table, so that
+    the full software77 table is not required.
+    '''
+    
+    TABLE = '''# Comment line
+"16777216","16777471","apnic","1313020800","AU","AUS","Australia"
+"16777472","16778239","apnic","1313020800","CN","CHN","China"
+"2885681152","2885746687","arin","1050451200","US","USA","United States"
+"84934656","85065727","ripencc","1209945600","IT","ITA","Italy"
+"16779264","16781311","apnic","1313020800","CN","CHN","China"
+'''
+    
+    def setUp(self):
+        super(IpToCountryIndexTester, self).setUp()
+        self.tmpDir = tempfile.mkdtemp()
+        self.tablePath = os.path.join(self.tmpDir, 'ipTable.csv')
+        with open(self.tablePath, 'w') as fd:
+            fd.write(IpToCountryIndexTester.TABLE)
+        
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+        super(IpToCountryIndexTester, self).tearDown()
+        
+    def checkLookups(self, lookup):
+        self.assertTupleEqual(lookup.lookupIP('1.0.0.0'), ('AU','AUS','Australia'))
+        self.assertTupleEqual(lookup.lookupIP('1.0.0.255'), ('AU','AUS','Australia'))
+        self.assertTupleEqual(lookup.lookupIP('1.0.1.0'), ('CN','CHN','China'))
+        self.assertTupleEqual(lookup.lookupIP('1.0.8.7'), ('CN','CHN','China'))
+        self.assertTupleEqual(lookup.lookupIP('5.16.3.4'), ('IT','ITA','Italy'))
+        self.assertTupleEqual(lookup.lookupIP('172.0.2.1'), ('US','USA','United States'))
+        # Holes between, before, and after ranges:
+        self.assertTupleEqual(lookup.lookupIP('1.0.4.0'), ('ZZ','ZZZ','unknown'))
+        self.assertTupleEqual(lookup.lookupIP('0.0.0.1'), ('ZZ','ZZZ','unknown'))
+        self.assertTupleEqual(lookup.lookupIP('255.255.255.255'), ('ZZ','ZZZ','unknown'))
+        self.assertTupleEqual(lookup.getBy3LetterCode('ITA'), ('IT','ITA','Italy'))
+        self.assertRaises(ValueError, lookup.lookupIP, 'not an ip')
+        # Same country appears only once in the country table:
+        self.assertEqual(len(lookup.countries), 4)
+        
+    def testLookup(self):
+        self.checkLookups(IpCountryDict(self.tablePath))
+        
+    def testSaveAndLoadIndex(self):
+        indexPath = os.path.join(self.tmpDir, 'ipTable.idx')
+        IpCountryDict(self.tablePath, indexPath=indexPath)
+        self.assertTrue(os.path.exists(indexPath))
+        # Loading from the index must not need the CSV file:
+        os.remove(self.tablePath)
+        self.checkLookups(IpCountryDict(self.tablePath, indexPath=indexPath))
+        
+    def testAutomaticIndex(self):
+        indexPath = os.path.join(self.tmpDir, 'ipTable.idx')
+        self.checkLookups(IpCountryDict(self.tablePath))
+        self.assertTrue(IpCountryDict.indexIsCurrent(indexPath, self.tablePath))
+        # Changing the table must cause a rebuild:
+        with open(self.tablePath, 'a') as fd:
+            fd.write('"3232235520","3232301055","iana","0","ZZ","ZZZ","Private"\n')
+        self.assertFalse(IpCountryDict.indexIsCurrent(indexPath, self.tablePath))
+        lookup = IpCountryDict(self.tablePath)
+        self.assertTupleEqual(lookup.lookupIP('192.168.1.1'), ('ZZ','ZZZ','Private'))
+        self.assertTrue(IpCountryDict.indexIsCurrent(indexPath, self.tablePath))
+        # Index files of other format versions are not used:
+        with open(indexPath, 'r+b') as fd:
+            fd.seek(len(IpCountryDict.INDEX_MAGIC))
+            fd.write('\xff\xff')
+        self.assertFalse(IpCountryDict.indexIsCurrent(indexPath, self.tablePath))
+        self.assertRaises(ValueError, lookup.loadIndex, indexPath)
         
+    def testCompileIndex(self):
+        indexPath = IpCountryDict.compileIndex(self.tablePath)
+        self.assertEqual(os.path.join(self.tmpDir, 'ipTable.idx'), indexPath)
+        self.assertTrue(IpCountryDict.indexIsCurrent(indexPath, self.tablePath))
+        os.remove(self.tablePath)
+        self.checkLookups(IpCountryDict(self.tablePath))
+        
+    def testLookupCache(self):
+        lookup = IpCountryDict(self.tablePath, cacheSize=2)
+        self.checkLookups(lookup)
+        lookup.lookupCache.takeCounts()
+        lookup.lookupIP('1.0.8.7')
+        self.assertTupleEqual(lookup.get('1.0.8.7'), ('CN','CHN','China'))
+        self.assertEqual((1, 1), lookup.lookupCache.takeCounts())
+        self.assertIsNone(IpCountryDict(self.tablePath, cacheSize=0).lookupCache)
+
+class IpToCountryMMDBTester(unittest.TestCase):
+    '''
+    Tests lookups in the bundled GeoLite2 database.
+    '''
+    
+    lookup = None
+    
+    @classmethod
+    def setUpClass(cls):
+        IpToCountryMMDBTester.lookup = IpCountryDict(backend=IpCountryDict.MMDB_BACKEND)
+        
+    def testIPv4(self):
+        lookup = IpToCountryMMDBTester.lookup
+        self.assertTupleEqual(lookup.lookupIP('171.64.75.96'), ('US','USA','United States'))
+        self.assertTupleEqual(lookup.lookupIP('5.96.4.5'), ('IT','ITA','Italy'))
+        self.assertTupleEqual(lookup.lookupIP('91.96.4.5'), ('DE','DEU','Germany'))
+        self.assertTupleEqual(lookup.lookupIP('39.63.53.92'), ('PK','PAK','Pakistan'))
+        self.assertTupleEqual(lookup.lookupIP('121.247.4.157'), ('IN','IND','India'))
+        self.assertTupleEqual(lookup.lookupIP('203.38.148.185'), ('AU','AUS','Australia'))
+        # Private network:
+        self.assertTupleEqual(lookup.lookupIP('10.0.0.1'), ('ZZ','ZZZ','unknown'))
+        self.assertTupleEqual(lookup.getBy3LetterCode('ITA'), ('IT','ITA','Italy'))
+        
+    def testIPv6(self):
+        lookup = IpToCountryMMDBTester.lookup
+        self.assertTupleEqual(lookup.lookupIP('2001:4860:4860::8888'), ('US','USA','United States'))
+        self.assertTupleEqual(lookup.lookupIP('2a00:1450:4001:80b::200e'), ('IE','IRL','Ireland'))
+        # IPv4-compatible addresses land in the IPv4 part of the tree:
+        self.assertTupleEqual(lookup.lookupIP('::5.96.4.5'), ('IT','ITA','Italy'))
+        
+    def testBadIP(self):
+        lookup = IpToCountryMMDBTester.lookup
+        self.assertRaises(ValueError, lookup.lookupIP, 'not an ip')
+        self.assertRaises(ValueError, lookup.lookupIP, '1.2.3.4.5')
+        self.assertRaises(ValueError, lookup.lookupIP, None)
+        self.assertRaises(ValueError, IpCountryDict, backend='bogus')
+
 
 if __name__ == "__main__":
     #import sys;sys.argv = ['', 'Test.testName']
@@ -0,0 +1,163 @@
+# Copyright (c) 2014, Stanford University
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+'''
+Created on Oct 18, 2026
+
+Bookkeeping for optional profiling of track log transforms:
+how many events of each event_type were processed, and how
+much wall clock time they took, how many rows went to each
+table, how often badly formed JSON had to be rescued, and
+how well the lookup caches did.
+'''
+
+import json
+
+class TransformStats(object):
+    '''
+    Counters kept by EdXTrackLogJSONParser when it is
+    created with collectStats=True. Instances from different
+    worker processes can be combined via merge().
+    '''
+
+    # Key under which events are counted whose
+    # event_type could not be determined:
+    UNKNOWN_EVENT_TYPE = '<undetermined>'
+
+    def __init__(self):
+        # event_type --> number of events:
+        self.eventTypeCounts = {}
+        # event_type --> total seconds spent on those events:
+        self.eventTypeTimes = {}
+        # table name --> number of rows pushed:
+        self.tableRowCounts = {}
+        self.badJSONRescues = 0
+        # cache name --> [hits, misses]:
+        self.cacheCounts = {}
+
+    def recordEvent(self, eventType, elapsedSecs):
+        '''
+        Account for one processed track log event.
+
+        :param eventType: the event's event_type; None if it could not be determined
+        :type eventType: {String | None}
+        :param elapsedSecs: wall clock time spent on the event
+        :type elapsedSecs: float
+        '''
+        if eventType is None:
+            eventType = TransformStats.UNKNOWN_EVENT_TYPE
+        try:
+            self.eventTypeCounts[eventType] += 1
+            self.eventTypeTimes[eventType] += elapsedSecs
+        except KeyError:
+            self.eventTypeCounts[eventType] = 1
+            self.eventTypeTimes[eventType] = elapsedSecs
+
+    def recordRow(self, tableName, numRows=1):
+        try:
+            self.tableRowCounts[tableName] += numRows
+        except KeyError:
+            self.tableRowCounts[tableName] = numRows
+
+    def recordBadJSONRescue(self):
+        self.badJSONRescues += 1
+
+    def recordCacheUse(self, cacheName, hits, misses):
+        '''
+        Add hits and misses of one lookup cache.
+
+        :param cacheName: name under which the cache is reported
+        :type cacheName: String
+        :param hits: number of lookups answered from the cache
+        :type hits: int
+        :param misses: number of lookups not answered from the cache
+        :type misses: int
+        '''
+        try:
+            counts = self.cacheCounts[cacheName]
+            counts[0] += hits
+            counts[1] += misses
+        except KeyError:
+            self.cacheCounts[cacheName] = [hits, misses]
+
+    def merge(self, otherStats):
+        '''
+        Add the counts of another TransformStats instance, or of
+        the dict returned by another instance's asDict(), to this one.
+
+        :param otherStats: statistics to add to this instance's
+        :type otherStats: {TransformStats | dict}
+        '''
+        if isinstance(otherStats, TransformStats):
+            otherStats = otherStats.asDict()
+        for (eventType, eventInfo) in otherStats['eventTypes'].items():
+            self.eventTypeCounts[eventType] = self.eventTypeCounts.get(eventType, 0) + eventInfo['count']
+            self.eventTypeTimes[eventType] = self.eventTypeTimes.get(eventType, 0.0) + eventInfo['secs']
+        for (tableName, numRows) in otherStats['tableRows'].items():
+            self.tableRowCounts[tableName] = self.tableRowCounts.get(tableName, 0) + numRows
+        self.badJSONRescues += otherStats['badJSONRescues']
+        for (cacheName, cacheInfo) in otherStats.get('caches', {}).items():
+            self.recordCacheUse(cacheName, cacheInfo['hits'], cacheInfo['misses'])
+
+    def asDict(self):
+        '''
+        Return the statistics as a dict of plain Python
+        types, suitable for pickling or JSON encoding.
+
+        :return: dict with keys 'eventTypes', 'tableRows', 'badJSONRescues', and 'caches'
+        :rtype: dict
+        '''
+        eventTypes = {}
+        for (eventType, count) in self.eventTypeCounts.items():
+            eventTypes[eventType] = {'count' : count, 'secs' : self.eventTypeTimes[eventType]}
+        caches = {}
+        for (cacheName, (hits, misses)) in self.cacheCounts.items():
+            caches[cacheName] = {'hits' : hits, 'misses' : misses}
+        return {'eventTypes' : eventTypes,
+                'tableRows' : dict(self.tableRowCounts),
+                'badJSONRescues' : self.badJSONRescues,
+                'caches' : caches
+                }
+
+    def summary(self):
+        '''
+        Return a human readable, multi-line report, with
+        the most time consuming event types first.
+
+        :return: report text
+        :rtype: String
+        '''
+        lines = ['Transform statistics:',
+                 '  %-50s %10s %10s %10s' % ('event_type', 'count', 'secs', 'ms/event')]
+        eventTypes = sorted(self.eventTypeCounts.keys(), key=lambda eventType: self.eventTypeTimes[eventType], reverse=True)
+        for eventType in eventTypes:
+            count = self.eventTypeCounts[eventType]
+            secs = self.eventTypeTimes[eventType]
+            lines.append('  %-50s %10d %10.3f %10.3f' % (eventType, count, secs, 1000 * secs / count))
+        lines.append('  %-50s %10s' % ('table', 'rows'))
+        for tableName in sorted(self.tableRowCounts.keys()):
+            lines.append('  %-50s %10d' % (tableName, self.tableRowCounts[tableName]))
+        lines.append('  Bad JSON rescues: %d' % self.badJSONRescues)
+        for cacheName in sorted(self.cacheCounts.keys()):
+            (hits, misses) = self.cacheCounts[cacheName]
+            lookups = hits + misses
+            lines.append('  %s cache: %d hits, %d misses (%.1f%% hits)' %\
+                         (cacheName, hits, misses, 100.0 * hits / lookups if lookups > 0 else 0.0))
+        return '\n'.join(lines)
+
+    def writeJSON(self, filePath):
+        '''
+        Write the statistics to the given file as JSON.
+
+        :param filePath: file to create or overwrite
+        :type filePath: String
+        '''
+        with open(filePath, 'w') as fd:
+            json.dump(self.asDict(), fd, indent=2, sort_keys=True)
@@ -0,0 +1,138 @@
+# Copyright (c) 2014, Stanford University
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+'''
+Created on Oct 18, 2026
+
+Generators for the unique keys that the transform places into
+every _id, event_id, and foreign key column. All strategies
+produce strings shaped like a uuid with underscores instead of
+dashes: 8_4_4_4_12 lower case hex digits, 36 chars. That shape
+fits the VARCHAR(40) UUID columns, and is what the tests mask
+out when comparing output against expected files.
+'''
+
+import binascii
+import os
+import uuid
+
+class UniqueIDGenerator(object):
+    '''
+    Hands out unique keys via nextID(). Strategies:
+
+       - COUNTER_IDS: a random 80-bit prefix drawn once per process,
+         followed by a 48-bit counter. Costs one string format per key.
+       - BATCHED_UUID4_IDS: random (version 4) uuids, generated from
+         one large os.urandom() read per UUID4_BATCH_SIZE keys.
+       - UUID4_IDS: one uuid.uuid4() call per key. This is what the
+         transform used originally.
+
+    Processes forked from a process that already owns a generator
+    must call reseed() before generating keys; else parent and child
+    hand out the same counter/random sequence.
+    '''
+
+    COUNTER_IDS       = 'counter'
+    BATCHED_UUID4_IDS = 'batchedUuid4'
+    UUID4_IDS         = 'uuid4'
+
+    # Number of uuids created from each os.urandom() call
+    # of the BATCHED_UUID4_IDS strategy:
+    UUID4_BATCH_SIZE = 1024
+
+    # Counter values that fit into the 12 hex digits
+    # at the end of COUNTER_IDS keys:
+    MAX_COUNTER = 16**12 - 1
+
+    # Hex digit at position 16 of a version 4 uuid holds the
+    # variant in its top two bits (binary 10xx):
+    UUID4_VARIANT_DIGIT = dict([('%x' % nibble, '%x' % (0x8 | (nibble & 0x3))) for nibble in range(16)])
+
+    def __init__(self, strategy=COUNTER_IDS):
+        '''
+        :param strategy: how keys are generated: one of COUNTER_IDS, BATCHED_UUID4_IDS, or UUID4_IDS
+        :type strategy: String
+        '''
+        if strategy == UniqueIDGenerator.COUNTER_IDS:
+            self.nextID = self.nextCounterID
+        elif strategy == UniqueIDGenerator.BATCHED_UUID4_IDS:
+            self.nextID = self.nextBatchedUUID4
+        elif strategy == UniqueIDGenerator.UUID4_IDS:
+            self.nextID = self.nextUUID4
+        else:
+            raise ValueError("Unknown unique ID strategy: '%s'" % str(strategy))
+        self.strategy = strategy
+        self.reseed()
+
+    def reseed(self):
+        '''
+        Draw a new random prefix, restart the counter, and discard
+        pre-generated random uuids. Called by the constructor, and
+        must be called in forked child processes.
+        '''
+        prefix = binascii.hexlify(os.urandom(10))
+        self.counterPrefix = '%s_%s_%s_%s_' % (prefix[0:8], prefix[8:12], prefix[12:16], prefix[16:20])
+        self.counter = 0
+        self.uuid4Batch = []
+
+    def nextCounterID(self):
+        '''
+        Return the counter prefix followed by the next counter value.
+
+        :return: unique key
+        :rtype: String
+        '''
+        self.counter += 1
+        if self.counter > UniqueIDGenerator.MAX_COUNTER:
+            self.reseed()
+            self.counter = 1
+        return '%s%012x' % (self.counterPrefix, self.counter)
+
+    def nextBatchedUUID4(self):
+        '''
+        Return a random version 4 uuid, refilling the batch
+        of pre-generated uuids from os.urandom() when it runs out.
+
+        :return: unique key
+        :rtype: String
+        '''
+        try:
+            return self.uuid4Batch.pop()
+        except IndexError:
+            self.uuid4Batch = self.makeUUID4Batch(UniqueIDGenerator.UUID4_BATCH_SIZE)
+            return self.uuid4Batch.pop()
+
+    def makeUUID4Batch(self, batchSize):
+        '''
+        Create batchSize random version 4 uuids from a single
+        os.urandom() read.
+
+        :param batchSize: number of uuids to create
+        :type batchSize: int
+        :return: list of keys
+        :rtype: [String]
+        '''
+        hexDigits = binascii.hexlify(os.urandom(16 * batchSize))
+        variantDigit = UniqueIDGenerator.UUID4_VARIANT_DIGIT
+        batch = []
+        for start in xrange(0, 32 * batchSize, 32):
+            h = hexDigits[start:start+32]
+            batch.append('%s_%s_4%s_%s%s_%s' % (h[0:8], h[8:12], h[13:16], variantDigit[h[16]], h[17:20], h[20:32]))
+        return batch
+
+    def nextUUID4(self):
+        '''
+        Return a uuid.uuid4() with its dashes replaced by underscores.
+
+        :return: unique key
+        :rtype: String
+        '''
+        return str(uuid.uuid4()).replace('-','_')
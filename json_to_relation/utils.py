@@ -37,6 +37,14 @@ class Utils(object):
     # or:
     #   input_i4x-Medicine-HRP258-problem-98ca37dbf24849debcc29eb36811cb68_3_1_choice_3'
     findHashPattern = re.compile(r'([a-f0-9]{32})')
+
+    # Chars that makeInsertSafe() leaves to unidecode(), i.e. those
+    # beyond chr(128), and the complement: chars passed through as is:
+    NON_ASCII_PATTERN = re.compile(u'[^\x00-\x80]')
+    ASCII_CHARS = ''.join([chr(charCode) for charCode in range(129)])
+
+    # Chars that makeInsertSafe() replaces or escapes:
+    INSERT_UNSAFE_CHARS_PATTERN = re.compile(r"[\n\r\\']")
     
     # Facility for mapping resource names like sequenc_id into 
     # human-readable strings:
@@ -55,6 +63,10 @@ class Utils(object):
         replaced by double backslash. This is needed for unicode, like
         \0245 (invented example)
 
+        Called for most string values of every event, so each step
+        is done by C-level string methods; the common case of a plain
+        ASCII string without special chars passes through untouched.
+
         :param unsafeStr: string that possibly contains unsafe chars
         :type unsafeStr: String
         :return: same string, with unsafe chars properly replaced or escaped
@@ -62,16 +74,25 @@ class Utils(object):
         :rtype: String
         '''
         #return unsafeStr.replace("'", "\\'").replace('\n', "; ").replace('\r', "; ").replace(',', "\\,").replace('\\', '\\\\')
-        if unsafeStr is None or not isinstance(unsafeStr, basestring) or len(unsafeStr) == 0:
+        if not unsafeStr or not isinstance(unsafeStr, basestring):
             return ''
         # Check for chars > 128 (illegal for standard ASCII):
-        for oneChar in unsafeStr:
-            if ord(oneChar) > 128:
-                # unidecode() replaces unicode with approximations. 
-                # I tried all sorts of escapes, and nothing worked
-                # for all cases, except this:
-                unsafeStr = unidecode(unicode(unsafeStr))
-                break
+        if isinstance(unsafeStr, str):
+            hasNonAscii = len(unsafeStr.translate(None, Utils.ASCII_CHARS)) > 0
+        else:
+            try:
+                unsafeStr.encode('ascii')
+                hasNonAscii = False
+            except UnicodeEncodeError:
+                # Could still be just chr(128):
+                hasNonAscii = Utils.NON_ASCII_PATTERN.search(unsafeStr) is not None
+        if hasNonAscii:
+            # unidecode() replaces unicode with approximations. 
+            # I tried all sorts of escapes, and nothing worked
+            # for all cases, except this:
+            unsafeStr = unidecode(unicode(unsafeStr))
+        if Utils.INSERT_UNSAFE_CHARS_PATTERN.search(unsafeStr) is None:
+            return unsafeStr
         return unsafeStr.replace('\n', "; ").replace('\r', "; ").replace('\\', '').replace("'", r"\'")
     
     
@@ -32,12 +32,13 @@ source_dir = [os.path.join(os.path.dirname(os.path.abspath(__file__)), "../json_
 source_dir.extend(sys.path)
 sys.path = source_dir
 
+from anonHashCache import AnonHashCache
 from edxTrackLogJSONParser import EdXTrackLogJSONParser
 from mysqldb import MySQLDB
 
 class AnonAdder(object):
     
-    def __init__(self, logFile, uid, pwd, tsvFileName, screenNamePos):
+    def __init__(self, logFile, uid, pwd, tsvFileName, screenNamePos, hashStore=None, prewarm=False):
         '''
         Make connection to MySQL wrapper.
         @param logFile: file where log entries will be appended.
@@ -54,6 +55,14 @@ class AnonAdder(object):
         @param screenNamePos: Zero-origin position of the screen name column
                in the TSV file from certificates_generatedcertificate
         @type screenNamePos: int
+        @param hashStore: dbm file in which screen name hashes are kept
+               across runs, so that names seen before need not be hashed
+               again. None: hashes are only memoized for this run.
+        @type hashStore: {String | None}
+        @param prewarm: if True, and hashStore is provided, first copy the
+               screen_name/anon_screen_name pairs of the current
+               EdxPrivate.UserGrade table into hashStore.
+        @type prewarm: Bool
         '''
         self.uid = uid
         self.pwd = pwd
@@ -65,6 +74,11 @@ class AnonAdder(object):
             self.mysqldb = MySQLDB(user=uid, db='EdxPrivate')
         else:
             self.mysqldb = MySQLDB(user=uid, passwd=pwd, db='EdxPrivate')
+
+        if hashStore is not None:
+            EdXTrackLogJSONParser.anonHashCache = AnonHashCache(storePath=hashStore)
+            if prewarm:
+                EdXTrackLogJSONParser.anonHashCache.prewarmFromUserGrade(self.mysqldb)
         
         
     def computeAndAdd(self):
@@ -112,6 +126,7 @@ class AnonAdder(object):
             # Write the new TSV back into the file:
             with open(self.tsvFileName, 'w') as tsvFd:
                 tsvFd.writelines(allRows)
+            EdXTrackLogJSONParser.anonHashCache.close()
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(prog=os.path.basename(sys.argv[0]), formatter_class=argparse.RawTextHelpFormatter)
@@ -132,6 +147,15 @@ if __name__ == '__main__':
                         default='/tmp/addAnonToUserGradeTable.log',
                         help='File path to file where log entries are appended. Default: /tmp/addAnonToUserGradeTable.log.'
                         )
+    parser.add_argument('-c', '--hashStore',
+                        dest='hashStore',
+                        help='dbm file in which screen name hashes are kept across runs. Created if absent. Default: no persistent store.'
+                        )
+    parser.add_argument('--prewarm',
+                        action='store_true',
+                        help='before hashing, copy the screen_name/anon_screen_name pairs of the current EdxPrivate.UserGrade\n' +\
+                             '    table into the --hashStore file. Ignored without --hashStore.'
+                        )
     parser.add_argument('tsvFileName',
                         help='File containing the TSV of the certificates_generatedcertificate table obtained from edxprod'
                         )  
@@ -192,6 +216,6 @@ if __name__ == '__main__':
     #sys.exit()
     #************
                     
-    anonAdder = AnonAdder(logFile, user, pwd, tsvFileName, screenNameColPos)
+    anonAdder = AnonAdder(logFile, user, pwd, tsvFileName, screenNameColPos, hashStore=args.hashStore, prewarm=args.prewarm)
     anonAdder.computeAndAdd()
     
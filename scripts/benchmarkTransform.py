@@ -0,0 +1,423 @@
+#!/usr/bin/env python
+# Copyright (c) 2014, Stanford University
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+'''
+Created on Oct 18, 2026
+
+Benchmark for the tracking log transform that json2sql.py runs.
+
+Generates a synthetic tracking log from the sample events in
+json_to_relation/test/data/*.json (or takes a real log via --inFile),
+and runs JSONToRelation with EdXTrackLogJSONParser over it in each of the
+csv, sql_dump, and sql_dump_and_csv output modes. Each mode runs in a
+fresh process, so that peak memory is measured per mode. Reports lines/sec,
+MB/sec, peak RSS, time spent in parser setup vs. conversion, and the most
+expensive event types. With --jsonBackend, each mode is run once per
+JSON decoder, and the time to just decode the input lines is reported
+for each decoder as well.
+
+Results are appended as JSON lines to a results file, so that runs
+can be compared across versions with --compare.
+
+Example::
+
+    benchmarkTransform.py --numLines 200000 --label before_fix --compare
+'''
+
+import argparse
+import datetime
+import glob
+import json
+import multiprocessing
+import os
+import random
+import re
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+# Add json_to_relation source dir to $PATH
+# for duration of this execution:
+source_dir = [os.path.join(os.path.dirname(os.path.abspath(__file__)), "../json_to_relation/")]
+source_dir.extend(sys.path)
+sys.path = source_dir
+
+from edxTrackLogJSONParser import EdXTrackLogJSONParser
+from input_source import InURI
+from jsonDecoder import JSONDecoder
+from json_to_relation import JSONToRelation
+from output_disposition import OutputDisposition, OutputFile
+
+
+PROJECT_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+SAMPLE_EVENT_DIR = os.path.join(PROJECT_ROOT, 'json_to_relation/test/data')
+
+DEFAULT_RESULTS_FILE = os.path.expanduser('~/json2sqlBenchmarks.jsonl')
+
+OUTPUT_FORMATS = {'csv' : OutputDisposition.OutputFormat.CSV,
+                  'sql_dump' : OutputDisposition.OutputFormat.SQL_INSERT_STATEMENTS,
+                  'sql_dump_and_csv' : OutputDisposition.OutputFormat.SQL_INSERTS_AND_CSV
+                  }
+
+# Rough share of event types in our daily tracking logs. Sample
+# events whose event_type is not listed get weight 1. Path styled
+# event types (/courses/..., etc.) are lumped together under '/':
+EVENT_TYPE_MIX = {'/'                 : 300,
+                  'play_video'        : 120,
+                  'pause_video'       : 100,
+                  'load_video'        : 80,
+                  'seq_goto'          : 60,
+                  'seq_next'          : 60,
+                  'problem_check'     : 60,
+                  'page_close'        : 50,
+                  'seek_video'        : 40,
+                  'problem_graded'    : 30,
+                  'speed_change_video': 20,
+                  'show_transcript'   : 15,
+                  'hide_transcript'   : 15,
+                  'problem_show'      : 15,
+                  'problem_save'      : 10,
+                  'showanswer'        : 10,
+                  'book'              : 10,
+                  '/heartbeat'        : 10,
+                  '/accounts/login'   : 10,
+                  'problem_reset'     : 5,
+                  'problem_check_fail': 5,
+                  'edx.forum.searched': 5,
+                  }
+
+def getEventType(eventDict):
+    '''
+    Return the event_type of a parsed tracking log event,
+    using the 'name' field of the event for new-style events.
+    '''
+    eventType = eventDict.get('event_type', None)
+    if eventType is None:
+        event = eventDict.get('event', None)
+        if isinstance(event, dict):
+            eventType = event.get('name', None)
+    return eventType
+
+def loadSampleEvents(sampleDir=SAMPLE_EVENT_DIR):
+    '''
+    Collect all well formed tracking log events from the
+    unit test data files, grouped by event type.
+
+    :return: dict mapping event type to list of parsed events
+    :rtype: {String : [dict]}
+    '''
+    samples = {}
+    for fileName in sorted(glob.glob(os.path.join(sampleDir, '*.json'))):
+        with open(fileName, 'r') as fd:
+            for line in fd:
+                try:
+                    eventDict = json.loads(line)
+                except ValueError:
+                    continue
+                if not isinstance(eventDict, dict):
+                    continue
+                eventType = getEventType(eventDict)
+                if not isinstance(eventType, basestring) or len(eventType) == 0:
+                    continue
+                if eventType[0] == '/' and eventType not in EVENT_TYPE_MIX:
+                    eventType = '/'
+                samples.setdefault(eventType, []).append(eventDict)
+    return samples
+
+def generateSyntheticLog(outFileName, numLines, seed):
+    '''
+    Write a tracking log of numLines events to outFileName. Events
+    are copies of the unit test sample events, drawn according to
+    EVENT_TYPE_MIX, with timestamps moving forward, and user names,
+    IP addresses, and sessions drawn from pools that are small enough
+    for users to repeat the way they do in real logs. The same seed
+    always produces the same file.
+
+    :return: number of bytes written
+    :rtype: int
+    '''
+    rand = random.Random(seed)
+    samples = loadSampleEvents()
+    if len(samples) == 0:
+        raise IOError('No sample events found in %s' % SAMPLE_EVENT_DIR)
+    eventTypes = sorted(samples.keys())
+    cumulativeWeights = []
+    totalWeight = 0
+    for eventType in eventTypes:
+        totalWeight += EVENT_TYPE_MIX.get(eventType, 1)
+        cumulativeWeights.append(totalWeight)
+
+    userPool  = ['learner%05d' % userNum for userNum in range(max(10, numLines / 200))]
+    ipPool    = ['%d.%d.%d.%d' % (rand.randint(1,223), rand.randint(0,255), rand.randint(0,255), rand.randint(1,254))
+                 for ipNum in range(max(10, numLines / 300))] #@UnusedVariable
+    eventTime = datetime.datetime(2014, 1, 6, 8, 0, 0)
+
+    with open(outFileName, 'w') as fd:
+        for lineNum in range(numLines): #@UnusedVariable
+            pick = rand.random() * totalWeight
+            typeIndex = 0
+            while cumulativeWeights[typeIndex] < pick:
+                typeIndex += 1
+            eventDict = dict(rand.choice(samples[eventTypes[typeIndex]]))
+            eventTime += datetime.timedelta(microseconds=rand.randint(1000, 2000000))
+            if 'time' in eventDict:
+                eventDict['time'] = eventTime.isoformat() + '+00:00'
+            userIndex = rand.randint(0, len(userPool) - 1)
+            if eventDict.get('username', ''):
+                eventDict['username'] = userPool[userIndex]
+            if 'ip' in eventDict:
+                eventDict['ip'] = ipPool[userIndex % len(ipPool)]
+            if eventDict.get('session', ''):
+                eventDict['session'] = '%032x' % (userIndex * 7919)
+            fd.write(json.dumps(eventDict) + '\n')
+        return fd.tell()
+
+def timeDecoding(inFileName, jsonBackend):
+    '''
+    Return the seconds needed to decode each line of the
+    given tracking log with the given JSON decoder.
+    '''
+    decoder = JSONDecoder(jsonBackend)
+    with open(inFileName, 'r') as fd:
+        lines = fd.readlines()
+    startTime = time.time()
+    for line in lines:
+        try:
+            decoder.loads(line)
+        except ValueError:
+            pass
+    return time.time() - startTime
+
+def runOneMode(inFileName, targetFormat, workers, jsonBackend, resultQueue):
+    '''
+    Run one transform. Invoked in a separate process, so that
+    peak RSS reflects only this one transform.
+    '''
+    try:
+        workDir = tempfile.mkdtemp(prefix='json2sqlBench')
+        try:
+            outFullPath = os.path.join(workDir, 'benchmark.sql')
+            logFile = os.path.join(workDir, 'benchmark.log')
+            startTime = time.time()
+            outSQLFile = OutputFile(outFullPath, OUTPUT_FORMATS[targetFormat], options='wb')
+            jsonConverter = JSONToRelation(InURI(inFileName),
+                                           outSQLFile,
+                                           mainTableName='EdxTrackEvent',
+                                           logFile=logFile
+                                           )
+            parser = EdXTrackLogJSONParser(jsonConverter,
+                                           'EdxTrackEvent',
+                                           replaceTables=True,
+                                           dbName='Edx',
+                                           useDisplayNameCache=True,
+                                           collectStats=True,
+                                           jsonBackend=jsonBackend)
+            jsonConverter.setParser(parser)
+            setupDoneTime = time.time()
+            jsonConverter.convert(workers=workers)
+            endTime = time.time()
+
+            outputBytes = 0
+            for fileName in os.listdir(workDir):
+                if fileName != 'benchmark.log':
+                    outputBytes += os.path.getsize(os.path.join(workDir, fileName))
+            statsDict = parser.stats.asDict()
+            eventTypeTimes = sorted(statsDict['eventTypes'].items(), key=lambda typeAndInfo: typeAndInfo[1]['secs'], reverse=True)
+            # ru_maxrss is in KB on Linux:
+            peakRSSKB = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+            resultQueue.put({'setupSecs' : setupDoneTime - startTime,
+                             'convertSecs' : endTime - setupDoneTime,
+                             'outputBytes' : outputBytes,
+                             'peakRSSKB' : peakRSSKB,
+                             'tableRows' : statsDict['tableRows'],
+                             'badJSONRescues' : statsDict['badJSONRescues'],
+                             'topEventTypes' : [(eventType, info['count'], info['secs']) for (eventType, info) in eventTypeTimes[:10]]
+                             })
+        finally:
+            shutil.rmtree(workDir, ignore_errors=True)
+    except Exception as e:
+        resultQueue.put({'error' : `e`})
+
+def getCodeVersion():
+    '''
+    Return the package version from setup.py, and
+    the git revision of the working tree, if available.
+    '''
+    version = None
+    try:
+        with open(os.path.join(PROJECT_ROOT, 'setup.py'), 'r') as fd:
+            versionMatch = re.search(r'version\s*=\s*"([^"]*)"', fd.read())
+            if versionMatch is not None:
+                version = versionMatch.group(1)
+    except IOError:
+        pass
+    try:
+        gitRevision = subprocess.check_output(['git', 'describe', '--always', '--dirty'],
+                                              cwd=PROJECT_ROOT,
+                                              stderr=open(os.devnull, 'w')).strip()
+    except (OSError, subprocess.CalledProcessError):
+        gitRevision = None
+    return (version, gitRevision)
+
+def loadPreviousResults(resultsFile):
+    results = []
+    if not os.path.exists(resultsFile):
+        return results
+    with open(resultsFile, 'r') as fd:
+        for line in fd:
+            try:
+                results.append(json.loads(line))
+            except ValueError:
+                pass
+    return results
+
+def printResult(result):
+    print('%-17s %-10s %10.0f lines/s %8.2f MB/s %9.1f MB RSS  setup %7.2fs  convert %8.2fs  decode only %7.2fs' %\
+          (result['mode'], result['jsonBackend'], result['linesPerSec'], result['mbPerSec'], result['peakRSSKB'] / 1024.0,
+           result['stages']['setup'], result['stages']['convert'], result['stages']['decodeOnly']))
+    for (eventType, count, secs) in result['topEventTypes'][:5]:
+        print('    %-50s %8d events %8.3fs' % (eventType, count, secs))
+
+def printComparison(result, previousResults):
+    '''
+    Print earlier runs of the same mode on the same number of input
+    lines, with their speed relative to the given result.
+    '''
+    comparable = [prevResult for prevResult in previousResults
+                  if prevResult['mode'] == result['mode'] and
+                     prevResult['numLines'] == result['numLines'] and
+                     prevResult.get('jsonBackend', JSONDecoder.STDLIB) == result['jsonBackend'] and
+                     prevResult['workers'] == result['workers']]
+    for prevResult in comparable[-5:]:
+        change = 100.0 * (result['linesPerSec'] - prevResult['linesPerSec']) / prevResult['linesPerSec']
+        print('    vs %-30s %-20s %10.0f lines/s (%+.1f%%)' %\
+              (prevResult.get('label') or '', prevResult.get('gitRevision') or '', prevResult['linesPerSec'], change))
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(prog='benchmarkTransform.py')
+    parser.add_argument('-n', '--numLines',
+                        help='number of events in the synthetic tracking log. Default: 100000',
+                        dest='numLines',
+                        type=int,
+                        default=100000)
+    parser.add_argument('--seed',
+                        help='random seed for the synthetic tracking log. Default: 4711',
+                        dest='seed',
+                        type=int,
+                        default=4711)
+    parser.add_argument('-i', '--inFile',
+                        help='benchmark with this tracking log instead of a synthetic one',
+                        dest='inFile',
+                        default=None)
+    parser.add_argument('-t', '--targetFormat',
+                        help='output mode(s) to benchmark. Default: all three',
+                        dest='targetFormats',
+                        action='append',
+                        choices = ['csv', 'sql_dump', 'sql_dump_and_csv'])
+    parser.add_argument('-w', '--workers',
+                        help='number of parsing processes; see json2sql.py. Default: 1',
+                        dest='workers',
+                        type=int,
+                        default=1)
+    parser.add_argument('-j', '--jsonBackend',
+                        help='JSON decoder(s) to benchmark; repeat the option to compare decoders. Default: json',
+                        dest='jsonBackends',
+                        action='append',
+                        choices = ['json', 'ujson'])
+    parser.add_argument('-l', '--label',
+                        help='name under which to store the results, such as a release name',
+                        dest='label',
+                        default=None)
+    parser.add_argument('-r', '--resultsFile',
+                        help='file to which results are appended as JSON lines. Default: %s' % DEFAULT_RESULTS_FILE,
+                        dest='resultsFile',
+                        default=DEFAULT_RESULTS_FILE)
+    parser.add_argument('-c', '--compare',
+                        help='compare with earlier results from the results file',
+                        dest='compare',
+                        action='store_true',
+                        default=False)
+
+    args = parser.parse_args();
+    targetFormats = args.targetFormats if args.targetFormats is not None else ['csv', 'sql_dump', 'sql_dump_and_csv']
+    jsonBackends = []
+    for jsonBackend in (args.jsonBackends or [JSONDecoder.STDLIB]):
+        if not JSONDecoder.isAvailable(jsonBackend):
+            parser.error("JSON decoder '%s' is not installed" % jsonBackend)
+        if jsonBackend not in jsonBackends:
+            jsonBackends.append(jsonBackend)
+
+    tmpLogFile = None
+    if args.inFile is None:
+        (fd, tmpLogFile) = tempfile.mkstemp(prefix='syntheticTrackingLog', suffix='.json')
+        os.close(fd)
+        print('Generating %d synthetic events...' % args.numLines)
+        inputBytes = generateSyntheticLog(tmpLogFile, args.numLines, args.seed)
+        inFileName = tmpLogFile
+        numLines = args.numLines
+    else:
+        inFileName = os.path.abspath(args.inFile)
+        inputBytes = os.path.getsize(inFileName)
+        with open(inFileName, 'r') as fd:
+            numLines = sum(1 for line in fd) #@UnusedVariable
+
+    (version, gitRevision) = getCodeVersion()
+    previousResults = loadPreviousResults(args.resultsFile) if args.compare else []
+
+    try:
+        decodeSecs = dict([(jsonBackend, timeDecoding(inFileName, jsonBackend)) for jsonBackend in jsonBackends])
+        for (targetFormat, jsonBackend) in [(targetFormat, jsonBackend) for targetFormat in targetFormats for jsonBackend in jsonBackends]:
+            resultQueue = multiprocessing.Queue()
+            benchProcess = multiprocessing.Process(target=runOneMode, args=(inFileName, targetFormat, args.workers, jsonBackend, resultQueue))
+            benchProcess.start()
+            modeResult = resultQueue.get()
+            benchProcess.join()
+            if 'error' in modeResult:
+                print('%s (%s): failed: %s' % (targetFormat, jsonBackend, modeResult['error']))
+                continue
+            result = {'timestamp' : datetime.datetime.now().isoformat(),
+                      'label' : args.label,
+                      'version' : version,
+                      'gitRevision' : gitRevision,
+                      'host' : socket.gethostname(),
+                      'python' : sys.version.split()[0],
+                      'mode' : targetFormat,
+                      'jsonBackend' : jsonBackend,
+                      'workers' : args.workers,
+                      'inFile' : args.inFile,
+                      'seed' : args.seed if args.inFile is None else None,
+                      'numLines' : numLines,
+                      'inputBytes' : inputBytes,
+                      'outputBytes' : modeResult['outputBytes'],
+                      'linesPerSec' : numLines / modeResult['convertSecs'],
+                      'mbPerSec' : inputBytes / (1024.0 * 1024.0) / modeResult['convertSecs'],
+                      'peakRSSKB' : modeResult['peakRSSKB'],
+                      'stages' : {'setup' : modeResult['setupSecs'],
+                                  'convert' : modeResult['convertSecs'],
+                                  'decodeOnly' : decodeSecs[jsonBackend]},
+                      'tableRows' : modeResult['tableRows'],
+                      'badJSONRescues' : modeResult['badJSONRescues'],
+                      'topEventTypes' : modeResult['topEventTypes']
+                      }
+            printResult(result)
+            if args.compare:
+                printComparison(result, previousResults)
+            with open(args.resultsFile, 'a') as fd:
+                fd.write(json.dumps(result) + '\n')
+    finally:
+        if tmpLogFile is not None:
+            os.remove(tmpLogFile)
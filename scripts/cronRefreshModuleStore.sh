@@ -317,10 +317,11 @@ else
     exit 1
 fi
 
-# Remove old hash lookup pickle file to force ModulestoreImporter
-# to re-build that hash:
+# Remove old hash lookup pickle and SQLite files to force
+# ModulestoreImporter to re-build that hash:
 echo `date`": Removing old ModulestoreImporter cash pickle file if exists; OK if it does not."
 rm $TARGET_DIR/hashLookup.pkl
+rm -f $TARGET_DIR/hashLookup.sqlite
 
 # ------------------ Signout -------------------
 echo `date`": Finished updating table modulestore extract."  | tee --append $LOG_FILE
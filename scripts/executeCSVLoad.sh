@@ -152,9 +152,8 @@ shift
 for file in $@
 do
     okSoFar=1
-    # Get file extension:
+    # Get file name without directory:
     filename=$(basename "$file")
-    extension="${filename##*.}"
 
     if [ ! -r $file ]
     then
@@ -164,9 +163,9 @@ do
     then
 	echo "File "$file" is a directory."
 	okSoFar=0
-    elif [ $extension != 'sql' ]
+    elif [[ $filename != *.sql && $filename != *.sql.gz && $filename != *.sql.zst && $filename != *.sql.lz4 ]]
     then
-	echo "File "$file" does not end with .sql (I know...picky, but better than crashing later)"
+	echo "File "$file" does not end with .sql, .sql.gz, .sql.zst, or .sql.lz4 (I know...picky, but better than crashing later)"
 	okSoFar=0
     fi
 done
@@ -234,6 +233,7 @@ do
         { mysql --login-path=root -e 'FLUSH TABLES $table' EdxPrivate; } >> $LOG_FILE 2>&1
     else
 	{ mysql -u root -p$password -e 'FLUSH TABLES $table' EdxPrivate; } >> $LOG_FILE 2>&1
+    fi
 done
 
 # -------------------  Remove Primary Keys for Loading Speed -----------------
@@ -259,13 +259,21 @@ done
 for sqlFile in $@
 do  
     echo "`date`: starting on $sqlFile"  >> $LOG_FILE 2>&1
+    # Transforms run with json2sql.py --compress write
+    # compressed .sql files; stream-decompress those:
+    case $sqlFile in
+	*.gz)  catCmd='gzip -dc' ;;
+	*.zst) catCmd='zstd -dcq' ;;
+	*.lz4) catCmd='lz4 -dcq' ;;
+	*)     catCmd='cat' ;;
+    esac
     if [[ $MYSQL_VERSION == '5.6+' ]]
     then
-    	{ mysql -f --login-path=root --local_infile=1 < $sqlFile; } >> $LOG_FILE 2>&1
+    	{ $catCmd $sqlFile | mysql -f --login-path=root --local_infile=1; } >> $LOG_FILE 2>&1
     	mysql -f --login-path=root -e "USE Edx; COMMIT; USE EdxPrivate; COMMIT;"
     	echo "`date`: done loading $sqlFile"  >> $LOG_FILE 2>&1
     else
-    	{ mysql -f -u root -p$password --local_infile=1 < $sqlFile; } >> $LOG_FILE 2>&1
+    	{ $catCmd $sqlFile | mysql -f -u root -p$password --local_infile=1; } >> $LOG_FILE 2>&1
     	mysql -f -u root -p$password -e "USE Edx; COMMIT; USE EdxPrivate; COMMIT;"
     	echo "`date`: done loading $sqlFile"  >> $LOG_FILE 2>&1
     fi
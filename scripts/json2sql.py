@@ -12,6 +12,7 @@
 
 import argparse
 import datetime
+import getpass
 import os
 import re
 import socket
@@ -134,10 +135,67 @@ if __name__ == "__main__":
                         dest='verbose',
                         action='store_true');
     parser.add_argument('-t', '--targetFormat',
-                        help='Output one CSV file per table, a dump file as would be created my mysqldump, or both. Default: sql_dump',
+                        help='Output one CSV file per table, a dump file as would be created my mysqldump, both, or one Parquet file per table. Default: sql_dump',
                         dest='targetFormat',
                         default='sql_dump',
-                        choices = ['csv', 'sql_dump', 'sql_dump_and_csv']);
+                        choices = ['csv', 'sql_dump', 'sql_dump_and_csv', 'parquet']);
+    parser.add_argument('-w', '--workers',
+                        help='number of processes among which to split the parsing of the input file. Default: 1',
+                        dest='workers',
+                        type=int,
+                        default=1);
+    parser.add_argument('-s', '--stats',
+                        help='collect per-event_type counts and timings, and rows per table; write them to the log, and as JSON next to it.',
+                        dest='stats',
+                        action='store_true',
+                        default=False);
+    parser.add_argument('-g', '--geoBackend',
+                        help='source for IP to country lookups: the software77 CSV table, or the GeoLite2 database, which also handles IPv6. Default: csv',
+                        dest='geoBackend',
+                        default='csv',
+                        choices = ['csv', 'mmdb']);
+    parser.add_argument('--hashLookupStore',
+                        help='how to keep the OpenEdx hash to display name lookup: in memory (pickle), or in an SQLite file shared by all concurrent transforms (sqlite). The SQLite file is built on first use. Default: pickle',
+                        dest='hashLookupStore',
+                        default='pickle',
+                        choices = ['pickle', 'sqlite']);
+    parser.add_argument('--idStrategy',
+                        help='how to generate the unique keys of all tables: a random per-process prefix plus a counter (counter), random uuids created in batches (batchedUuid4), or one uuid.uuid4() call per key (uuid4). Default: counter',
+                        dest='idStrategy',
+                        default='counter',
+                        choices = ['counter', 'batchedUuid4', 'uuid4']);
+    parser.add_argument('--jsonBackend',
+                        help='JSON decoder for the log lines: the standard library json module, or the faster ujson. ujson accepts some malformed lines that json rejects, such as raw tabs inside strings or trailing commas; those then yield regular rows instead of rows with the badly_formatted column. Default: json',
+                        dest='jsonBackend',
+                        default='json',
+                        choices = ['json', 'ujson']);
+    parser.add_argument('--maxPacketSize',
+                        help='maximum length in bytes of each generated INSERT statement; raise to match the max_allowed_packet of the MySQL server that will load the output. Use "server" to ask the server on --mysqlHost for its max_allowed_packet (minus 1K). Default: %s' % JSONToRelation.MAX_ALLOWED_PACKET_SIZE,
+                        dest='maxPacketSize',
+                        default=None);
+    parser.add_argument('--maxRowsPerInsert',
+                        help='maximum number of rows in each generated INSERT statement. Default: %s' % JSONToRelation.MAX_ROWS_PER_INSERT,
+                        dest='maxRowsPerInsert',
+                        type=int,
+                        default=None);
+    parser.add_argument('--mysqlHost',
+                        help='MySQL server to ask for max_allowed_packet with --maxPacketSize server. The password is read from $HOME/.ssh/mysql, if present. Default: localhost',
+                        dest='mysqlHost',
+                        default='localhost');
+    parser.add_argument('--mysqlUser',
+                        help='MySQL user for --maxPacketSize server. Default: the user who is invoking this script.',
+                        dest='mysqlUser',
+                        default=None);
+    parser.add_argument('--writeBufferSize',
+                        help='number of bytes collected in memory for the .sql file, and for each CSV file, before they are written to disk. Default: %s' % OutputFile.WRITE_BUFFER_SIZE,
+                        dest='writeBufferSize',
+                        type=int,
+                        default=None);
+    parser.add_argument('--compress',
+                        help='compress the CSV files, and the .sql file if it holds INSERT statements. Their names get a .gz, .zst, or .lz4 suffix. With csv output, the LOAD commands in the .sql file decompress through named pipes. With parquet output, the codec of the Parquet files instead (default: snappy). zstd and lz4 need the zstandard and lz4 modules. Default: no compression',
+                        dest='compress',
+                        default=None,
+                        choices = ['gzip', 'zstd', 'lz4']);
     parser.add_argument('destDir',
                         help='file path for the destination .sql/csv file(s)')
     parser.add_argument('inFilePath',
@@ -146,6 +204,28 @@ if __name__ == "__main__":
 
     args = parser.parse_args();
 
+    if args.maxPacketSize == 'server':
+        # Only needed here; pymysql is not otherwise required:
+        from mysqldb import MySQLDB
+        mysqlUser = getpass.getuser() if args.mysqlUser is None else args.mysqlUser
+        try:
+            with open(os.path.join(os.getenv('HOME', ''), '.ssh/mysql')) as fd:
+                mysqlPwd = fd.readline().strip()
+        except IOError:
+            mysqlPwd = ''
+        mysqldb = MySQLDB(host=args.mysqlHost, user=mysqlUser, passwd=mysqlPwd)
+        try:
+            maxPacketSize = JSONToRelation.maxPacketSizeFromServer(mysqldb)
+        finally:
+            mysqldb.close()
+    elif args.maxPacketSize is not None:
+        try:
+            maxPacketSize = int(args.maxPacketSize)
+        except ValueError:
+            parser.error('--maxPacketSize must be a number of bytes, or "server"; was %s' % args.maxPacketSize)
+    else:
+        maxPacketSize = None
+
     # Output file is name of input file with the
     # .json extension replaced by .sql, and a unique
     # timestamp/pid added to avoid name collisions during
@@ -171,6 +251,10 @@ if __name__ == "__main__":
             pass
 
     logFile = os.path.join(logDir, 'j2s_%s_%s.log' % (os.path.basename(args.inFilePath), fileStamp))
+    if args.stats:
+        statsFile = os.path.join(logDir, 'j2s_%s_%s_stats.json' % (os.path.basename(args.inFilePath), fileStamp))
+    else:
+        statsFile = None
 
 
 #    print('xpunge: %s' % args.dropTables)
@@ -187,20 +271,31 @@ if __name__ == "__main__":
         outputFormat = OutputDisposition.OutputFormat.CSV
     elif args.targetFormat == 'sql_dump':
         outputFormat = OutputDisposition.OutputFormat.SQL_INSERT_STATEMENTS
+    elif args.targetFormat == 'parquet':
+        outputFormat = OutputDisposition.OutputFormat.PARQUET
     else:
         outputFormat = OutputDisposition.OutputFormat.SQL_INSERTS_AND_CSV
 
-    outSQLFile = OutputFile(outFullPath, outputFormat, options='wb')  # overwrite any sql file that's there
+    outSQLFile = OutputFile(outFullPath, outputFormat, options='wb', bufferSize=args.writeBufferSize, compression=args.compress)  # overwrite any sql file that's there
     jsonConverter = JSONToRelation(InURI(args.inFilePath),
                                    outSQLFile,
                                    mainTableName='EdxTrackEvent',
-    				               logFile=logFile
+    				               logFile=logFile,
+                                   maxAllowedPacketSize=maxPacketSize,
+                                   maxRowsPerInsert=args.maxRowsPerInsert
                                    )
     try:
         jsonConverter.setParser(EdXTrackLogJSONParser(jsonConverter,
         						  'EdxTrackEvent',
         						  replaceTables=args.dropTables,
-        						  dbName='Edx'
+        						  dbName='Edx',
+        						  statsFile=statsFile,
+        						  ipCountryBackend=args.geoBackend,
+        						  hashLookupStore=args.hashLookupStore,
+        						  idStrategy=args.idStrategy,
+        						  jsonBackend=args.jsonBackend,
+        						  # The point of the SQLite store is reusing it:
+        						  useDisplayNameCache=(args.hashLookupStore == 'sqlite')
         						  ))
     except Exception as e:
         with open(logFile, 'w') as fd:
@@ -214,4 +309,4 @@ if __name__ == "__main__":
             pass
         sys.exit(1)
 
-    jsonConverter.convert()
+    jsonConverter.convert(workers=args.workers)